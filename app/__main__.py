@@ -0,0 +1,136 @@
+"""
+Headless entry point for running an outreach campaign without the Streamlit UI, e.g. from cron or a queue worker:
+
+    python -m app --users users.xlsx --course course.txt --persona persona.txt --output results.csv
+
+API keys and database settings come from the environment or a JSON/TOML file passed with --config.
+"""
+import argparse
+import json
+import logging
+import sys
+
+
+def read_text(path: str) -> str:
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def read_users(path: str):
+    # Parsed once per file content; later runs on the same sheet read the cached columns
+    from app.utils.upload_cache import UploadCache
+    return UploadCache().read(path)
+
+
+def write_results(results, path: str, chunk_size: int = 1000):
+    """Writes results chunk by chunk, so a streaming run's results are never all in memory."""
+    import itertools
+    import pandas as pd
+    results = iter(results)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        if path.lower().endswith('.json'):
+            f.write('[')
+            for i, result in enumerate(results):
+                f.write((',\n' if i else '\n') + json.dumps(result, ensure_ascii=False, default=str))
+            f.write('\n]\n')
+            return
+        header = True
+        while True:
+            chunk = list(itertools.islice(results, chunk_size))
+            if not chunk:
+                return
+            pd.DataFrame(chunk).to_csv(f, index=False, header=header)
+            header = False
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m app', description='Scrape LinkedIn profiles and draft personalized outreach emails.')
+    parser.add_argument('--users', help='Excel (.xlsx/.xls), CSV or Parquet file with a LinkedIn URL column.')
+    parser.add_argument('--course', help='Text file with the course or offering details.')
+    parser.add_argument('--persona', help='Text file with the target persona.')
+    parser.add_argument('--brochure', action='append', default=[], metavar='PDF',
+                        help='Course brochure PDF to summarize into the course details (can be repeated).')
+    parser.add_argument('--resume', metavar='RUN_ID', help='Resume an interrupted run instead of starting a new one.')
+    parser.add_argument('--purge-runs', type=float, nargs='?', const=-1, metavar='DAYS',
+                        help='Delete finished runs and jobs (with their user data, profiles and drafts) older than DAYS '
+                             '(default: RUN_RETENTION_DAYS, 30) from the local journal and job queue, then exit.')
+    parser.add_argument('--config', help='JSON or TOML file with settings (API keys, database, rate limits).')
+    parser.add_argument('--db', choices=['supabase', 'mongodb'], default='supabase', help='Where to store results (default: supabase).')
+    parser.add_argument('--output', help='Write results to this .csv or .json file.')
+    parser.add_argument('--generation-mode', choices=['interactive', 'batch'], default='interactive',
+                        help="'batch' drafts everything through one Message Batches job.")
+    parser.add_argument('--scrape-concurrency', type=int, default=20, help='Max Bright Data snapshots in flight.')
+    parser.add_argument('--generation-concurrency', type=int, default=8, help='Max email generation workers.')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Keep memory flat for very large sheets: results stay in the run journal and are written out page by page.')
+    parser.add_argument('--no-profile-cache', action='store_true', help='Always scrape, ignoring the local profile cache.')
+    parser.add_argument('--no-draft-cache', action='store_true', help='Neither reuse nor store drafts in the local draft cache.')
+    parser.add_argument('--force-regenerate', action='store_true',
+                        help='Ask Claude for every draft even if an identical one is cached (the cache is refreshed).')
+    parser.add_argument('--metrics', help='Write the run metrics report to this file (.json, or Prometheus text for .prom/.txt).')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log progress for every row.')
+    return parser
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.purge_runs is None and not args.resume and not (args.users and args.course and args.persona):
+        parser.error('--users, --course and --persona are required unless --resume or --purge-runs is given.')
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format='%(asctime)s %(levelname)s %(message)s')
+    if args.config:
+        from app.config import load_config_file
+        load_config_file(args.config)
+    if args.purge_runs is not None:
+        # Through the scheduler, so runs that a queued or running job still needs are kept
+        from app.agents.scheduler import CampaignScheduler
+        scheduler = CampaignScheduler()
+        purged = scheduler.purge(args.purge_runs if args.purge_runs >= 0 else None)
+        scheduler.journal.close()
+        scheduler.queue.close()
+        print(f"Purged {purged['runs']} runs and {purged['jobs']} jobs.")
+        return 0
+
+    from app.agents.workflow import OutreachWorkflow
+    workflow = OutreachWorkflow(
+        db_type=args.db,
+        scrape_concurrency=args.scrape_concurrency,
+        generation_concurrency=args.generation_concurrency,
+        use_profile_cache=not args.no_profile_cache,
+        generation_mode=args.generation_mode,
+        streaming=args.streaming,
+        use_draft_cache=not args.no_draft_cache,
+        force_regenerate=args.force_regenerate,
+    )
+    if args.resume:
+        results = workflow.resume(args.resume)
+    else:
+        course_details = read_text(args.course)
+        course_materials = None
+        if args.brochure:
+            from app.agents.course_material_agent import CourseMaterialAgent
+            # Summarized through the workflow's client, sharing its connection pool and rate limits
+            material_agent = CourseMaterialAgent(client=workflow.email_agent.client)
+            try:
+                course_materials, _ = material_agent.ingest(args.brochure)
+            finally:
+                material_agent.close()
+        results = workflow.run(course_details, read_text(args.persona), read_users(args.users), course_materials=course_materials)
+    if args.output:
+        write_results(results, args.output)
+    if args.metrics:
+        with open(args.metrics, 'w', encoding='utf-8') as f:
+            f.write(workflow.last_run_metrics.to_json() if args.metrics.lower().endswith('.json') else workflow.last_run_metrics.to_prometheus())
+    drafted = sum(1 for r in results if r.get('email_draft'))
+    total = len(results)
+    print(f"Run {workflow.last_run_id}: {drafted} of {total} emails drafted.")
+    print(json.dumps(workflow.last_run_stats, indent=2, default=str))
+    records_failed = workflow.last_run_stats.get('db_records_failed')
+    if records_failed:
+        print(f"{records_failed} database records could not be written. Retry them with --resume {workflow.last_run_id}.", file=sys.stderr)
+        return 1
+    return 0 if total else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+from app.config import get_setting
+from app.email_gen.claude_client import ClaudeClient
+from app.utils.hashing import content_hash
+from app.utils.sqlite_cache import SQLiteCache
+
+DEFAULT_STORAGE_DIR = '.cache/brochures'
+DEFAULT_CACHE_PATH = '.cache/course_materials.sqlite3'
+DEFAULT_TTL_SECONDS = 90 * 24 * 3600
+# Bytes per read when copying an upload to storage, so a large brochure is never held in memory at once
+COPY_CHUNK_BYTES = 1024 * 1024
+# Brochure text sent for summarization (~15k tokens); the rest is cut off
+MAX_SUMMARY_INPUT_CHARS = 60000
+SUMMARY_MAX_TOKENS = 600
+MODEL = 'claude-3-5-haiku-20241022'
+
+
+@dataclass
+class Brochure:
+    name: str
+    file_hash: str
+    path: str
+    size: int
+    pages: int = 0
+    text: str = ''
+
+
+class CourseMaterialAgent:
+    """
+    Turns course brochure PDFs into a short summary for the shared course context (see CoursePersonaAgent).
+    Uploads are streamed to local storage under their content hash, pages are extracted in parallel
+    (see pdf_utils.extract_pdf_pages), and both the extracted text and the summary are cached,
+    so each brochure is only parsed once and each set of brochures only summarized once.
+    Pass the app's shared ClaudeClient as client (see CampaignScheduler.claude_client()) so summaries use the same
+    connection pool and rate limits as the campaigns; the agent only builds and closes its own client without one.
+    """
+    def __init__(self, client: ClaudeClient = None, storage_dir: str = DEFAULT_STORAGE_DIR,
+                 cache_path: str = DEFAULT_CACHE_PATH, max_workers: Optional[int] = None):
+        self._owns_client = client is None
+        self.client = client or ClaudeClient(
+            get_setting('CLAUDE_API_KEY') or get_setting('ANTHROPIC_API_KEY'),
+            api_url=get_setting('CLAUDE_API_URL', 'https://api.anthropic.com/v1/messages'),
+            max_in_flight=1,
+            requests_per_min=float(get_setting('CLAUDE_REQUESTS_PER_MIN', 50)),
+            tokens_per_min=float(get_setting('CLAUDE_TOKENS_PER_MIN', 50000)),
+        )
+        self.storage_dir = storage_dir
+        os.makedirs(storage_dir, exist_ok=True)
+        self.max_workers = max_workers
+        self.texts = SQLiteCache(cache_path, table='brochure_texts', default_ttl=DEFAULT_TTL_SECONDS)
+        self.summaries = SQLiteCache(cache_path, table='brochure_summaries', default_ttl=DEFAULT_TTL_SECONDS)
+
+    def store(self, source, name: Optional[str] = None) -> Brochure:
+        """
+        Copies an uploaded PDF (path or file-like object) to storage in chunks under its content hash.
+        Files are stored once per content hash, so a repeated upload is not copied again; paths already on disk are used in place.
+        """
+        file_hash = content_hash(source)
+        if isinstance(source, (str, os.PathLike)):
+            return Brochure(name or os.path.basename(source), file_hash, str(source), os.path.getsize(source))
+        path = os.path.join(self.storage_dir, f"{file_hash}.pdf")
+        if not os.path.exists(path):
+            tmp_path = os.path.join(self.storage_dir, f".upload-{os.getpid()}-{id(source)}.tmp")
+            source.seek(0)
+            try:
+                with open(tmp_path, 'wb') as out:
+                    for chunk in iter(lambda: source.read(COPY_CHUNK_BYTES), b''):
+                        out.write(chunk)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        return Brochure(name or getattr(source, 'name', None) or f"{file_hash}.pdf", file_hash, path, os.path.getsize(path))
+
+    def extract(self, brochure: Brochure) -> Brochure:
+        """Fills in brochure.text and brochure.pages, from the cache if this file was extracted before."""
+        import logging
+        from app.utils.pdf_utils import extract_pdf_pages
+        cached = self.texts.get(brochure.file_hash)
+        if cached is None:
+            pages = extract_pdf_pages(brochure.path, max_workers=self.max_workers)
+            cached = {'text': "\n".join(pages).strip(), 'pages': len(pages)}
+            self.texts.set(brochure.file_hash, cached)
+            logging.info(f"[CourseMaterialAgent] Extracted {len(pages)} pages from {brochure.name}.")
+        brochure.text = cached['text']
+        brochure.pages = cached['pages']
+        return brochure
+
+    def _build_request(self, brochures: List[Brochure]) -> Tuple[dict, int]:
+        # Names are left out, so a renamed copy of the same brochures still hits the summary cache
+        sections = "\n\n".join(f"--- Brochure {i} ---\n{brochure.text}" for i, brochure in enumerate(brochures, 1) if brochure.text)
+        material = sections[:MAX_SUMMARY_INPUT_CHARS]
+        prompt = f"""
+Summarize the course brochure text below for a copywriter who will write personalized outreach emails about the course.
+Keep only facts a prospective learner cares about: what the course covers, outcomes, format, duration, schedule,
+price, certification, instructors and who it is for. Use short bullet points and do not invent anything.
+Return ONLY the summary.
+
+Brochure text:
+{material}
+"""
+        data = {
+            "model": MODEL,
+            "max_tokens": SUMMARY_MAX_TOKENS,
+            "messages": [{"role": "user", "content": prompt}]
+        }
+        return data, len(prompt) // 4 + SUMMARY_MAX_TOKENS
+
+    def summarize(self, brochures: List[Brochure]) -> str:
+        """One Claude call per distinct set of brochures; cached afterwards, so editing the course details never re-summarizes."""
+        import json
+        import logging
+        if not any(brochure.text for brochure in brochures):
+            return ''
+        data, estimated_tokens = self._build_request(brochures)
+        key = hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+        summary = self.summaries.get(key)
+        if summary is None:
+            response = self.client.create_message(data, estimated_tokens=estimated_tokens)
+            summary = response.get('content', [{}])[0].get('text', '').strip()
+            if summary:
+                self.summaries.set(key, summary)
+            logging.info(f"[CourseMaterialAgent] Summarized {len(brochures)} brochures (usage: {response.get('usage')}).")
+        return summary
+
+    def ingest(self, sources: Iterable) -> Tuple[str, List[Brochure]]:
+        """Stores, extracts and summarizes brochure PDFs; returns (summary, brochures)."""
+        brochures = [self.extract(self.store(source)) for source in sources]
+        return self.summarize(brochures), brochures
+
+    def close(self):
+        self.texts.close()
+        self.summaries.close()
+        if self._owns_client:
+            self.client.close()
@@ -1,5 +1,5 @@
 import os
-from typing import Dict
+from typing import Dict, Optional
 
 class CoursePersonaAgent:
     """
@@ -9,10 +9,17 @@ class CoursePersonaAgent:
         self.course_details = None
         self.persona = None
 
-    def load(self, course_details: str, persona: str):
-        self.course_details = course_details
+    def load(self, course_details: str, persona: str, course_materials: Optional[str] = None):
+        self.course_details = self.combine_course_details(course_details, course_materials)
         self.persona = persona
 
+    @staticmethod
+    def combine_course_details(course_details: str, course_materials: Optional[str] = None) -> str:
+        """Course details with the brochure summary (see CourseMaterialAgent) appended, if there is one."""
+        if not course_materials:
+            return course_details
+        return f"{course_details}\n\nFrom the course brochure:\n{course_materials}"
+
     def get_context(self) -> Dict[str, str]:
         return {
             'course_details': self.course_details,
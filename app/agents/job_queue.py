@@ -0,0 +1,179 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+DEFAULT_QUEUE_PATH = '.runs/jobs.sqlite3'
+# Job statuses; the last three are final
+STATUSES = ('queued', 'running', 'completed', 'failed', 'cancelled')
+FINAL_STATUSES = ('completed', 'failed', 'cancelled')
+JOB_FIELDS = ('job_id', 'owner', 'status', 'created_at', 'started_at', 'finished_at', 'run_id',
+              'rows_done', 'rows_total', 'error', 'cancel_requested', 'options')
+
+
+class JobQueue:
+    """
+    Durable local queue of campaign jobs (course, persona and user sheet), shared by everyone using the app.
+    claim_next() hands out queued jobs fairly between owners: owners with fewer running jobs go first,
+    and among those the one whose last job started longest ago, so one teammate's ten campaigns
+    cannot starve another's single one.
+    """
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY, owner TEXT NOT NULL, status TEXT NOT NULL, created_at REAL NOT NULL,
+                started_at REAL, finished_at REAL, run_id TEXT, rows_done INTEGER NOT NULL DEFAULT 0,
+                rows_total INTEGER NOT NULL DEFAULT 0, error TEXT, cancel_requested INTEGER NOT NULL DEFAULT 0,
+                options TEXT, course_details TEXT, persona TEXT, user_rows TEXT
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+        ''')
+
+    def _execute(self, sql: str, params: Iterable = ()):
+        with self._lock:
+            return self._conn.execute(sql, tuple(params))
+
+    def submit(self, owner: str, course_details: Optional[str], persona: Optional[str], user_rows: Optional[str],
+               rows_total: int = 0, options: Optional[Dict[str, Any]] = None, run_id: Optional[str] = None) -> str:
+        """
+        Queues a campaign. user_rows is the user sheet serialized with DataFrame.to_json(orient='split').
+        With run_id the job resumes that journaled run instead, and the inputs can be None; a run can only be
+        owned by one queued or running job at a time, so resuming it again raises ValueError.
+        """
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            # IMMEDIATE, so two processes cannot both queue a resume of the same run
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                owner_job = self._conn.execute(
+                    "SELECT job_id FROM jobs WHERE run_id = ? AND status IN ('queued', 'running')", (run_id,)
+                ).fetchone() if run_id else None
+                if owner_job is None:
+                    self._conn.execute(
+                        'INSERT INTO jobs (job_id, owner, status, created_at, run_id, rows_total, options, course_details, persona, user_rows) '
+                        "VALUES (?, ?, 'queued', ?, ?, ?, ?, ?, ?, ?)",
+                        (job_id, owner or 'anonymous', time.time(), run_id, rows_total, json.dumps(options or {}), course_details, persona, user_rows)
+                    )
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+        if owner_job is not None:
+            raise ValueError(f"Run {run_id} is already being processed by job {owner_job[0]}.")
+        return job_id
+
+    def _to_job(self, row) -> Dict[str, Any]:
+        job = dict(zip(JOB_FIELDS, row))
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        job['options'] = json.loads(job['options'] or '{}')
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._execute(f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row else None
+
+    def get_inputs(self, job_id: str) -> Optional[Dict[str, str]]:
+        row = self._execute('SELECT course_details, persona, user_rows FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return dict(zip(('course_details', 'persona', 'user_rows'), row)) if row else None
+
+    def list_jobs(self, owner: Optional[str] = None, statuses: Optional[Iterable[str]] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Most recent first."""
+        where, params = [], []
+        if owner:
+            where.append('owner = ?')
+            params.append(owner)
+        if statuses:
+            statuses = list(statuses)
+            where.append(f"status IN ({','.join('?' * len(statuses))})")
+            params.extend(statuses)
+        sql = f"SELECT {', '.join(JOB_FIELDS)} FROM jobs {'WHERE ' + ' AND '.join(where) if where else ''} ORDER BY created_at DESC LIMIT ?"
+        return [self._to_job(row) for row in self._execute(sql, (*params, limit)).fetchall()]
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """1-based position among queued jobs by submission time (the fair-share order may differ), None if not queued."""
+        job = self.get_job(job_id)
+        if not job or job['status'] != 'queued':
+            return None
+        return self._execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at <= ?", (job['created_at'],)).fetchone()[0]
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """Marks the next job (in fair-share order) as running and returns it, or None if nothing is queued."""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute('''
+                    SELECT job_id FROM jobs AS j WHERE status = 'queued' AND cancel_requested = 0
+                    ORDER BY
+                        (SELECT COUNT(*) FROM jobs AS r WHERE r.owner = j.owner AND r.status = 'running'),
+                        COALESCE((SELECT MAX(started_at) FROM jobs AS s WHERE s.owner = j.owner), 0),
+                        created_at
+                    LIMIT 1
+                ''').fetchone()
+                if row:
+                    self._conn.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE job_id = ?", (time.time(), row[0]))
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+        return self.get_job(row[0]) if row else None
+
+    def set_run_id(self, job_id: str, run_id: str):
+        self._execute('UPDATE jobs SET run_id = ? WHERE job_id = ?', (run_id, job_id))
+
+    def update_progress(self, job_id: str, rows_done: int, rows_total: Optional[int] = None):
+        if rows_total is None:
+            self._execute('UPDATE jobs SET rows_done = ? WHERE job_id = ?', (rows_done, job_id))
+        else:
+            self._execute('UPDATE jobs SET rows_done = ?, rows_total = ? WHERE job_id = ?', (rows_done, rows_total, job_id))
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None):
+        if status not in FINAL_STATUSES:
+            raise ValueError(f"Not a final job status: {status}")
+        self._execute('UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE job_id = ?', (status, time.time(), error, job_id))
+
+    def request_cancel(self, job_id: str) -> Optional[str]:
+        """
+        Queued jobs are cancelled right away; running jobs are flagged and stopped by their worker.
+        Returns the job's status after the request (None for an unknown job).
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ?, cancel_requested = 1 WHERE job_id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+            self._conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE job_id = ? AND status = 'running'", (job_id,))
+        job = self.get_job(job_id)
+        return job['status'] if job else None
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        row = self._execute('SELECT cancel_requested FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def requeue_interrupted(self) -> int:
+        """
+        Puts jobs left 'running' by a process that died back in the queue; their run_id is kept, so the
+        next worker resumes the run from its journal. Only call this when no other scheduler uses the queue.
+        """
+        cur = self._execute("UPDATE jobs SET status = 'queued' WHERE status = 'running' AND cancel_requested = 0")
+        self._execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE status = 'running'", (time.time(),))
+        return cur.rowcount
+
+    def purge(self, older_than_days: float) -> int:
+        """Deletes finished jobs (and the campaign inputs they hold) that ended more than older_than_days ago."""
+        cutoff = time.time() - older_than_days * 24 * 3600
+        cur = self._execute(
+            f"DELETE FROM jobs WHERE finished_at < ? AND status IN ({','.join('?' * len(FINAL_STATUSES))})", (cutoff, *FINAL_STATUSES)
+        )
+        return cur.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
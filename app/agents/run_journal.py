@@ -0,0 +1,268 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_JOURNAL_PATH = '.runs/journal.sqlite3'
+# Rows per query when paging through results or profiles
+PAGE_SIZE = 500
+# Per-row stages in the order a row moves through them
+STAGES = ('scraped', 'drafted', 'persisted', 'sent')
+# Days finished runs (and the personal data they hold) are kept before purge() deletes them; see RUN_RETENTION_DAYS
+DEFAULT_RETENTION_DAYS = 30
+
+
+class RunJournal:
+    """
+    Durable local journal of workflow runs, so a crashed or interrupted run can be resumed.
+    Stores each run's inputs, every scraped profile and each row's furthest stage
+    (scraped -> drafted -> persisted -> sent) together with its result.
+    """
+    def __init__(self, path: str = DEFAULT_JOURNAL_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY, status TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL,
+                course_details TEXT, persona TEXT, user_rows TEXT, options TEXT
+            );
+            CREATE TABLE IF NOT EXISTS run_profiles (
+                run_id TEXT NOT NULL, url TEXT NOT NULL, profile_json TEXT NOT NULL,
+                PRIMARY KEY (run_id, url)
+            );
+            CREATE TABLE IF NOT EXISTS run_rows (
+                run_id TEXT NOT NULL, position INTEGER NOT NULL, url TEXT, stage TEXT NOT NULL,
+                result_json TEXT, updated_at REAL NOT NULL,
+                PRIMARY KEY (run_id, position)
+            );
+            -- Database tables already written for drafted rows whose writes only partly succeeded
+            CREATE TABLE IF NOT EXISTS run_writes (
+                run_id TEXT NOT NULL, position INTEGER NOT NULL, table_name TEXT NOT NULL,
+                PRIMARY KEY (run_id, position, table_name)
+            );
+        ''')
+
+    def _execute(self, sql: str, params: Iterable = ()):
+        with self._lock:
+            return self._conn.execute(sql, tuple(params))
+
+    def _executemany(self, sql: str, rows: List[tuple]):
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                self._conn.executemany(sql, rows)
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def create_run(self, course_details: str, persona: str, user_rows: str, options: Optional[Dict[str, Any]] = None) -> str:
+        """Records a new run. user_rows is the serialized input sheet needed to resume it."""
+        run_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        self._execute(
+            'INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (run_id, 'running', now, now, course_details, persona, user_rows, json.dumps(options or {}))
+        )
+        return run_id
+
+    def get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        row = self._execute(
+            'SELECT run_id, status, created_at, updated_at, course_details, persona, user_rows, options FROM runs WHERE run_id = ?',
+            (run_id,)
+        ).fetchone()
+        if not row:
+            return None
+        keys = ('run_id', 'status', 'created_at', 'updated_at', 'course_details', 'persona', 'user_rows', 'options')
+        run = dict(zip(keys, row))
+        run['options'] = json.loads(run['options'] or '{}')
+        return run
+
+    def list_runs(self, statuses: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """Most recent first, with per-stage row counts."""
+        runs = self._execute('SELECT run_id, status, created_at, updated_at FROM runs ORDER BY created_at DESC').fetchall()
+        statuses = set(statuses) if statuses else None
+        listed = []
+        for run_id, status, created_at, updated_at in runs:
+            if statuses and status not in statuses:
+                continue
+            counts = dict(self._execute('SELECT stage, COUNT(*) FROM run_rows WHERE run_id = ? GROUP BY stage', (run_id,)).fetchall())
+            listed.append({'run_id': run_id, 'status': status, 'created_at': created_at, 'updated_at': updated_at, 'stages': counts})
+        return listed
+
+    def set_status(self, run_id: str, status: str):
+        self._execute('UPDATE runs SET status = ?, updated_at = ? WHERE run_id = ?', (status, time.time(), run_id))
+
+    def purge(self, older_than_days: float = DEFAULT_RETENTION_DAYS, statuses: Iterable[str] = ('completed', 'failed', 'cancelled'),
+              keep: Iterable[str] = ()) -> int:
+        """
+        Deletes runs with one of statuses that were last updated more than older_than_days ago, with their inputs,
+        scraped profiles and results; run ids in keep are left alone. Returns the number of runs deleted.
+        """
+        statuses = list(statuses)
+        cutoff = time.time() - older_than_days * 24 * 3600
+        keep = set(keep)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT run_id FROM runs WHERE updated_at < ? AND status IN ({','.join('?' * len(statuses))})", (cutoff, *statuses)
+            ).fetchall()
+            run_ids = [(run_id,) for run_id, in rows if run_id not in keep]
+            if not run_ids:
+                return 0
+            self._conn.execute('BEGIN')
+            try:
+                for table in ('run_writes', 'run_rows', 'run_profiles', 'runs'):
+                    self._conn.executemany(f'DELETE FROM {table} WHERE run_id = ?', run_ids)
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+        return len(run_ids)
+
+    def mark_scraped(self, run_id: str, url: str, positions: List[int], profile: Dict[str, Any]):
+        now = time.time()
+        self._execute('INSERT OR REPLACE INTO run_profiles VALUES (?, ?, ?)', (run_id, url, json.dumps(profile, ensure_ascii=False)))
+        # Never move a row back to an earlier stage
+        self._executemany(
+            "INSERT INTO run_rows VALUES (?, ?, ?, 'scraped', NULL, ?) ON CONFLICT (run_id, position) DO NOTHING",
+            [(run_id, position, url, now) for position in positions]
+        )
+
+    def mark_drafted(self, run_id: str, position: int, url: str, result: Dict[str, Any]):
+        self._execute(
+            "INSERT OR REPLACE INTO run_rows VALUES (?, ?, ?, 'drafted', ?, ?)",
+            (run_id, position, url, json.dumps(result, ensure_ascii=False, default=str), time.time())
+        )
+
+    def mark_written(self, run_id: str, position: int, table: str):
+        """Records one of a drafted row's database writes, so a resume does not repeat it."""
+        self._execute('INSERT OR IGNORE INTO run_writes VALUES (?, ?, ?)', (run_id, position, table))
+
+    def get_written(self, run_id: str) -> Dict[int, set]:
+        """position -> tables already written, for drafted rows that are not persisted yet."""
+        written = {}
+        for position, table in self._execute('SELECT position, table_name FROM run_writes WHERE run_id = ?', (run_id,)).fetchall():
+            written.setdefault(position, set()).add(table)
+        return written
+
+    def mark_persisted(self, run_id: str, position: int):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE run_rows SET stage = 'persisted', updated_at = ? WHERE run_id = ? AND position = ? AND stage = 'drafted'",
+                (time.time(), run_id, position)
+            )
+            self._conn.execute('DELETE FROM run_writes WHERE run_id = ? AND position = ?', (run_id, position))
+
+    def mark_sent(self, run_id: str, positions: Iterable[int]):
+        now = time.time()
+        self._executemany(
+            "UPDATE run_rows SET stage = 'sent', updated_at = ? WHERE run_id = ? AND position = ?",
+            [(now, run_id, position) for position in positions]
+        )
+
+    def get_profiles(self, run_id: str, urls: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Scraped profiles of a run, optionally only those for urls."""
+        if urls is None:
+            rows = self._execute('SELECT url, profile_json FROM run_profiles WHERE run_id = ?', (run_id,)).fetchall()
+            return {url: json.loads(profile_json) for url, profile_json in rows}
+        urls = list(urls)
+        profiles = {}
+        for i in range(0, len(urls), PAGE_SIZE):
+            chunk = urls[i:i+PAGE_SIZE]
+            rows = self._execute(
+                f"SELECT url, profile_json FROM run_profiles WHERE run_id = ? AND url IN ({','.join('?' * len(chunk))})",
+                (run_id, *chunk)
+            ).fetchall()
+            profiles.update((url, json.loads(profile_json)) for url, profile_json in rows)
+        return profiles
+
+    def get_profile(self, run_id: str, url: str) -> Optional[Dict[str, Any]]:
+        row = self._execute('SELECT profile_json FROM run_profiles WHERE run_id = ? AND url = ?', (run_id, url)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_profile_urls(self, run_id: str) -> set:
+        return {url for url, in self._execute('SELECT url FROM run_profiles WHERE run_id = ?', (run_id,)).fetchall()}
+
+    def get_rows(self, run_id: str, include_results: bool = True) -> Dict[int, Dict[str, Any]]:
+        """position -> {'url', 'stage', 'result'} for every row the run has reached (result is None without include_results)."""
+        columns = 'position, url, stage, result_json' if include_results else 'position, url, stage, NULL'
+        rows = self._execute(f'SELECT {columns} FROM run_rows WHERE run_id = ?', (run_id,)).fetchall()
+        return {
+            position: {'url': url, 'stage': stage, 'result': json.loads(result_json) if result_json else None}
+            for position, url, stage, result_json in rows
+        }
+
+    def get_result(self, run_id: str, position: int) -> Optional[Dict[str, Any]]:
+        row = self._execute('SELECT result_json FROM run_rows WHERE run_id = ? AND position = ?', (run_id, position)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def count_results(self, run_id: str) -> int:
+        return self._execute('SELECT COUNT(*) FROM run_rows WHERE run_id = ? AND result_json IS NOT NULL', (run_id,)).fetchone()[0]
+
+    def get_results(self, run_id: str, offset: int = 0, limit: int = PAGE_SIZE) -> List[Tuple[int, Dict[str, Any]]]:
+        """One page of (position, result) for drafted rows, in row order."""
+        rows = self._execute(
+            'SELECT position, result_json FROM run_rows WHERE run_id = ? AND result_json IS NOT NULL '
+            'ORDER BY position LIMIT ? OFFSET ?',
+            (run_id, limit, offset)
+        ).fetchall()
+        return [(position, json.loads(result_json)) for position, result_json in rows]
+
+    def get_latest_results(self, run_id: str, limit: int = 200) -> List[Tuple[int, Dict[str, Any]]]:
+        """The most recently drafted (position, result) pairs, in row order; used to show a run's progress live."""
+        rows = self._execute(
+            'SELECT position, result_json FROM run_rows WHERE run_id = ? AND result_json IS NOT NULL '
+            'ORDER BY updated_at DESC LIMIT ?',
+            (run_id, limit)
+        ).fetchall()
+        return sorted((position, json.loads(result_json)) for position, result_json in rows)
+
+    def iter_results(self, run_id: str, page_size: int = PAGE_SIZE) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Every (position, result) in row order, read one page at a time."""
+        last_position = -1
+        while True:
+            rows = self._execute(
+                'SELECT position, result_json FROM run_rows WHERE run_id = ? AND result_json IS NOT NULL AND position > ? '
+                'ORDER BY position LIMIT ?',
+                (run_id, last_position, page_size)
+            ).fetchall()
+            for position, result_json in rows:
+                yield position, json.loads(result_json)
+            if len(rows) < page_size:
+                return
+            last_position = rows[-1][0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JournalResults:
+    """
+    Read-only view of a run's results kept in the journal, returned by the workflow in streaming mode
+    so that callers page through them instead of holding every row in memory.
+    """
+    def __init__(self, journal: RunJournal, run_id: str):
+        self.journal = journal
+        self.run_id = run_id
+
+    def __len__(self) -> int:
+        return self.journal.count_results(self.run_id)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for _, result in self.journal.iter_results(self.run_id):
+            yield result
+
+    def items(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """(position, result) pairs in row order."""
+        return self.journal.iter_results(self.run_id)
+
+    def page(self, offset: int, limit: int) -> List[Tuple[int, Dict[str, Any]]]:
+        return self.journal.get_results(self.run_id, offset, limit)
@@ -0,0 +1,314 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from app.agents.job_queue import JobQueue
+from app.agents.run_journal import DEFAULT_RETENTION_DAYS, RunJournal
+from app.config import get_setting
+from app.utils.rate_limit import TokenBucket
+
+# Seconds between progress writes (and cross-process cancel checks) for a running job
+PROGRESS_INTERVAL = 1.0
+# OutreachWorkflow arguments set by the scheduler itself, which job options cannot override
+SCHEDULER_OPTIONS = ('db_type', 'db', 'journal', 'use_journal', 'streaming', 'linkedin_scraper', 'claude_client',
+                     'profile_cache', 'draft_cache')
+# Finished jobs whose RunMetrics are kept in memory for run_metrics()
+METRICS_HISTORY = 20
+# Seconds an idle worker waits before looking at the queue again
+IDLE_POLL_INTERVAL = 1.0
+
+
+class CampaignScheduler:
+    """
+    Runs queued campaigns on a fixed number of worker threads, all drawing on one process-wide API budget:
+    a shared Bright Data triggers/min bucket, shared Claude requests/min and tokens/min buckets with one pool of
+    in-flight request slots, and a shared SMTP sends/sec throttle (see smtp_throttle). A job running alone gets the
+    whole budget; jobs started while others run split the scrape concurrency with them, and the shared Claude slots
+    are taken first come, first served. JobQueue.claim_next() picks jobs fairly between owners.
+    The buckets only cover this process, so run one scheduler per deployment.
+    """
+    def __init__(self, queue: JobQueue = None, journal: RunJournal = None, max_concurrent_jobs: Optional[int] = None,
+                 db_type: str = 'supabase', db=None, workflow_options: Optional[Dict[str, Any]] = None):
+        self.queue = queue or JobQueue()
+        self.journal = journal or RunJournal()
+        self.max_concurrent_jobs = max(1, int(max_concurrent_jobs or get_setting('MAX_CONCURRENT_CAMPAIGNS', 2)))
+        self.db_type = db_type
+        # One database client, Claude and Bright Data connection pools and pair of local caches for every job,
+        # created on first use
+        self.db = db
+        self._claude_session = None
+        self._brightdata_session = None
+        self._profile_cache = None
+        self._draft_cache = None
+        self.workflow_options = workflow_options or {}
+        # Global budgets, sized from the same settings a single workflow uses
+        self.claude_max_in_flight = int(get_setting('CLAUDE_MAX_IN_FLIGHT', 8))
+        self.claude_slots = threading.BoundedSemaphore(self.claude_max_in_flight)
+        self.claude_request_bucket = TokenBucket.per_minute(float(get_setting('CLAUDE_REQUESTS_PER_MIN', 50)))
+        self.claude_token_bucket = TokenBucket.per_minute(float(get_setting('CLAUDE_TOKENS_PER_MIN', 50000)))
+        self.scrape_concurrency = int(get_setting('BRIGHTDATA_MAX_IN_FLIGHT', 20))
+        self.brightdata_trigger_bucket = TokenBucket.per_minute(float(get_setting('BRIGHTDATA_TRIGGERS_PER_MIN', 60)))
+        self.smtp_throttle = TokenBucket(float(get_setting('SMTP_SENDS_PER_SEC', 1.0)), capacity=1.0)
+        self._lock = threading.Lock()
+        self._running: Dict[str, Any] = {}  # job_id -> workflow
+        self._metrics = OrderedDict()  # job_id -> RunMetrics of recently finished jobs
+        self._partials: Dict[str, Dict[int, Any]] = {}  # job_id -> position -> EmailDraft still being streamed
+        self._stop = threading.Event()
+        self._workers: List[threading.Thread] = []
+
+    def start(self) -> 'CampaignScheduler':
+        """
+        Starts the worker threads (once). Jobs left running by a previous process are queued again and resumed,
+        and finished runs older than RUN_RETENTION_DAYS are purged (see purge()).
+        """
+        import logging
+        with self._lock:
+            if self._workers:
+                return self
+            requeued = self.queue.requeue_interrupted()
+            if requeued:
+                logging.info(f"[CampaignScheduler] Re-queued {requeued} interrupted jobs.")
+            if float(get_setting('RUN_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)) > 0:
+                self.purge()
+            for i in range(self.max_concurrent_jobs):
+                worker = threading.Thread(target=self._worker_loop, name=f"campaign-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+        return self
+
+    def stop(self, cancel_running: bool = False):
+        self._stop.set()
+        if cancel_running:
+            with self._lock:
+                for workflow in self._running.values():
+                    workflow.cancel()
+
+    def close(self, timeout: float = 10.0):
+        """Cancels running jobs (they stay resumable), waits up to timeout for the workers and closes the shared resources."""
+        self.stop(cancel_running=True)
+        deadline = time.time() + timeout
+        for worker in self._workers:
+            worker.join(max(0.0, deadline - time.time()))
+        with self._lock:
+            for resource in (self._claude_session, self._brightdata_session, self._profile_cache, self._draft_cache):
+                if resource is not None:
+                    resource.close()
+            self._claude_session = self._brightdata_session = self._profile_cache = self._draft_cache = None
+
+    def purge(self, older_than_days: Optional[float] = None) -> Dict[str, int]:
+        """
+        Deletes finished runs from the journal and finished jobs from the queue, together with the user sheets,
+        profiles and drafts they hold, once they are older than older_than_days (default RUN_RETENTION_DAYS).
+        Runs that a queued or running job still refers to are kept.
+        """
+        import logging
+        days = float(older_than_days if older_than_days is not None else get_setting('RUN_RETENTION_DAYS', DEFAULT_RETENTION_DAYS))
+        active_runs = {job['run_id'] for job in self.queue.list_jobs(statuses=['queued', 'running'], limit=-1) if job['run_id']}
+        purged = {'runs': self.journal.purge(days, keep=active_runs), 'jobs': self.queue.purge(days)}
+        if purged['runs'] or purged['jobs']:
+            logging.info(f"[CampaignScheduler] Purged {purged['runs']} runs and {purged['jobs']} jobs older than {days:g} days.")
+        return purged
+
+    def submit(self, owner: str, course_details: str, persona: str, user_df: pd.DataFrame,
+               options: Optional[Dict[str, Any]] = None, course_materials: Optional[str] = None) -> str:
+        """
+        Queues a campaign and returns its job id. options are passed to OutreachWorkflow (e.g. generation_mode);
+        course_materials is a brochure summary added to the course details.
+        """
+        from app.agents.course_persona_agent import CoursePersonaAgent
+        return self.queue.submit(
+            owner, CoursePersonaAgent.combine_course_details(course_details, course_materials), persona,
+            user_df.to_json(orient='split', date_format='iso', default_handler=str),
+            rows_total=len(user_df), options=options
+        )
+
+    def resume(self, owner: str, run_id: str, options: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Queues a job that resumes an interrupted or cancelled run from the journal.
+        Raises ValueError if the run is not in the journal, or if a queued or running job already owns it.
+        """
+        if not run_id or self.journal.get_run(run_id) is None:
+            raise ValueError(f"Unknown run id: {run_id}")
+        return self.queue.submit(owner, None, None, None, options=options, run_id=run_id)
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """Cancels a queued job, or stops a running one after its in-flight rows; it stays resumable from the journal."""
+        status = self.queue.request_cancel(job_id)
+        with self._lock:
+            workflow = self._running.get(job_id)
+        if workflow is not None:
+            workflow.cancel()
+        return status
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.queue.get_job(job_id)
+        if job and job['status'] == 'queued':
+            job['queue_position'] = self.queue.queue_position(job_id)
+        return job
+
+    def list_jobs(self, owner: Optional[str] = None, statuses=None, limit: int = 100) -> List[Dict[str, Any]]:
+        return self.queue.list_jobs(owner=owner, statuses=statuses, limit=limit)
+
+    def partial_drafts(self, job_id: str) -> Dict[int, Any]:
+        """position -> partial EmailDraft for rows of a running job whose draft is still streaming in."""
+        with self._lock:
+            return dict(self._partials.get(job_id, {}))
+
+    def run_metrics(self, job_id: str):
+        """RunMetrics of a running or recently finished job in this process, else None."""
+        with self._lock:
+            workflow = self._running.get(job_id)
+            return workflow.last_run_metrics if workflow is not None else self._metrics.get(job_id)
+
+    def _worker_loop(self):
+        import logging
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim_next()
+            except Exception as e:
+                logging.error(f"[CampaignScheduler] Could not claim a job: {e}")
+                job = None
+            if job is None:
+                self._stop.wait(IDLE_POLL_INTERVAL)
+                continue
+            self._run_job(job)
+
+    def _get_db(self):
+        with self._lock:
+            if self.db is None:
+                from app.db.db_connector import MongoDBConnector, SupabaseConnector
+                self.db = SupabaseConnector() if self.db_type == 'supabase' else MongoDBConnector()
+            return self.db
+
+    def _shared_resources(self):
+        """The Claude and Bright Data sessions and the profile/draft caches, built once and reused by every job."""
+        from app.email_gen.claude_client import ClaudeClient
+        from app.email_gen.draft_cache import DraftCache
+        from app.scraping.brightdata_linkedin_agent import BrightDataLinkedInAgent
+        from app.scraping.profile_cache import ProfileCache
+        with self._lock:
+            if self._claude_session is None:
+                self._claude_session = ClaudeClient.create_session(self.claude_max_in_flight)
+                self._brightdata_session = BrightDataLinkedInAgent.create_session(self.scrape_concurrency)
+                self._profile_cache = ProfileCache()
+                self._draft_cache = DraftCache()
+            return self._claude_session, self._brightdata_session, self._profile_cache, self._draft_cache
+
+    def claude_client(self, max_in_flight: Optional[int] = None):
+        """
+        A ClaudeClient on the shared connection pool, per-minute buckets and in-flight slots, so calls made outside
+        a job (e.g. brochure summaries) count against the same budget as the campaigns. Closing it leaves the pool open.
+        """
+        from app.email_gen.claude_client import ClaudeClient
+        claude_session = self._shared_resources()[0]
+        return ClaudeClient(
+            get_setting('CLAUDE_API_KEY') or get_setting('ANTHROPIC_API_KEY'),
+            api_url=get_setting('CLAUDE_API_URL', 'https://api.anthropic.com/v1/messages'),
+            max_in_flight=max_in_flight or self.claude_max_in_flight,
+            request_bucket=self.claude_request_bucket,
+            token_bucket=self.claude_token_bucket,
+            slots=self.claude_slots,
+            session=claude_session,
+        )
+
+    def _build_workflow(self, job: Dict[str, Any]):
+        from app.agents.workflow import OutreachWorkflow
+        from app.scraping.brightdata_linkedin_agent import BrightDataLinkedInAgent
+        _, brightdata_session, profile_cache, draft_cache = self._shared_resources()
+        # Every job may use the whole Claude budget: the shared in-flight slots and per-minute buckets divide it
+        # between whichever jobs are running. Snapshots have no shared limit, so the scrape concurrency is split
+        # between the jobs running right now (a job running alone gets all of it)
+        with self._lock:
+            running_jobs = len(self._running) + 1
+        generation_concurrency = self.claude_max_in_flight
+        claude_client = self.claude_client(generation_concurrency)
+        # The scheduler decides where results go and how the workflow reaches the APIs
+        options = {key: value for key, value in {**self.workflow_options, **job['options']}.items()
+                   if key not in SCHEDULER_OPTIONS}
+        options.setdefault('scrape_concurrency', max(1, self.scrape_concurrency // running_jobs))
+        options.setdefault('generation_concurrency', generation_concurrency)
+        return OutreachWorkflow(
+            db_type=self.db_type, db=self._get_db(), journal=self.journal, streaming=True,
+            linkedin_scraper=BrightDataLinkedInAgent(trigger_bucket=self.brightdata_trigger_bucket, session=brightdata_session),
+            claude_client=claude_client, profile_cache=profile_cache, draft_cache=draft_cache,
+            **options
+        )
+
+    def _run_job(self, job: Dict[str, Any]):
+        import io
+        import logging
+        from app.agents.workflow import RunCancelled
+        job_id = job['job_id']
+        progress = {'done': 0, 'written_at': 0.0}
+        progress_lock = threading.Lock()
+        workflow = None
+
+        partials = {}
+
+        def on_partial(position, draft):
+            partials[position] = draft
+
+        def on_result(event):
+            partials.pop(event['position'], None)
+            with progress_lock:
+                progress['done'] += 1
+                now = time.time()
+                if now - progress['written_at'] < PROGRESS_INTERVAL:
+                    return
+                progress['written_at'] = now
+                done = progress['done']
+            self.queue.update_progress(job_id, done, event['total'])
+            # Cancel requests may also come from another process through the queue
+            if self.queue.is_cancel_requested(job_id):
+                workflow.cancel()
+
+        try:
+            workflow = self._build_workflow(job)
+            with self._lock:
+                self._running[job_id] = workflow
+                self._partials[job_id] = partials
+            if self.queue.is_cancel_requested(job_id):
+                raise RunCancelled(f"Job {job_id} was cancelled before it started.")
+            logging.info(f"[CampaignScheduler] Starting job {job_id} for {job['owner']}.")
+            if job['run_id']:
+                results = workflow.resume(job['run_id'], on_result=on_result, on_partial=on_partial)
+            else:
+                inputs = self.queue.get_inputs(job_id)
+                user_df = pd.read_json(io.StringIO(inputs['user_rows']), orient='split')
+                # Recording the run id before any work starts lets a job interrupted by a crash resume its run instead of
+                # starting over, and keeps the run from being resumed by a second job while this one owns it
+                results = workflow.run(inputs['course_details'], inputs['persona'], user_df, on_result=on_result, on_partial=on_partial,
+                                       on_run_created=lambda run_id: self.queue.set_run_id(job_id, run_id))
+            if workflow.last_run_id:
+                self.queue.set_run_id(job_id, workflow.last_run_id)
+            self.queue.update_progress(job_id, len(results), len(results))
+            records_failed = workflow.last_run_stats.get('db_records_failed')
+            if records_failed:
+                # The run is left 'failed' in the journal, so resuming it retries only the unwritten rows
+                self.queue.finish(job_id, 'failed', f"{records_failed} database records could not be written; resume the run to retry them.")
+                logging.error(f"[CampaignScheduler] Job {job_id} finished with {records_failed} failed database records.")
+            else:
+                self.queue.finish(job_id, 'completed')
+                logging.info(f"[CampaignScheduler] Job {job_id} completed ({len(results)} rows).")
+        except RunCancelled:
+            if workflow is not None and workflow.last_run_id:
+                self.queue.set_run_id(job_id, workflow.last_run_id)
+            self.queue.update_progress(job_id, progress['done'])
+            self.queue.finish(job_id, 'cancelled')
+            logging.info(f"[CampaignScheduler] Job {job_id} cancelled.")
+        except Exception as e:
+            if workflow is not None and workflow.last_run_id:
+                self.queue.set_run_id(job_id, workflow.last_run_id)
+            self.queue.finish(job_id, 'failed', str(e))
+            logging.error(f"[CampaignScheduler] Job {job_id} failed: {e}")
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+                self._partials.pop(job_id, None)
+                if workflow is not None:
+                    self._metrics[job_id] = workflow.last_run_metrics
+                    while len(self._metrics) > METRICS_HISTORY:
+                        self._metrics.popitem(last=False)
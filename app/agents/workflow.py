@@ -1,124 +1,584 @@
 from app.agents.course_persona_agent import CoursePersonaAgent
-from app.scraping.brightdata_linkedin_agent import BrightDataLinkedInAgent
+from app.agents.run_journal import JournalResults, RunJournal
+from app.scraping.brightdata_linkedin_agent import BrightDataLinkedInAgent, record_error
+from app.email_gen.draft_cache import DraftCache
+from app.email_gen.email_draft import EmailDraft
 from app.email_gen.email_generation_agent import EmailGenerationAgent
-from app.db.db_connector import SupabaseConnector, MongoDBConnector
-from app.utils.pdf_utils import extract_pdf_text
+from app.db.db_connector import SupabaseConnector, MongoDBConnector, BufferedWriter
+from app.scraping.profile_cache import ProfileCache
+from app.scraping.linkedin_urls import canonicalize_linkedin_url, build_url_index
+from app.utils.ingestion import ColumnMap, UserRow, extract_user_rows, resolve_columns
+from app.utils.metrics import RunMetrics
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import pandas as pd
 
+# Bright Data accepts at most 10 LinkedIn URLs per trigger
+SCRAPE_BATCH_SIZE = 10
+# URLs per profile cache lookup, so cache hits are loaded and handed off a chunk at a time
+CACHE_LOOKUP_CHUNK = 500
+
+class RunCancelled(Exception):
+    """Raised by run()/resume() when cancel() stopped the run; the journal keeps it resumable."""
+
 class OutreachWorkflow:
-    def __init__(self, db_type='supabase', linkedin_email=None, linkedin_password=None):
+    def __init__(self, db_type='supabase', linkedin_email=None, linkedin_password=None,
+                 scrape_concurrency: int = 20, generation_concurrency: int = 8,
+                 db_batch_size: int = 200, db_flush_interval: float = 2.0,
+                 use_profile_cache: bool = True, profile_cache: ProfileCache = None,
+                 generation_mode: str = 'interactive', batch_poll_interval: float = 30,
+                 use_journal: bool = True, journal: RunJournal = None, column_aliases: dict = None, db=None,
+                 streaming: bool = False, use_draft_cache: bool = True, draft_cache: DraftCache = None,
+                 force_regenerate: bool = False, linkedin_scraper: BrightDataLinkedInAgent = None, claude_client=None,
+                 stream_generation: bool = False):
         self.course_persona_agent = CoursePersonaAgent()
-        self.linkedin_scraper = BrightDataLinkedInAgent()
-        self.email_agent = EmailGenerationAgent()
-        self.db = SupabaseConnector() if db_type == 'supabase' else MongoDBConnector()
+        # The scraper and Claude client can be passed in so several workflows draw on one shared rate budget
+        self.linkedin_scraper = linkedin_scraper or BrightDataLinkedInAgent()
+        # Unchanged course/persona/profile/model reuse the stored draft; force_regenerate always asks Claude again
+        self.email_agent = EmailGenerationAgent(
+            client=claude_client,
+            draft_cache=(draft_cache or DraftCache()) if use_draft_cache else None,
+            force_regenerate=force_regenerate,
+            # Streamed responses give each row's subject and partial draft (see on_partial) before it is complete
+            stream=stream_generation,
+        )
+        # Any connector with insert_many() can be passed as db instead (e.g. an in-memory one for benchmarks)
+        self.db = db or (SupabaseConnector() if db_type == 'supabase' else MongoDBConnector())
         self.linkedin_email = linkedin_email
         self.linkedin_password = linkedin_password
+        # Per-stage limits for the scrape -> generate -> persist pipeline
+        self.scrape_concurrency = max(1, scrape_concurrency)
+        self.generation_concurrency = max(1, generation_concurrency)
+        # Database rows are buffered and written in chunks of db_batch_size, at least every db_flush_interval seconds
+        self.db_batch_size = db_batch_size
+        self.db_flush_interval = db_flush_interval
+        # Local cache of scraped LinkedIn profiles shared across runs
+        self.profile_cache = (profile_cache or ProfileCache()) if use_profile_cache else None
+        self.last_run_stats = {}
+        # Stage timings and counters of the current (or last) run, see RunMetrics.summary()
+        self.last_run_metrics = RunMetrics()
+        # 'interactive' drafts each row as it is scraped; 'batch' sends all prompts as one Message Batches job
+        if generation_mode not in ('interactive', 'batch'):
+            raise ValueError(f"Unknown generation_mode: {generation_mode}")
+        self.generation_mode = generation_mode
+        self.batch_poll_interval = batch_poll_interval
+        # Durable per-row progress so an interrupted run can be resumed with resume(run_id)
+        self.journal = (journal or RunJournal()) if use_journal else None
+        self.last_run_id = None
+        # Optional header aliases: {'linkedin_aliases': [...], 'email_aliases': [...], 'name_aliases': [...]}
+        self.column_aliases = column_aliases or {}
+        # Streaming mode keeps memory flat for very large campaigns: profiles are reloaded from the journal when a
+        # worker picks the row up, and results stay in the journal (run() returns a paged JournalResults view)
+        if streaming and self.journal is None:
+            raise ValueError("Streaming mode stores results in the run journal, so it cannot be used with use_journal=False.")
+        self.streaming = streaming
+        # Set by cancel() (from any thread) to stop the current run after the rows already being drafted
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        """Stops the current run: no new rows are started, and run()/resume() raise RunCancelled once in-flight rows finish."""
+        self.cancel_event.set()
 
-    def run(self, course_details: str, persona: str, user_df: pd.DataFrame):
+    def _resolve_columns(self, user_df: pd.DataFrame) -> ColumnMap:
+        # Robust LinkedIn/email/name column detection (case-insensitive), resolved once per run
+        return resolve_columns(user_df.columns, **self.column_aliases)
+
+    def run(self, course_details: str, persona: str, user_df: pd.DataFrame, on_result=None, on_partial=None,
+            course_materials: str = None, on_run_created=None):
+        """
+        Scrapes, drafts and stores every row; returns the results in row order.
+        on_result(event) is called (from worker threads) as each row completes, see iter_run().
+        With stream_generation, on_partial(position, EmailDraft) is called as each draft's text arrives.
+        course_materials is a brochure summary (see CourseMaterialAgent) added to the course details.
+        on_run_created(run_id) is called as soon as the run is journaled, before any work starts.
+        """
         import logging
+        self.cancel_event.clear()
         logging.info("[Workflow] Loading course details and persona...")
+        # Journaled together, so a resumed run drafts from the same context
+        course_details = self.course_persona_agent.combine_course_details(course_details, course_materials)
         self.course_persona_agent.load(course_details, persona)
-        context = self.course_persona_agent.get_context()
-        results = []
-        # Robust LinkedIn column detection (case-insensitive)
-        linkedin_col = None
-        for col in user_df.columns:
-            if col.strip().lower() in ['linkedin', 'linkedin_url', 'linkedin profile', 'profile_link', 'linkedinprofile']:
-                linkedin_col = col
-                break
-        if not linkedin_col:
+        columns = self._resolve_columns(user_df)
+        if not columns.linkedin:
             print(f"No LinkedIn column found. Columns detected: {list(user_df.columns)}")
             return []
+        run_id = None
+        if self.journal is not None:
+            # Keep the inputs with the run so it can be resumed without the original upload
+            run_id = self.journal.create_run(
+                course_details, persona,
+                user_df.to_json(orient='split', date_format='iso', default_handler=str),
+                options={'generation_mode': self.generation_mode}
+            )
+            logging.info(f"[Workflow] Started run {run_id}.")
+            if on_run_created is not None:
+                on_run_created(run_id)
+        return self._execute_run(run_id, user_df, columns, {}, on_result, on_partial)
+
+    def resume(self, run_id: str, on_result=None, on_partial=None):
+        """
+        Continues an interrupted run from its journal: rows already persisted are returned as-is,
+        drafted rows are only written to the database, and profiles scraped earlier are not fetched again.
+        """
+        import io
+        import logging
+        if self.journal is None:
+            raise RuntimeError("Resuming needs the run journal, which is disabled for this workflow.")
+        self.cancel_event.clear()
+        run = self.journal.get_run(run_id)
+        if not run:
+            raise ValueError(f"Unknown run id: {run_id}")
+        logging.info(f"[Workflow] Resuming run {run_id}...")
+        self.course_persona_agent.load(run['course_details'], run['persona'])
+        user_df = pd.read_json(io.StringIO(run['user_rows']), orient='split')
+        columns = self._resolve_columns(user_df)
+        if not columns.linkedin:
+            return []
+        self.journal.set_status(run_id, 'running')
+        journal_rows = self.journal.get_rows(run_id, include_results=not self.streaming)
+        return self._execute_run(run_id, user_df, columns, journal_rows, on_result, on_partial)
+
+    def iter_run(self, course_details: str, persona: str, user_df: pd.DataFrame):
+        """
+        Runs the workflow in a background thread and yields an event per row as soon as it is drafted:
+        {'position', 'total', 'result', 'timings', 'completed', 'elapsed_sec', 'rows_per_sec', 'eta_sec'}.
+        timings holds the row's stage durations in seconds (None for rows restored from the journal).
+        """
+        return self._iter_events(lambda on_result: self.run(course_details, persona, user_df, on_result=on_result))
+
+    def iter_resume(self, run_id: str):
+        """Generator version of resume(), yielding the same events as iter_run()."""
+        return self._iter_events(lambda on_result: self.resume(run_id, on_result=on_result))
+
+    def _iter_events(self, start_run):
+        import queue
+        import threading
+        import time
+        events = queue.Queue()
+        finished = object()
+        failure = []
+
+        def worker():
+            try:
+                start_run(events.put)
+            except BaseException as e:
+                failure.append(e)
+            finally:
+                events.put(finished)
+
+        started = time.time()
+        # Daemon thread: if the caller stops iterating, the run still finishes and is journaled
+        threading.Thread(target=worker, name='workflow-run', daemon=True).start()
+        completed = 0
+        fresh = 0
+        while True:
+            event = events.get()
+            if event is finished:
+                break
+            completed += 1
+            if event['timings'] is not None:
+                fresh += 1
+            # Throughput is measured over rows processed in this run, excluding rows restored from the journal
+            elapsed = time.time() - started
+            rate = fresh / elapsed if elapsed > 0 else 0.0
+            remaining = event['total'] - completed
+            event.update({
+                'completed': completed,
+                'elapsed_sec': round(elapsed, 1),
+                'rows_per_sec': round(rate, 3),
+                'eta_sec': round(remaining / rate, 1) if rate > 0 else None,
+            })
+            yield event
+        if failure:
+            raise failure[0]
+
+    def _execute_run(self, run_id, user_df, columns, journal_rows, on_result=None, on_partial=None):
+        import logging
+        import time
+        from functools import partial
+        run_started = time.time()
+        context = self.course_persona_agent.get_context()
+        self.email_agent.reset_usage()
+        self.last_run_id = run_id
+        metrics = self.last_run_metrics = RunMetrics()
+        self.linkedin_scraper.metrics = metrics
+        self.email_agent.metrics = metrics
         # No login needed with Bright Data API
-        import random
-        # Batch LinkedIn URLs in groups of up to 10 for Bright Data API
-        linkedin_urls = [row.get(linkedin_col) for _, row in user_df.iterrows() if row.get(linkedin_col) and isinstance(row.get(linkedin_col), str) and row.get(linkedin_col).strip()]
-        profile_results = []
-        for i in range(0, len(linkedin_urls), 10):
-            batch = linkedin_urls[i:i+10]
+        # Keep only rows with a usable LinkedIn URL; their position fixes the order of the results
+        rows, skipped = extract_user_rows(user_df, columns)
+        if skipped:
+            logging.warning(f"[Workflow] Skipping {len(skipped)} rows with no valid LinkedIn URL: "
+                            f"{', '.join(str(idx+1) for idx in skipped[:20])}{'...' if len(skipped) > 20 else ''}")
+        # In streaming mode results are only kept in the journal; otherwise they are collected in row order
+        results = None if self.streaming else [None] * len(rows)
+        total_rows = len(user_df)
+        emit = self._result_emitter(on_result, len(rows))
+        # Work already recorded in the journal (only when resuming)
+        pending_positions = []
+        resumed_positions = set()
+        unpersisted_positions = []
+        for position in range(len(rows)):
+            entry = journal_rows.get(position)
+            if entry and entry['stage'] in ('drafted', 'persisted', 'sent'):
+                resumed_positions.add(position)
+                if results is not None:
+                    results[position] = entry['result']
+                    emit(position, entry['result'], None)
+                if entry['stage'] == 'drafted':
+                    unpersisted_positions.append(position)
+            else:
+                pending_positions.append(position)
+        if results is None and resumed_positions and on_result is not None:
+            for position, result in self.journal.iter_results(run_id):
+                if position in resumed_positions:
+                    emit(position, result, None)
+        # Canonical URL -> positions of every row that references it, so each profile is scraped once
+        url_index = build_url_index((position, rows[position].linkedin_url) for position in pending_positions)
+        known_urls = set()
+        if self.journal is not None and run_id and journal_rows:
+            known_urls = self.journal.get_profile_urls(run_id) & url_index.keys()
+
+        def stored_profile(url):
+            # Streaming mode hands workers a loader, so queued rows hold a URL rather than a whole profile
+            if self.streaming:
+                return partial(self.journal.get_profile, run_id, url)
+            return self.journal.get_profile(run_id, url) or {}
+
+        try:
+            # The DB writer is entered first so its final flush runs last, after every row has queued its inserts
+            # (and also when the run fails part-way)
+            with BufferedWriter(self.db, max_rows=self.db_batch_size, flush_interval=self.db_flush_interval, metrics=metrics) as db_writer, \
+                    ThreadPoolExecutor(self.generation_concurrency, thread_name_prefix='workflow-gen') as gen_pool:
+                row_errors = []
+
+                def process_url(url, profile_data, profile_cached, draft, profile_error, timings, prepared):
+                    # Rows sharing a profile get the same email, so it is generated for the first row and reused for the rest;
+                    # the profile is loaded and compacted once for all of them
+                    if callable(profile_data):
+                        profile_data = profile_data()
+                    if prepared is None:
+                        prepared = self.email_agent.prepare_profile({} if profile_error else (profile_data or {}))
+                    for position in url_index[url]:
+                        result = self._process_row(context, run_id, position, url, rows[position], profile_data, total_rows,
+                                                   db_writer, profile_cached, draft, timings, emit, on_partial, profile_error,
+                                                   prepared)
+                        if results is not None:
+                            results[position] = result
+                        if draft is None and not profile_error:
+                            draft = (result['email_draft'], result['email_error'])
+
+                def url_done(future):
+                    # Futures are not kept around (results are stored by process_url), so finished rows can be released right away
+                    if future.exception() is not None:
+                        row_errors.append(future.exception())
+
+                # Rows drafted before a crash (or whose writes failed) only still need the database writes they are missing
+                written = self.journal.get_written(run_id) if unpersisted_positions else {}
+                for position in unpersisted_positions:
+                    result = journal_rows[position]['result'] or self.journal.get_result(run_id, position)
+                    profile_json = self.journal.get_profile(run_id, journal_rows[position]['url']) or {}
+                    self._queue_db_writes(db_writer, run_id, position, result, profile_json, written.get(position, ()))
+
+                # In batch mode profiles are held back until scraping ends and all prompts go out as one batch job
+                deferred = {}
+                # Seconds from the start of the run until each profile was available
+                profile_ready = {}
+
+                def dispatch(url, profile_data, profile_cached, draft=None, profile_error='', prepared=None):
+                    if self.cancel_event.is_set():
+                        return
+                    profile_ready.setdefault(url, time.time() - run_started)
+                    # Failed scrapes have nothing to generate from, so they never wait for the message batch
+                    if self.generation_mode == 'batch' and draft is None and not profile_error:
+                        deferred[url] = (profile_data, profile_cached)
+                        return
+                    timings = {'run_started': run_started, 'scrape_sec': profile_ready[url], 'submitted_at': time.time()}
+                    gen_pool.submit(process_url, url, profile_data, profile_cached, draft, profile_error,
+                                    timings, prepared).add_done_callback(url_done)
+
+                def record_scraped(url, profile_data):
+                    if self.journal is not None and run_id and profile_data:
+                        self.journal.mark_scraped(run_id, url, url_index[url], profile_data)
+
+                # Profiles scraped before a crash, then cache hits, can go straight to email generation
+                for url in known_urls:
+                    dispatch(url, stored_profile(url), False)
+                # Serve previously scraped profiles from the local cache, a chunk at a time; only misses go to Bright Data
+                miss_urls = []
+                cache_hits = 0
+                lookup_urls = [url for url in url_index if url not in known_urls]
+                for i in range(0, len(lookup_urls), CACHE_LOOKUP_CHUNK):
+                    if self.cancel_event.is_set():
+                        break
+                    chunk = lookup_urls[i:i+CACHE_LOOKUP_CHUNK]
+                    cached_profiles = {}
+                    if self.profile_cache is not None:
+                        try:
+                            cached_profiles = self.profile_cache.get_profiles(chunk)
+                        except Exception as e:
+                            logging.error(f"[Workflow] Profile cache lookup failed: {e}")
+                    for url in chunk:
+                        profile_data = cached_profiles.get(url)
+                        if profile_data is None:
+                            miss_urls.append(url)
+                            continue
+                        cache_hits += 1
+                        record_scraped(url, profile_data)
+                        dispatch(url, stored_profile(url) if self.streaming else profile_data, True)
+                self.last_run_stats = {
+                    'run_id': run_id,
+                    'resumed_rows': len(resumed_positions),
+                    'unique_profiles': len(url_index),
+                    'duplicate_rows': len(pending_positions) - len(url_index),
+                    'profile_cache_hits': cache_hits,
+                    'profile_cache_misses': len(miss_urls),
+                }
+                if journal_rows:
+                    logging.info(f"[Workflow] Run {run_id}: {len(resumed_positions)} rows already drafted, "
+                                 f"{len(known_urls)} profiles already scraped.")
+                logging.info(f"[Workflow] {len(url_index)} unique profiles across {len(pending_positions)} rows. "
+                             f"Profile cache: {cache_hits} hits, {len(miss_urls)} misses.")
+                # Pack unique uncached URLs into full batches of 10 for Bright Data API
+                url_batches = [miss_urls[i:i+SCRAPE_BATCH_SIZE] for i in range(0, len(miss_urls), SCRAPE_BATCH_SIZE)]
+                # Stage 1: trigger the scrape batches together (at most scrape_concurrency snapshots in flight)
+                # Stage 2: hand each row to email generation as soon as its batch snapshot arrives
+                for batch_no, batch_results, scrape_error in self.linkedin_scraper.scrape_batches(url_batches, max_in_flight=self.scrape_concurrency):
+                    if self.cancel_event.is_set():
+                        # Closing the generator stops triggering; snapshots already triggered are left to expire
+                        break
+                    if scrape_error:
+                        logging.error(f"[Workflow] Error scraping batch {batch_no+1}: {scrape_error}")
+                    # Map results by canonical URL for lookup. input.url is the URL we sent; the echoed url may be
+                    # a redirect target or a different spelling, so it is only used for records without input
+                    url_to_profile = {}
+                    for item in batch_results:
+                        item_url = (item.get('input') or {}).get('url') or item.get('url')
+                        if item_url:
+                            url_to_profile[canonicalize_linkedin_url(item_url)] = item
+                    scraped = {}
+                    for url in url_batches[batch_no]:
+                        profile_data = url_to_profile.get(url, {})
+                        profile_error = record_error(profile_data)
+                        if profile_error and not profile_data and scrape_error:
+                            profile_error = f"Bright Data: {scrape_error}"
+                        if profile_error:
+                            # Error records (include_errors=true) are neither journaled nor cached, so a resume scrapes them again
+                            dispatch(url, {}, False, profile_error=profile_error)
+                            continue
+                        scraped[url] = profile_data
+                        record_scraped(url, profile_data)
+                        lazy = self.streaming and self.journal is not None and run_id
+                        dispatch(url, stored_profile(url) if lazy else profile_data, False)
+                    if self.profile_cache is not None and scraped:
+                        try:
+                            self.profile_cache.put_profiles(scraped)
+                        except Exception as e:
+                            logging.error(f"[Workflow] Failed to cache profiles from batch {batch_no+1}: {e}")
+                if deferred and not self.cancel_event.is_set():
+                    self._generate_batch(context, deferred, dispatch)
+                # Leaving the pool waits for the remaining rows
+            if self.cancel_event.is_set():
+                raise RunCancelled(f"Run {run_id} was cancelled.")
+            if row_errors:
+                raise row_errors[0]
+            logging.info("[Workflow] Flushed remaining database writes.")
+        except RunCancelled:
+            logging.warning(f"[Workflow] Run {run_id} cancelled.")
+            if self.journal is not None and run_id:
+                self.journal.set_status(run_id, 'cancelled')
+            raise
+        except BaseException:
+            if self.journal is not None and run_id:
+                self.journal.set_status(run_id, 'failed')
+            raise
+        if db_writer.records_failed:
+            # Rows whose records were not written stay 'drafted' in the journal, so resuming the run only retries those writes
+            logging.error(f"[Workflow] Run {run_id}: {db_writer.records_failed} database records could not be written; "
+                          f"resume the run to retry them.")
+        if self.journal is not None and run_id:
+            self.journal.set_status(run_id, 'failed' if db_writer.records_failed else 'completed')
+        # Token usage for the campaign, including how much of the shared prefix came from the prompt cache
+        usage = self.email_agent.get_usage()
+        self.last_run_stats['token_usage'] = usage
+        logging.info(f"[Workflow] Claude usage: {usage['requests']} requests ({usage['draft_cache_hits']} drafts reused), {usage['input_tokens']} input tokens, "
+                     f"{usage['cache_creation_input_tokens']} cache write tokens, {usage['cache_read_input_tokens']} cache read tokens, "
+                     f"{usage['output_tokens']} output tokens.")
+        self.last_run_stats['db_calls'] = db_writer.calls
+        self.last_run_stats['db_records_failed'] = db_writer.records_failed
+        report = metrics.summary()
+        self.last_run_stats['metrics'] = report
+        slowest = sorted(report['spans'].items(), key=lambda item: item[1]['total_sec'], reverse=True)[:5]
+        logging.info(f"[Workflow] Run took {report['elapsed_sec']:.1f}s ({report['rows_per_sec']:.2f} rows/s). Time by stage: "
+                     + ', '.join(f"{name} {stats['total_sec']:.1f}s (p95 {stats['p95_sec']:.2f}s)" for name, stats in slowest))
+        # No close needed for Bright Data agent
+        if not rows:
+            print(f"No valid LinkedIn URLs found in column '{columns.linkedin}'.")
+        if results is None:
+            return JournalResults(self.journal, run_id)
+        return results
+
+    def _generate_batch(self, context, deferred, dispatch):
+        import logging
+        # One request per unique profile; custom_id maps each result back to its URL and so to its rows
+        custom_ids = {f"profile-{i}": url for i, url in enumerate(deferred)}
+        profiles = {}
+        # Size estimates of each compacted profile, passed on so the rows do not compact it again
+        profile_stats = {}
+        for custom_id, url in custom_ids.items():
+            profile_data = deferred[url][0]
+            profile_data = profile_data() if callable(profile_data) else profile_data
+            if profile_data:
+                # Only the compacted text is kept for the batch request
+                profile_text, profile_stats[custom_id] = self.email_agent.prepare_profile(profile_data)
+                profiles[custom_id] = {'profile_text': profile_text}
+        logging.info(f"[Workflow] Submitting {len(profiles)} prompts as a message batch...")
+        try:
+            drafts = self.email_agent.generate_emails_batch(context, profiles, poll_interval=self.batch_poll_interval,
+                                                            should_stop=self.cancel_event.is_set) if profiles else {}
+        except Exception as e:
+            if self.cancel_event.is_set():
+                raise RunCancelled("Run cancelled while waiting for the message batch.") from e
+            logging.error(f"[Workflow] Message batch failed: {e}")
+            drafts = {custom_id: ('', f"Email generation error: {e}") for custom_id in profiles}
+        profiles.clear()
+        for custom_id, url in custom_ids.items():
+            profile_data, profile_cached = deferred.pop(url)
+            # The compacted text is not needed again: these rows already have their draft
+            prepared = ('', profile_stats[custom_id]) if custom_id in profile_stats else None
+            dispatch(url, profile_data, profile_cached, drafts.get(custom_id, ('', '')), prepared=prepared)
+
+    def _result_emitter(self, on_result, total):
+        import logging
+        if on_result is None:
+            return lambda position, result, timings: None
+
+        def emit(position, result, timings):
+            try:
+                on_result({'position': position, 'total': total, 'result': result, 'timings': timings})
+            except Exception as e:
+                # A broken progress consumer must not fail the row
+                logging.error(f"[Workflow] Result callback failed for row {position+1}: {e}")
+        return emit
+
+    def _process_row(self, context, run_id, position, url, user_row: UserRow, profile_data, total_rows, db_writer,
+                     profile_cached=False, draft=None, timings=None, emit=None, on_partial=None, profile_error='',
+                     prepared=None):
+        import logging
+        import time
+        if self.cancel_event.is_set():
+            # Rows still queued when the run was cancelled are left for a later resume
+            raise RunCancelled(f"Run {run_id} was cancelled.")
+        started = time.time()
+        idx = user_row.row_index
+        logging.debug(f"[Workflow] Processing row {idx+1} of {total_rows}.")
+        # Keep the raw Bright Data JSON profile for the database; Claude gets a compacted copy
+        if callable(profile_data):
+            profile_data = profile_data()
+        profile_json = {} if profile_error else (profile_data or {})
+        profile_error = profile_error or ('' if profile_json else 'No profile data returned')
+        if profile_error:
+            logging.error(f"[Workflow] Error scraping profile for row {idx+1}: {profile_error}")
+        # Prepare user profile data for email generation: compact it once (prepared, when the caller already did)
+        # and keep the size savings for the result
+        profile_text, profile_stats = prepared or self.email_agent.prepare_profile(profile_json)
+        if profile_json:
+            logging.debug(f"[Workflow] Compacted profile for row {idx+1}: ~{profile_stats['profile_tokens_raw']} -> ~{profile_stats['profile_tokens_compact']} tokens.")
+        profile = {
+            'profile_json': profile_json,
+            'profile_text': profile_text
+        }
+        email_draft = EmailDraft()
+        email_error = ''
+        if draft is not None:
+            # Already generated, through the message batch or for an earlier row with the same profile
+            email, email_error = draft
+            email_draft = EmailDraft.from_text(email)
+        elif profile_json and not profile_error:
             try:
-                batch_results = self.linkedin_scraper.scrape_linkedin_profiles(batch)
-                profile_results.extend(batch_results)
+                logging.debug(f"[Workflow] Sending profile, course details, and persona to Claude for row {idx+1}...")
+                # Generate an email draft based on the user's profile and course context
+                email_draft = self.email_agent.generate_draft(
+                    context, profile, on_partial=(lambda partial_draft: on_partial(position, partial_draft)) if on_partial else None
+                )
+                logging.debug(f"[Workflow] Email draft generated for row {idx+1}.")
             except Exception as e:
-                logging.error(f"[Workflow] Error scraping batch {i//10+1}: {e}")
-        # Map results by URL for lookup
-        url_to_profile = {item.get('url') or item.get('input', {}).get('url'): item for item in profile_results}
-        for idx, row in user_df.iterrows():
-            linkedin_url = row.get(linkedin_col)
-            if not linkedin_url or not isinstance(linkedin_url, str) or not linkedin_url.strip():
-                logging.warning(f"[Workflow] Skipping row {idx+1}: No valid LinkedIn URL found.")
-                continue
-            logging.info(f"[Workflow] Processing row {idx+1} of {len(user_df)}.")
-            profile_data = url_to_profile.get(linkedin_url.strip(), {})
-            # Use the entire Bright Data JSON profile for Claude
-            profile_json = profile_data if profile_data else {}
-            profile_error = '' if profile_data else 'No profile data returned'
-            logging.info(f"[Workflow] Scraped profile for row {idx+1}: {profile_json}")
-            if profile_error:
-                logging.error(f"[Workflow] Error scraping profile for row {idx+1}: {profile_error}")
-            # Get the email address for this user from the uploaded file
-            email_value = None
-            for possible_email_col in ['email', 'Email', 'EMAIL']:
-                if possible_email_col in row and pd.notnull(row[possible_email_col]):
-                    email_value = row[possible_email_col]
-                    break
-            # Save user data for database insertion
-            name_value = row.get('First Name') or row.get('Name') or row.get('name')
-            db_record = {
-                'name': name_value,
-                'email': email_value,
-                'linkedin_url': linkedin_url,
+                email_error = f"Email generation error: {e}"
+                logging.error(f"[Workflow] Email generation failed for row {idx+1}: {e}")
+        result = {
+            'name': user_row.name,
+            'email': user_row.email,
+            'linkedin_url': user_row.linkedin_url,
+            'email_draft': email_draft.text,
+            # Split once here, so the UI and the sender never re-parse the draft
+            'email_subject': email_draft.subject,
+            'email_body': email_draft.body,
+            'profile_error': profile_error,
+            'email_error': email_error,
+            'profile_cached': profile_cached,
+            **profile_stats
+        }
+        if self.journal is not None and run_id:
+            self.journal.mark_drafted(run_id, position, url, result)
+        self._queue_db_writes(db_writer, run_id, position, result, profile_json)
+        finished = time.time()
+        timings = timings or {'run_started': started, 'scrape_sec': 0.0, 'submitted_at': started}
+        generate_sec = finished - started
+        if draft is not None:
+            # Drafted through the message batch: the wait for the batch counts as generation time (~0 for reused drafts)
+            generate_sec += timings['submitted_at'] - timings['run_started'] - timings['scrape_sec']
+        metrics = self.last_run_metrics
+        metrics.increment('workflow.rows_completed')
+        if profile_error or email_error:
+            metrics.increment('workflow.rows_failed')
+        metrics.observe('workflow.profile_ready', timings['scrape_sec'])
+        metrics.observe('workflow.queue_wait', started - timings['submitted_at'])
+        metrics.observe('workflow.row', finished - timings['run_started'])
+        if emit is not None:
+            emit(position, result, {
+                'scrape_sec': round(timings['scrape_sec'], 3),
+                'queue_sec': round(started - timings['submitted_at'], 3),
+                'generate_sec': round(generate_sec, 3),
+                # Only for streamed drafts: seconds from the Claude request to the first text and to the subject line
+                'first_token_sec': round(email_draft.latency['first_token'], 3) if 'first_token' in email_draft.latency else None,
+                'subject_sec': round(email_draft.latency['subject'], 3) if 'subject' in email_draft.latency else None,
+                'total_sec': round(finished - timings['run_started'], 3),
+            })
+        return result
+
+    def _queue_db_writes(self, db_writer, run_id, position, result, profile_json, written=()):
+        from functools import partial
+        # Save user data and the drafted email; the row counts as persisted once both records are written.
+        # Tables in written were already written by an earlier attempt and are skipped
+        records = {
+            'outreach_results': {
+                'name': result['name'],
+                'email': result['email'],
+                'linkedin_url': result['linkedin_url'],
                 'email_draft': '',
                 'profile_json': profile_json,
-                'profile_error': profile_error,
+                'profile_error': result['profile_error'],
                 'email_error': ''
-            }
-            try:
-                logging.info(f"[Workflow] Inserting scraped data for row {idx+1} into database...")
-                self.db.insert('outreach_results', db_record)
-                logging.info(f"[Workflow] Successfully inserted row {idx+1} into database.")
-            except Exception as e:
-                logging.error(f"[Workflow] Database insert failed for row {idx+1}: {e}")
-            # Prepare user profile data for email generation
-            profile = {
-                'profile_json': profile_json
-            }
-            email = ''
-            email_error = ''
-            if profile_json and not profile_error:
-                try:
-                    logging.info(f"[Workflow] Sending profile, course details, and persona to Claude for row {idx+1}...")
-                    # Generate an email draft based on the user's profile and course context
-                    email = self.email_agent.generate_email(context, profile)
-                    logging.info(f"[Workflow] Email draft generated for row {idx+1}.")
-                except Exception as e:
-                    email_error = f"Email generation error: {e}"
-                    logging.error(f"[Workflow] Email generation failed for row {idx+1}: {e}")
-            # Add the email draft to the results list and insert into the drafted emails table
-            result = {
-                'name': db_record['name'],
-                'email': db_record['email'],
-                'linkedin_url': linkedin_url,
-                'email_draft': email,
-                'profile_error': profile_error,
-                'email_error': email_error
-            }
-            results.append(result)
-            try:
-                self.db.insert('drafted_emails', {
-                    'name': name_value,
-                    'email': email_value,
-                    'email_draft': email
-                })
-            except Exception as e:
-                logging.error(f"[Workflow] Failed to insert drafted email for row {idx+1}: {e}")
-            # Wait 1-2 seconds between requests to avoid rate-limiting
-            import time
-            import random
-            delay = random.uniform(1, 2)
-            logging.info(f"[Workflow] Waiting {delay:.2f} seconds before next profile...")
-            time.sleep(delay)
-        # No close needed for Bright Data agent
-        if not results:
-            print(f"No valid LinkedIn URLs found in column '{linkedin_col}'.")
-        return results
+            },
+            'drafted_emails': {
+                'name': result['name'],
+                'email': result['email'],
+                'email_draft': result['email_draft']
+            },
+        }
+        pending = [table for table in records if table not in written]
+        remaining = [len(pending)]
+        journaled = self.journal is not None and run_id
+
+        def on_persisted(table):
+            remaining[0] -= 1
+            if not journaled:
+                return
+            if remaining[0] == 0:
+                self.journal.mark_persisted(run_id, position)
+            else:
+                self.journal.mark_written(run_id, position, table)
+
+        if not pending and journaled:
+            self.journal.mark_persisted(run_id, position)
+        for table in pending:
+            db_writer.add(table, records[table], partial(on_persisted, table))
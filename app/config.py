@@ -0,0 +1,56 @@
+import json
+import os
+import sys
+from typing import Any, Dict
+
+# Settings loaded from a config file with load_config_file()
+_file_settings: Dict[str, Any] = {}
+
+
+def load_config_file(path: str) -> Dict[str, Any]:
+    """Loads settings from a JSON or TOML file; they take precedence over Streamlit secrets but not over the environment."""
+    if path.endswith('.toml'):
+        try:
+            import tomllib
+        except ImportError:
+            # Python < 3.11 (e.g. the Docker image): the same parser from PyPI
+            import tomli as tomllib
+        with open(path, 'rb') as f:
+            settings = tomllib.load(f)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            settings = json.load(f)
+    _file_settings.clear()
+    _file_settings.update(settings)
+    return settings
+
+
+def get_setting(name: str, default: Any = None) -> Any:
+    """
+    Looks a setting up in the environment, then the loaded config file (APP_CONFIG_FILE is loaded on first use),
+    then Streamlit secrets. Streamlit is only consulted when the app is already running under it,
+    so headless workers never import it.
+    """
+    value = os.environ.get(name)
+    if value not in (None, ''):
+        return value
+    if not _file_settings and os.environ.get('APP_CONFIG_FILE'):
+        load_config_file(os.environ['APP_CONFIG_FILE'])
+    if name in _file_settings:
+        return _file_settings[name]
+    if 'streamlit' in sys.modules:
+        try:
+            import streamlit as st
+            if name in st.secrets:
+                return st.secrets[name]
+        except Exception:
+            # No secrets.toml configured
+            pass
+    return default
+
+
+def require_setting(name: str) -> Any:
+    value = get_setting(name)
+    if value in (None, ''):
+        raise ValueError(f"{name} not found. Set it in your environment, config file or Streamlit secrets.")
+    return value
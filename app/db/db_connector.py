@@ -1,20 +1,46 @@
-import streamlit as st
-from typing import Any, Dict
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import get_setting, require_setting
+from app.utils.hashing import content_hash
+from app.utils.metrics import RunMetrics
+
+
+class PartialInsertError(Exception):
+    """Raised by insert_many when only some records were written; failed_indexes point into the input list."""
+    def __init__(self, failed_indexes: List[int], message: str):
+        super().__init__(message)
+        self.failed_indexes = failed_indexes
 
 class SupabaseConnector:
     def __init__(self):
         from supabase import create_client, Client
-        self.url = st.secrets["SUPABASE_URL"]
-        self.key = st.secrets["SUPABASE_KEY"]
+        self.url = require_setting("SUPABASE_URL")
+        self.key = require_setting("SUPABASE_KEY")
         self.client: Client = create_client(self.url, self.key)
 
-    def insert(self, table: str, record: Dict[str, Any]):
-        # If record contains a pdf_blob_path, read as bytes and store as pdf_blob
+    def _prepare_record(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        # If record contains a pdf_blob_path, stream the file to storage and keep its storage path in the row.
+        # Stored under its content hash: two brochures both called brochure.pdf must not overwrite each other
         if 'pdf_blob_path' in record and record['pdf_blob_path']:
-            with open(record['pdf_blob_path'], 'rb') as f:
-                record['pdf_blob'] = f.read()
+            path = record.pop('pdf_blob_path')
+            record['pdf_storage_path'] = self.upload_file(get_setting('SUPABASE_BLOB_BUCKET', 'course-materials'),
+                                                          content_hash(path, with_extension=True), path)
+        elif 'pdf_blob_path' in record:
             del record['pdf_blob_path']
-        return self.client.table(table).insert(record).execute()
+        return record
+
+    def upload_file(self, bucket: str, name: str, path: str, content_type: str = 'application/pdf') -> str:
+        """Uploads a local file to Supabase Storage from its path (read in chunks, never fully in memory); returns bucket/name."""
+        self.client.storage.from_(bucket).upload(name, path, {'content-type': content_type, 'upsert': 'true'})
+        return f"{bucket}/{name}"
+
+    def insert(self, table: str, record: Dict[str, Any]):
+        return self.client.table(table).insert(self._prepare_record(record)).execute()
+
+    def insert_many(self, table: str, records: List[Dict[str, Any]]):
+        # A single array insert is one statement, so it either fully succeeds or fails as a whole
+        return self.client.table(table).insert([self._prepare_record(record) for record in records]).execute()
 
     def fetch(self, table: str, query: Dict[str, Any] = None):
         q = self.client.table(table)
@@ -26,12 +52,128 @@ class SupabaseConnector:
 class MongoDBConnector:
     def __init__(self):
         from pymongo import MongoClient
-        self.url = st.secrets.get('MONGODB_URL', 'mongodb://localhost:27017/')
+        self.url = get_setting('MONGODB_URL', 'mongodb://localhost:27017/')
         self.client = MongoClient(self.url)
-        self.db = self.client[st.secrets.get('MONGODB_DB', 'email_agent')]
+        self.db = self.client[get_setting('MONGODB_DB', 'email_agent')]
 
     def insert(self, collection: str, record: Dict[str, Any]):
         return self.db[collection].insert_one(record)
 
+    def insert_many(self, collection: str, records: List[Dict[str, Any]]):
+        from pymongo.errors import BulkWriteError
+        try:
+            # Unordered so one bad document doesn't stop the rest of the chunk
+            return self.db[collection].insert_many(records, ordered=False)
+        except BulkWriteError as e:
+            # Duplicate keys (11000) mean an earlier attempt already wrote the document
+            failed = [err['index'] for err in e.details.get('writeErrors', []) if err.get('code') != 11000]
+            if failed:
+                raise PartialInsertError(failed, f"{len(failed)} of {len(records)} documents failed: {e}") from e
+
     def fetch(self, collection: str, query: Dict[str, Any] = None):
         return list(self.db[collection].find(query or {}))
+
+    def upload_file(self, bucket: str, name: str, path: str, content_type: str = 'application/pdf') -> str:
+        """Stores a local file in GridFS, written in chunks from the open file; returns the file id."""
+        import gridfs
+        with open(path, 'rb') as f:
+            return str(gridfs.GridFS(self.db, collection=bucket).put(f, filename=name, content_type=content_type))
+
+class BufferedWriter:
+    """
+    Buffers inserts per table and writes them with the connector's insert_many, flushing whenever a table
+    reaches max_rows records and every flush_interval seconds from a background thread.
+    Failed chunks are retried; use as a context manager (or call close()) so the tail is flushed on exit.
+    """
+    def __init__(self, db, max_rows: int = 200, flush_interval: float = 2.0, max_retries: int = 3, retry_backoff: float = 1.0,
+                 metrics: Optional[RunMetrics] = None):
+        self.db = db
+        self.metrics = metrics or RunMetrics()
+        self.max_rows = max(1, max_rows)
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.calls = 0
+        self.records_written = 0
+        self.records_failed = 0
+        self._buffers: Dict[str, List] = {}
+        self._lock = threading.Lock()
+        # Serializes flushes so the background thread and add() never write the same table concurrently
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._flush_periodically, name='db-writer', daemon=True)
+        self._thread.start()
+
+    def add(self, table: str, record: Dict[str, Any], on_persisted: Optional[Callable[[], None]] = None):
+        """Queues a record; on_persisted is called once it has been written."""
+        with self._lock:
+            buffer = self._buffers.setdefault(table, [])
+            buffer.append((record, on_persisted))
+            full = len(buffer) >= self.max_rows
+        if full:
+            self.flush(table)
+
+    def flush(self, table: Optional[str] = None):
+        with self._flush_lock:
+            with self._lock:
+                tables = [table] if table else list(self._buffers)
+                pending = {name: self._buffers.pop(name, []) for name in tables}
+            for name, items in pending.items():
+                for i in range(0, len(items), self.max_rows):
+                    self._write_chunk(name, items[i:i+self.max_rows])
+
+    def _write_chunk(self, table: str, items: List):
+        import logging
+        import time
+        attempt = 0
+        while items:
+            self.calls += 1
+            error = None
+            try:
+                with self.metrics.span('db.insert'):
+                    self.db.insert_many(table, [record for record, _ in items])
+                failed = set()
+            except PartialInsertError as e:
+                failed = set(e.failed_indexes)
+                error = e
+            except Exception as e:
+                failed = set(range(len(items)))
+                error = e
+            for i, (_, on_persisted) in enumerate(items):
+                if i not in failed:
+                    self.records_written += 1
+                    self.metrics.increment('db.records_written')
+                    if on_persisted:
+                        on_persisted()
+            if not failed:
+                logging.info(f"[BufferedWriter] Wrote {len(items)} records to {table}.")
+                return
+            if attempt >= self.max_retries:
+                self.records_failed += len(failed)
+                self.metrics.increment('db.records_failed', len(failed))
+                logging.error(f"[BufferedWriter] Giving up on {len(failed)} records for {table} after {attempt+1} attempts: {error}")
+                return
+            attempt += 1
+            self.metrics.increment('db.retries')
+            logging.warning(f"[BufferedWriter] Insert into {table} failed ({error}); retrying {len(failed)} records (attempt {attempt}/{self.max_retries}).")
+            time.sleep(self.retry_backoff * (2 ** (attempt - 1)))
+            items = [items[i] for i in sorted(failed)]
+
+    def _flush_periodically(self):
+        import logging
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"[BufferedWriter] Background flush failed: {e}")
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,185 @@
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.utils.metrics import RunMetrics
+from app.utils.rate_limit import TokenBucket
+
+API_URL = 'https://api.anthropic.com/v1/messages'
+ANTHROPIC_VERSION = '2023-06-01'
+# 429 = rate limited, 529 = overloaded; the 5xx codes are transient server errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504, 529}
+# Transport failures while reading a streamed body (dropped connection, truncated chunk, read timeout), worth retrying
+STREAM_TRANSPORT_ERRORS = (requests.exceptions.ChunkedEncodingError, requests.ConnectionError, requests.Timeout)
+
+
+class ClaudeAPIError(RuntimeError):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"[Error from Claude API: {status_code}] {message}")
+        self.status_code = status_code
+
+
+class ClaudeClient:
+    """
+    Shared Claude Messages API client for the generation workers.
+    Reuses keep-alive connections from one pooled session, caps the number of in-flight requests,
+    paces calls with request/min and token/min buckets, and retries 429/529/5xx responses using retry-after.
+    """
+    def __init__(self, api_key: str, api_url: str = API_URL, max_in_flight: int = 8,
+                 requests_per_min: float = 50, tokens_per_min: float = 50000,
+                 timeout: float = 60, max_retries: int = 5, backoff_base: float = 1.0, backoff_max: float = 60.0,
+                 request_bucket: Optional[TokenBucket] = None, token_bucket: Optional[TokenBucket] = None,
+                 slots: Optional[threading.Semaphore] = None, session: Optional[requests.Session] = None):
+        self.api_key = api_key
+        self.api_url = api_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # A session can be passed in to share one connection pool between clients; close() leaves it open then
+        self._owns_session = session is None
+        self.session = session or self.create_session(max_in_flight)
+        self.headers = {
+            'x-api-key': self.api_key,
+            'anthropic-version': ANTHROPIC_VERSION,
+            'content-type': 'application/json'
+        }
+        # Buckets and in-flight slots can be passed in to share one API budget between clients (see CampaignScheduler)
+        self._slots = slots or threading.BoundedSemaphore(max_in_flight)
+        self.request_bucket = request_bucket or TokenBucket.per_minute(requests_per_min)
+        self.token_bucket = token_bucket or TokenBucket.per_minute(tokens_per_min)
+        # Request latency, local rate-limit waits and retry counts
+        self.metrics = RunMetrics()
+
+    @staticmethod
+    def create_session(pool_size: int = 8) -> requests.Session:
+        """A keep-alive session with room for pool_size concurrent connections."""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def retry_delay(self, attempt: int, resp: Optional[requests.Response] = None) -> float:
+        """Seconds to wait before retry number attempt: the response's retry-after if given, else jittered backoff."""
+        if resp is not None:
+            retry_after = resp.headers.get('retry-after')
+            if retry_after:
+                try:
+                    return max(0.0, float(retry_after))
+                except ValueError:
+                    pass
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _send(self, method: str, url: str, payload: Optional[Dict[str, Any]] = None, estimated_tokens: int = 0,
+              rate_limited: bool = True, stream: bool = False) -> requests.Response:
+        """
+        Sends one API request through the shared session, retrying transient failures.
+        With stream=True the body is left unread and the caller must release the in-flight slot (see stream_message()).
+        """
+        import logging
+        attempt = 0
+        while True:
+            if rate_limited:
+                with self.metrics.span('claude.rate_limit_wait'):
+                    self.request_bucket.acquire(1)
+                    if estimated_tokens:
+                        self.token_bucket.acquire(estimated_tokens)
+            resp = None
+            error = None
+            self._slots.acquire()
+            self.metrics.increment('claude.requests')
+            try:
+                with self.metrics.span('claude.request'):
+                    resp = self.session.request(method, url, json=payload, headers=self.headers, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            finally:
+                # A successful stream keeps its slot until the body has been read
+                if not (stream and resp is not None and resp.status_code == 200):
+                    self._slots.release()
+            if resp is not None and resp.status_code == 200:
+                return resp
+            retryable = error is not None or resp.status_code in RETRYABLE_STATUS_CODES
+            if not retryable or attempt >= self.max_retries:
+                if error is not None:
+                    raise error
+                raise ClaudeAPIError(resp.status_code, resp.text)
+            delay = self.retry_delay(attempt, resp)
+            reason = error if error is not None else f"HTTP {resp.status_code}"
+            logging.warning(f"[ClaudeClient] {reason}; retrying in {delay:.1f}s (attempt {attempt+1}/{self.max_retries}).")
+            self.metrics.increment('claude.retries')
+            if resp is not None and resp.status_code == 429:
+                self.metrics.increment('claude.rate_limited')
+            time.sleep(delay)
+            attempt += 1
+
+    def create_message(self, payload: Dict[str, Any], estimated_tokens: int = 0) -> Dict[str, Any]:
+        """POSTs one Messages API request and returns the parsed response, retrying transient failures."""
+        return self._send('POST', self.api_url, payload, estimated_tokens=estimated_tokens).json()
+
+    def stream_message(self, payload: Dict[str, Any], estimated_tokens: int = 0,
+                       on_open: Optional[Callable[[], None]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Streams one Messages API request and yields its server-sent events as dicts (message_start,
+        content_block_delta, message_delta, message_stop...). Failures before the stream starts are retried like
+        create_message(); an error event mid-stream raises ClaudeAPIError, and a broken connection one of
+        STREAM_TRANSPORT_ERRORS, which callers retry by streaming again. on_open is called once the response
+        has started, so callers can tell those mid-stream failures apart. Closing the iterator early closes the connection.
+        """
+        import json
+        resp = self._send('POST', self.api_url, {**payload, 'stream': True}, estimated_tokens=estimated_tokens, stream=True)
+        try:
+            if on_open is not None:
+                on_open()
+            for line in resp.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                event = json.loads(line[len('data:'):].strip())
+                if event.get('type') == 'error':
+                    error = event.get('error') or {}
+                    raise ClaudeAPIError(529 if error.get('type') == 'overloaded_error' else 500, error.get('message') or str(error))
+                yield event
+        finally:
+            # The body ends right after message_stop; once fully read, the connection goes back to the pool
+            resp.close()
+            self._slots.release()
+
+    # Message Batches API. Batches have their own quota, so these calls skip the per-minute buckets.
+
+    @property
+    def batches_url(self) -> str:
+        return self.api_url.rstrip('/') + '/batches'
+
+    def create_batch(self, requests_: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Submits [{'custom_id': ..., 'params': {...}}, ...] as one batch and returns the batch object."""
+        return self._send('POST', self.batches_url, {'requests': requests_}, rate_limited=False).json()
+
+    def get_batch(self, batch_id: str) -> Dict[str, Any]:
+        return self._send('GET', f"{self.batches_url}/{batch_id}", rate_limited=False).json()
+
+    def cancel_batch(self, batch_id: str) -> Dict[str, Any]:
+        return self._send('POST', f"{self.batches_url}/{batch_id}/cancel", rate_limited=False).json()
+
+    def iter_batch_results(self, batch: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Streams the JSONL results of an ended batch, one result object per request."""
+        import json
+        url = batch.get('results_url') or f"{self.batches_url}/{batch['id']}/results"
+        # Read line by line as it downloads, so a large batch's results are never held in memory at once
+        resp = self._send('GET', url, rate_limited=False, stream=True)
+        try:
+            for line in resp.iter_lines(decode_unicode=True):
+                if line and line.strip():
+                    yield json.loads(line)
+        finally:
+            resp.close()
+            self._slots.release()
+
+    def close(self):
+        if self._owns_session:
+            self.session.close()
@@ -0,0 +1,46 @@
+import hashlib
+import json
+from typing import Dict, Optional
+
+from app.utils.sqlite_cache import SQLiteCache
+
+DEFAULT_CACHE_PATH = '.cache/email_drafts.sqlite3'
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 200000
+
+
+class DraftCache:
+    """
+    Local on-disk cache of generated email drafts, so re-running an unchanged campaign (same course, persona,
+    profile and model) costs no Claude tokens. Entries are keyed by a hash of the full Messages API request,
+    so any change to the prompt template, model or max_tokens also misses the cache.
+    """
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS,
+                 max_entries: Optional[int] = DEFAULT_MAX_ENTRIES):
+        self.store = SQLiteCache(path, table='email_drafts', default_ttl=ttl_seconds, max_entries=max_entries)
+
+    @staticmethod
+    def key_for(request: Dict) -> str:
+        return hashlib.sha256(json.dumps(request, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self.store.get(key)
+        return entry['email'] if entry else None
+
+    def get_many(self, keys) -> Dict[str, str]:
+        return {key: entry['email'] for key, entry in self.store.get_many(keys).items()}
+
+    def put(self, key: str, email: str, model: str = None):
+        self.put_many({key: email}, model=model)
+
+    def put_many(self, drafts: Dict[str, str], model: str = None):
+        self.store.set_many({key: {'email': email, 'model': model} for key, email in drafts.items() if email})
+
+    def invalidate(self, key: str):
+        self.store.delete(key)
+
+    def clear(self):
+        self.store.clear()
+
+    def close(self):
+        self.store.close()
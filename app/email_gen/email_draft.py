@@ -0,0 +1,44 @@
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+SUBJECT_PREFIX = 'subject:'
+
+
+def _strip_subject_prefix(line: str) -> str:
+    subject = line.strip()
+    if subject.lower().startswith(SUBJECT_PREFIX):
+        subject = subject[len(SUBJECT_PREFIX):].strip()
+    return subject
+
+
+def split_subject_body(draft: Optional[str]) -> Tuple[str, str]:
+    """Splits a draft into (subject, body): the first line, without any 'Subject:' prefix, and the rest."""
+    if not draft:
+        return '', ''
+    if '\n' in draft or '\r' in draft:
+        first_line, *rest = draft.splitlines()
+        return _strip_subject_prefix(first_line), '\n'.join(rest).strip()
+    return _strip_subject_prefix(draft), ''
+
+
+@dataclass
+class EmailDraft:
+    """
+    A generated email, already split into subject and body (text is the draft exactly as the model wrote it).
+    usage is the response's token usage (empty for drafts reused from the draft cache); latency holds seconds
+    from the start of the request to 'first_token', 'subject' (first line complete) and 'total'.
+    While streaming, partial drafts have complete=False and subject is empty until the first line has arrived.
+    """
+    text: str = ''
+    subject: str = ''
+    body: str = ''
+    usage: Dict[str, int] = field(default_factory=dict)
+    latency: Dict[str, float] = field(default_factory=dict)
+    stop_reason: Optional[str] = None
+    cached: bool = False
+    complete: bool = True
+
+    @classmethod
+    def from_text(cls, text: str, **kwargs) -> 'EmailDraft':
+        subject, body = split_subject_body(text)
+        return cls(text=text, subject=subject, body=body, **kwargs)
@@ -1,16 +1,50 @@
 import os
-import requests
-from typing import Dict
+import threading
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from app.config import get_setting
+from app.email_gen.claude_client import RETRYABLE_STATUS_CODES, STREAM_TRANSPORT_ERRORS, ClaudeAPIError, ClaudeClient
+from app.email_gen.draft_cache import DraftCache
+from app.email_gen.email_draft import EmailDraft, split_subject_body
+from app.email_gen.profile_compaction import (
+    DEFAULT_MAX_LIST_ITEMS, DEFAULT_PROFILE_FIELDS, compact_profile, estimate_tokens, serialize_profile
+)
+
+MAX_TOKENS = 512
+# Message Batches API limit on requests per batch
+MAX_BATCH_REQUESTS = 100000
+# Token counters summed from each response's usage block
+USAGE_KEYS = ('input_tokens', 'output_tokens', 'cache_creation_input_tokens', 'cache_read_input_tokens')
 
 class EmailGenerationAgent:
     """
     Generates personalized emails using the Claude API, based on the provided context and profile data.
     """
-    def __init__(self):
-        import streamlit as st
-        self.api_key = st.secrets.get('CLAUDE_API_KEY') or st.secrets.get('ANTHROPIC_API_KEY')
-        self.api_url = 'https://api.anthropic.com/v1/messages'
+    def __init__(self, client: ClaudeClient = None, profile_fields: Iterable[str] = DEFAULT_PROFILE_FIELDS,
+                 max_list_items: int = DEFAULT_MAX_LIST_ITEMS, draft_cache: DraftCache = None,
+                 force_regenerate: bool = False, stream: bool = False):
+        self.api_key = get_setting('CLAUDE_API_KEY') or get_setting('ANTHROPIC_API_KEY')
+        self.api_url = get_setting('CLAUDE_API_URL', 'https://api.anthropic.com/v1/messages')
         self.model = 'claude-3-5-haiku-20241022'  # Or another Claude model
+        # One pooled client per agent; limits default to Anthropic tier 1 and can be raised in settings
+        self.client = client or ClaudeClient(
+            self.api_key,
+            api_url=self.api_url,
+            max_in_flight=int(get_setting('CLAUDE_MAX_IN_FLIGHT', 8)),
+            requests_per_min=float(get_setting('CLAUDE_REQUESTS_PER_MIN', 50)),
+            tokens_per_min=float(get_setting('CLAUDE_TOKENS_PER_MIN', 50000)),
+        )
+        self._usage_lock = threading.Lock()
+        self.reset_usage()
+        # Which profile fields reach the prompt, and how many entries of each list (experience, posts...) are kept
+        self.profile_fields = tuple(profile_fields)
+        self.max_list_items = max_list_items
+        # Drafts for identical requests are reused from draft_cache unless force_regenerate is set;
+        # fresh drafts are still written to the cache, so forcing also refreshes it
+        self.draft_cache = draft_cache
+        self.force_regenerate = force_regenerate
+        # Stream responses (server-sent events) so the subject and partial drafts are available before the end
+        self.stream = stream
 
     def _clean_and_summarize_profile_text(self, profile_text: str) -> str:
         """
@@ -33,40 +67,282 @@ class EmailGenerationAgent:
             cleaned = ' '.join(words[:1200]) + '\n...[truncated]'
         return cleaned
 
-    def generate_email(self, context: Dict[str, str], profile: Dict[str, str]) -> str:
-        import logging
+    def prepare_profile(self, profile_json: Dict) -> Tuple[str, Dict[str, int]]:
+        """
+        Compacts a raw Bright Data profile to the allowlisted fields and serializes it without whitespace.
+        Returns the profile text and before/after token estimates.
+        """
         import json
-        # Use the full LinkedIn JSON profile
-        profile_json = profile.get('profile_json', {})
-        profile_json_str = json.dumps(profile_json, indent=2, ensure_ascii=False)
-        prompt = self._build_prompt(context, profile_json_str)
-        logging.info(f"[EmailGenerationAgent] Sending prompt to Claude: {prompt}")
-        headers = {
-            'x-api-key': self.api_key,
-            'anthropic-version': '2023-06-01',
-            'content-type': 'application/json'
+        compacted = compact_profile(
+            profile_json or {},
+            fields=self.profile_fields,
+            max_list_items=self.max_list_items,
+            text_cleaner=self._clean_and_summarize_profile_text
+        )
+        profile_text = serialize_profile(compacted)
+        stats = {
+            'profile_tokens_raw': estimate_tokens(json.dumps(profile_json or {}, indent=2, ensure_ascii=False)),
+            'profile_tokens_compact': estimate_tokens(profile_text),
         }
+        return profile_text, stats
+
+    @property
+    def metrics(self):
+        return self.client.metrics
+
+    @metrics.setter
+    def metrics(self, metrics):
+        # Generation spans and token counts are recorded next to the client's request/retry metrics
+        self.client.metrics = metrics
+
+    def _build_request(self, context: Dict[str, str], profile: Dict[str, str]) -> Tuple[Dict, int]:
+        """Returns the Messages API payload for one profile and a rough token estimate for rate limiting."""
+        # Use the compacted profile if the caller already prepared it
+        profile_json_str = profile.get('profile_text')
+        if profile_json_str is None:
+            profile_json_str, _ = self.prepare_profile(profile.get('profile_json', {}))
+        system_prompt = self._build_system_prompt(context)
+        profile_message = self._build_profile_message(profile_json_str)
         data = {
             "model": self.model,
-            "max_tokens": 512,
+            "max_tokens": MAX_TOKENS,
+            # The instructions, course and persona are identical for every row of a campaign, so they go first
+            # as a cacheable system block and only the profile message changes between requests.
+            # (Claude only caches prefixes above a minimum length, ~1-2k tokens depending on the model.)
+            "system": [
+                {"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}
+            ],
             "messages": [
-                {"role": "user", "content": prompt}
+                {"role": "user", "content": profile_message}
             ]
         }
-        resp = requests.post(self.api_url, headers=headers, json=data)
-        logging.info(f"[EmailGenerationAgent] Claude API response: {resp.status_code} {resp.text}")
-        if resp.status_code == 200:
-            return resp.json().get('content', [{}])[0].get('text', '').strip()
-        else:
-            return f"[Error from Claude API: {resp.status_code}] {resp.text}"
-
-    def _build_prompt(self, context: Dict[str, str], profile_json_str: str) -> str:
+        # Rough token estimate (~4 characters per token) to pace against the tokens/min budget
+        estimated_tokens = (len(system_prompt) + len(profile_message)) // 4 + MAX_TOKENS
+        return data, estimated_tokens
+
+    def _record_usage(self, usage: Dict[str, int]):
+        with self._usage_lock:
+            self.usage['requests'] += 1
+            for key in USAGE_KEYS:
+                self.usage[key] += usage.get(key) or 0
+        for key in USAGE_KEYS:
+            self.metrics.increment(f"claude.{key}", usage.get(key) or 0)
+
+    def reset_usage(self):
+        with self._usage_lock:
+            self.usage = dict.fromkeys(('requests', 'draft_cache_hits') + USAGE_KEYS, 0)
+
+    def get_usage(self) -> Dict[str, int]:
+        """
+        Token usage summed over responses since the last reset_usage(), including prompt cache reads/writes,
+        and the number of drafts served from the draft cache (which cost no tokens).
+        """
+        with self._usage_lock:
+            return dict(self.usage)
+
+    def _record_draft_cache_hits(self, count: int):
+        with self._usage_lock:
+            self.usage['draft_cache_hits'] += count
+        self.metrics.increment('email.draft_cache_hits', count)
+
+    def _cached_drafts(self, keys: Iterable[str]) -> Dict[str, str]:
+        if self.draft_cache is None or self.force_regenerate:
+            return {}
+        try:
+            return self.draft_cache.get_many(keys)
+        except Exception as e:
+            # The cache only saves tokens; a broken cache file must not stop generation
+            import logging
+            logging.warning(f"[EmailGenerationAgent] Draft cache lookup failed: {e}")
+            return {}
+
+    def _store_drafts(self, drafts: Dict[str, str]):
+        if self.draft_cache is None or not drafts:
+            return
+        try:
+            self.draft_cache.put_many(drafts, model=self.model)
+        except Exception as e:
+            import logging
+            logging.warning(f"[EmailGenerationAgent] Could not store drafts in the draft cache: {e}")
+
+    def draft_key(self, context: Dict[str, str], profile: Dict[str, str]) -> str:
+        """Draft cache key for a profile: a hash of the complete request (prompt, profile text, model, max_tokens)."""
+        return DraftCache.key_for(self._build_request(context, profile)[0])
+
+    def invalidate_draft(self, context: Dict[str, str], profile: Dict[str, str]):
+        """Drops the cached draft for this course/persona/profile, so the next call goes to Claude again."""
+        if self.draft_cache is not None:
+            self.draft_cache.invalidate(self.draft_key(context, profile))
+
+    @staticmethod
+    def _extract_text(message: Dict) -> str:
+        return message.get('content', [{}])[0].get('text', '').strip()
+
+    def generate_email(self, context: Dict[str, str], profile: Dict[str, str]) -> str:
+        return self.generate_draft(context, profile).text
+
+    def generate_draft(self, context: Dict[str, str], profile: Dict[str, str],
+                       on_partial: Optional[Callable[[EmailDraft], None]] = None) -> EmailDraft:
+        """
+        Generates one email and returns it as an EmailDraft (subject, body, usage, latency).
+        In streaming mode on_partial(draft) is called as text arrives, with the subject filled in once the first line is complete.
+        """
+        import logging
+        import time
+        data, estimated_tokens = self._build_request(context, profile)
+        key = DraftCache.key_for(data) if self.draft_cache is not None else None
+        cached = self._cached_drafts([key]).get(key) if key else None
+        if cached is not None:
+            self._record_draft_cache_hits(1)
+            return EmailDraft.from_text(cached, latency={'total': 0.0}, cached=True)
+        started = time.perf_counter()
+        # Raises ClaudeAPIError once retries are exhausted, so errors never end up as a draft
+        with self.metrics.span('email.generate'):
+            if self.stream:
+                draft = self._stream_draft(data, estimated_tokens, started, on_partial)
+            else:
+                response = self.client.create_message(data, estimated_tokens=estimated_tokens)
+                logging.debug(f"[EmailGenerationAgent] Claude response {response.get('id')}: stop_reason={response.get('stop_reason')}, usage={response.get('usage')}")
+                draft = EmailDraft.from_text(self._extract_text(response), usage=response.get('usage', {}),
+                                             stop_reason=response.get('stop_reason'))
+        draft.latency['total'] = time.perf_counter() - started
+        self._record_usage(draft.usage)
+        if key:
+            self._store_drafts({key: draft.text})
+        return draft
+
+    def _stream_draft(self, data: Dict, estimated_tokens: int, started: float,
+                      on_partial: Optional[Callable[[EmailDraft], None]]) -> EmailDraft:
+        import logging
+        import time
+        attempt = 0
+        while True:
+            stream = {'started': False}
+            try:
+                return self._read_stream(data, estimated_tokens, started, on_partial, stream)
+            except (ClaudeAPIError, *STREAM_TRANSPORT_ERRORS) as e:
+                # Errors sent as stream events (e.g. overloaded) and connections dropped mid-body happen after the
+                # client's own retries, so the whole stream is retried here; the next partial drafts start over.
+                # Failures before the first event come from the request itself, which the client already retried
+                retryable = not isinstance(e, ClaudeAPIError) or e.status_code in RETRYABLE_STATUS_CODES
+                if not stream['started'] or not retryable or attempt >= self.client.max_retries:
+                    raise
+                delay = self.client.retry_delay(attempt)
+                logging.warning(f"[EmailGenerationAgent] Stream failed ({e}); retrying in {delay:.1f}s.")
+                self.metrics.increment('claude.retries')
+                time.sleep(delay)
+                attempt += 1
+
+    def _read_stream(self, data: Dict, estimated_tokens: int, started: float,
+                     on_partial: Optional[Callable[[EmailDraft], None]], stream: Optional[Dict] = None) -> EmailDraft:
+        import logging
+        import time
+        parts = []
+        usage = {}
+        latency = {}
+        stop_reason = None
+        subject = None
+        on_open = (lambda: stream.update(started=True)) if stream is not None else None
+        for event in self.client.stream_message(data, estimated_tokens=estimated_tokens, on_open=on_open):
+            event_type = event.get('type')
+            if event_type == 'message_start':
+                usage.update(event.get('message', {}).get('usage') or {})
+            elif event_type == 'message_delta':
+                usage.update(event.get('usage') or {})
+                stop_reason = event.get('delta', {}).get('stop_reason') or stop_reason
+            elif event_type == 'content_block_delta' and event.get('delta', {}).get('type') == 'text_delta':
+                if not parts:
+                    latency['first_token'] = time.perf_counter() - started
+                    self.metrics.observe('email.first_token', latency['first_token'])
+                parts.append(event['delta'].get('text', ''))
+                text = ''.join(parts).lstrip()
+                body = ''
+                # The subject is known as soon as the first line is complete
+                if '\n' in text:
+                    subject, body = split_subject_body(text)
+                    if 'subject' not in latency:
+                        latency['subject'] = time.perf_counter() - started
+                        self.metrics.observe('email.subject_ready', latency['subject'])
+                if on_partial is not None:
+                    try:
+                        on_partial(EmailDraft(text=text, subject=subject or '', body=body, latency=dict(latency), complete=False))
+                    except Exception as e:
+                        # A broken progress consumer must not fail the draft
+                        logging.error(f"[EmailGenerationAgent] Partial draft callback failed: {e}")
+        return EmailDraft.from_text(''.join(parts).strip(), usage=usage, latency=latency, stop_reason=stop_reason)
+
+    def generate_emails_batch(self, context: Dict[str, str], profiles: Dict[str, Dict[str, str]],
+                              poll_interval: float = 30, max_wait_sec: float = 24 * 3600,
+                              should_stop: Optional[Callable[[], bool]] = None) -> Dict[str, Tuple[str, str]]:
+        """
+        Generates drafts for many profiles through the Message Batches API.
+        profiles maps custom_id -> profile (custom_ids must match ^[a-zA-Z0-9_-]{1,64}$).
+        Blocks until every batch has ended and returns custom_id -> (email, error).
+        Profiles with a cached draft are answered from the draft cache and left out of the batch.
+        If should_stop() turns true while waiting, the unfinished batches are cancelled and InterruptedError is raised.
+        """
+        import logging
+        import time
+        request_params = {custom_id: self._build_request(context, profile)[0] for custom_id, profile in profiles.items()}
+        keys = {custom_id: DraftCache.key_for(params) for custom_id, params in request_params.items()} if self.draft_cache is not None else {}
+        cached = self._cached_drafts(keys.values())
+        results = {custom_id: (cached[key], '') for custom_id, key in keys.items() if key in cached}
+        if results:
+            self._record_draft_cache_hits(len(results))
+            logging.info(f"[EmailGenerationAgent] Reusing {len(results)} cached drafts.")
+        items = [(custom_id, params) for custom_id, params in request_params.items() if custom_id not in results]
+        request_params.clear()
+        batch_ids = []
+        for i in range(0, len(items), MAX_BATCH_REQUESTS):
+            batch_requests = [{'custom_id': custom_id, 'params': params} for custom_id, params in items[i:i+MAX_BATCH_REQUESTS]]
+            batch = self.client.create_batch(batch_requests)
+            logging.info(f"[EmailGenerationAgent] Submitted message batch {batch['id']} with {len(batch_requests)} requests.")
+            batch_ids.append(batch['id'])
+        start_time = time.time()
+        for batch_id in batch_ids:
+            batch_started = time.perf_counter()
+            while True:
+                batch = self.client.get_batch(batch_id)
+                if batch.get('processing_status') == 'ended':
+                    break
+                elapsed = time.time() - start_time
+                if should_stop is not None and should_stop():
+                    for pending_id in batch_ids[batch_ids.index(batch_id):]:
+                        try:
+                            self.client.cancel_batch(pending_id)
+                        except Exception as e:
+                            logging.error(f"[EmailGenerationAgent] Could not cancel message batch {pending_id}: {e}")
+                    raise InterruptedError(f"Message batch {batch_id} cancelled.")
+                if elapsed > max_wait_sec:
+                    raise RuntimeError(f"Message batch {batch_id} not finished after {max_wait_sec} seconds.")
+                logging.info(f"[EmailGenerationAgent] Waiting for message batch {batch_id}: {batch.get('request_counts')}, elapsed {elapsed:.0f}s...")
+                time.sleep(poll_interval)
+            self.metrics.observe('claude.batch_wait', time.perf_counter() - batch_started)
+            fresh_drafts = {}
+            for item in self.client.iter_batch_results(batch):
+                result = item.get('result', {})
+                if result.get('type') == 'succeeded':
+                    self._record_usage(result.get('message', {}).get('usage', {}))
+                    email = self._extract_text(result.get('message', {}))
+                    results[item['custom_id']] = (email, '')
+                    if item['custom_id'] in keys:
+                        fresh_drafts[keys[item['custom_id']]] = email
+                else:
+                    error = result.get('error') or result.get('type')
+                    results[item['custom_id']] = ('', f"Batch request {result.get('type')}: {error}")
+            self._store_drafts(fresh_drafts)
+        # Anything the results file did not mention is reported rather than silently dropped
+        for custom_id in profiles:
+            results.setdefault(custom_id, ('', 'No result returned for batch request'))
+        return results
+
+    def _build_system_prompt(self, context: Dict[str, str]) -> str:
         # Prompt tells Claude to return only the outreach email draft, without extra comments
         return f"""
 You are an expert outreach copywriter. Write a hyper-personalized cold outreach email draft for a prospective learner using:
 - The course or offering details
 - The target persona
-- The full LinkedIn profile JSON below
+- The LinkedIn profile JSON in the user message
 
 Return ONLY the outreach email draft. Do NOT include any comments, explanations, or extra text.
 
@@ -75,7 +351,9 @@ Course Details:
 
 Persona:
 {context['persona']}
+"""
 
-LinkedIn Profile JSON:
+    def _build_profile_message(self, profile_json_str: str) -> str:
+        return f"""LinkedIn Profile JSON:
 {profile_json_str}
 """
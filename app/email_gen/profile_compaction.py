@@ -0,0 +1,69 @@
+import json
+from typing import Any, Callable, Dict, Iterable, Optional
+
+# Bright Data LinkedIn fields worth showing Claude; everything else (input echoes, ids, images, metadata) is dropped
+DEFAULT_PROFILE_FIELDS = (
+    'name', 'position', 'about', 'city', 'country_code', 'current_company',
+    'experience', 'education', 'educations_details', 'certifications', 'languages',
+    'honors_and_awards', 'volunteer_experience', 'projects', 'courses', 'activity', 'posts',
+)
+DEFAULT_MAX_LIST_ITEMS = 5
+DEFAULT_MAX_TEXT_CHARS = 1500
+
+
+def _is_noise_key(key: str) -> bool:
+    key = key.lower()
+    return (
+        key in ('id', 'url', 'link', 'input', 'timestamp')
+        or key.endswith(('_id', '_url', '_link', '_urn'))
+        or any(part in key for part in ('img', 'image', 'logo', 'avatar', 'banner'))
+    )
+
+
+def _compact_value(value: Any, max_list_items: int, max_text_chars: int, text_cleaner: Optional[Callable[[str], str]]) -> Any:
+    if isinstance(value, dict):
+        compacted = {}
+        for key, item in value.items():
+            if _is_noise_key(key):
+                continue
+            item = _compact_value(item, max_list_items, max_text_chars, text_cleaner)
+            if item not in (None, '', [], {}):
+                compacted[key] = item
+        return compacted
+    if isinstance(value, list):
+        items = [_compact_value(item, max_list_items, max_text_chars, text_cleaner) for item in value]
+        items = [item for item in items if item not in (None, '', [], {})]
+        return items[:max_list_items]
+    if isinstance(value, str):
+        text = value.strip()
+        if text_cleaner and '\n' in text:
+            text = text_cleaner(text)
+        if len(text) > max_text_chars:
+            text = text[:max_text_chars].rstrip() + '...'
+        return text
+    return value
+
+
+def compact_profile(profile: Dict[str, Any], fields: Iterable[str] = DEFAULT_PROFILE_FIELDS,
+                    max_list_items: int = DEFAULT_MAX_LIST_ITEMS, max_text_chars: int = DEFAULT_MAX_TEXT_CHARS,
+                    text_cleaner: Optional[Callable[[str], str]] = None) -> Dict[str, Any]:
+    """
+    Keeps only the allowlisted top-level fields of a Bright Data profile, drops nulls, empty values
+    and URL/image/id noise at every level, truncates long lists and long text.
+    """
+    compacted = {}
+    for field in fields:
+        value = _compact_value(profile.get(field), max_list_items, max_text_chars, text_cleaner)
+        if value not in (None, '', [], {}):
+            compacted[field] = value
+    return compacted
+
+
+def serialize_profile(profile: Dict[str, Any]) -> str:
+    """Serializes without pretty-print whitespace."""
+    return json.dumps(profile, ensure_ascii=False, separators=(',', ':'))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token), good enough for comparing prompt sizes."""
+    return (len(text) + 3) // 4
@@ -0,0 +1,62 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+DEFAULT_QUOTA_PATH = '.runs/send_quota.sqlite3'
+DAY_SECONDS = 24 * 3600
+
+
+class SendQuota:
+    """
+    Rolling 24-hour send counter per sender account, kept in a local SQLite file next to the job queue,
+    so app restarts and other processes on the same server cannot push an account past its daily limit.
+    reserve() takes a slot before a send; release() gives it back when the message was never delivered.
+    """
+    def __init__(self, path: str = DEFAULT_QUOTA_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS sends (
+                slot_id INTEGER PRIMARY KEY AUTOINCREMENT, account TEXT NOT NULL, sent_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS sends_account ON sends (account, sent_at);
+        ''')
+
+    def reserve(self, account: str, per_day: int) -> Optional[int]:
+        """Takes one of account's per_day slots for the last 24 hours; returns the slot id, or None if none are left."""
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE, so two processes cannot both see the last free slot
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.execute('DELETE FROM sends WHERE sent_at <= ?', (now - DAY_SECONDS,))
+                used = self._conn.execute('SELECT COUNT(*) FROM sends WHERE account = ?', (account,)).fetchone()[0]
+                slot_id = None
+                if used < per_day:
+                    slot_id = self._conn.execute('INSERT INTO sends (account, sent_at) VALUES (?, ?)', (account, now)).lastrowid
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+        return slot_id
+
+    def release(self, slot_id: int):
+        self._execute('DELETE FROM sends WHERE slot_id = ?', (slot_id,))
+
+    def used(self, account: str) -> int:
+        """Sends counted against account over the last 24 hours."""
+        return self._execute('SELECT COUNT(*) FROM sends WHERE account = ? AND sent_at > ?',
+                             (account, time.time() - DAY_SECONDS)).fetchone()[0]
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            return self._conn.execute(sql, tuple(params))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,216 @@
+import smtplib
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from email.mime.text import MIMEText
+from queue import Empty, Queue
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from app.email_send.send_quota import SendQuota
+from app.utils.rate_limit import TokenBucket
+
+# Gmail allows ~500 messages/day for personal accounts (2,000 for Workspace)
+DEFAULT_PER_DAY = 500
+DEFAULT_PER_SECOND = 1.0
+
+# Daily quota used by senders created without one, opened on first use and shared by the whole process
+_default_quota: Optional[SendQuota] = None
+_default_quota_lock = threading.Lock()
+
+
+def _shared_quota() -> SendQuota:
+    global _default_quota
+    with _default_quota_lock:
+        if _default_quota is None:
+            _default_quota = SendQuota()
+        return _default_quota
+
+
+@dataclass
+class OutgoingEmail:
+    index: int
+    recipient: str
+    subject: str
+    body: str
+
+
+class SendProgress:
+    """Thread-safe counters plus a bounded tail of log lines, cheap to render after every message."""
+    def __init__(self, total: int, max_log_lines: int = 200):
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+        self.failures: List[Tuple[str, str]] = []
+        self.log = deque(maxlen=max_log_lines)
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    @property
+    def done(self) -> int:
+        return self.sent + self.failed + self.skipped
+
+    def record(self, outcome: str, recipient: str, line: str, error: Optional[str] = None):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            if error is not None:
+                self.failures.append((recipient, error))
+            self.log.append(line)
+
+    def note(self, line: str):
+        with self._lock:
+            self.log.append(line)
+
+    def tail(self, lines: int = 20) -> str:
+        with self._lock:
+            return "\n".join(list(self.log)[-lines:])
+
+
+class SMTPSender:
+    """
+    Sends emails over a small pool of authenticated SMTP connections, one per worker thread.
+    Connections are re-opened transparently when the server drops them, sending is throttled per second
+    and per day, and transient 4xx replies are retried with backoff. The daily count is persisted (see SendQuota),
+    and messages that finally fail do not count against it.
+    """
+    def __init__(self, username: str, password: str, host: str = 'smtp.gmail.com', port: int = 465, use_ssl: bool = True,
+                 starttls: bool = False, pool_size: int = 3, per_second: float = DEFAULT_PER_SECOND, per_day: int = DEFAULT_PER_DAY,
+                 max_retries: int = 3, retry_backoff: float = 2.0, timeout: float = 30, throttle: Optional[TokenBucket] = None,
+                 quota: Optional[SendQuota] = None):
+        self.username = username
+        self.password = password
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.starttls = starttls
+        self.pool_size = max(1, pool_size)
+        self.per_day = per_day
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+        # A shared throttle paces all senders of the process together (see CampaignScheduler)
+        self.throttle = throttle or TokenBucket(per_second, capacity=max(1.0, per_second))
+        self.quota = quota or _shared_quota()
+
+    def _connect(self) -> smtplib.SMTP:
+        if self.use_ssl:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                server.starttls()
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        return server
+
+    def _build_message(self, email: OutgoingEmail) -> str:
+        msg = MIMEText(email.body, "plain")
+        msg["Subject"] = email.subject or "Personalized Outreach"
+        msg["From"] = self.username
+        msg["To"] = email.recipient
+        return msg.as_string()
+
+    @staticmethod
+    def _is_transient(error: Exception) -> bool:
+        if isinstance(error, (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)):
+            return True
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            return all(400 <= code < 500 for code, _ in error.recipients.values())
+        if isinstance(error, smtplib.SMTPResponseException):
+            return 400 <= error.smtp_code < 500
+        return False
+
+    @staticmethod
+    def _fail_remaining(queue: Queue, progress: SendProgress, error: str):
+        while True:
+            try:
+                email = queue.get_nowait()
+            except Empty:
+                return
+            progress.record('failed', email.recipient, f"❌ Not sent to {email.recipient}: {error}", error)
+
+    def _worker(self, queue: Queue, progress: SendProgress, on_sent: Optional[Callable[[OutgoingEmail], None]]):
+        server = None
+        try:
+            while True:
+                try:
+                    email = queue.get_nowait()
+                except Empty:
+                    return
+                slot_id = self.quota.reserve(self.username, self.per_day)
+                if slot_id is None:
+                    progress.record('skipped', email.recipient, f"⏸ Skipped {email.recipient}: daily limit of {self.per_day} reached.")
+                    continue
+                attempt = 0
+                delivered = False
+                while True:
+                    try:
+                        if server is None:
+                            server = self._connect()
+                        self.throttle.acquire(1)
+                        server.sendmail(self.username, email.recipient, self._build_message(email))
+                        progress.record('sent', email.recipient, f"✅ Sent to {email.recipient}")
+                        delivered = True
+                        break
+                    except smtplib.SMTPAuthenticationError as e:
+                        # Bad credentials won't fix themselves; fail everything left instead of retrying each login
+                        self.quota.release(slot_id)
+                        progress.record('failed', email.recipient, f"❌ Login failed for {self.username}: {e}", str(e))
+                        self._fail_remaining(queue, progress, f"Login failed: {e}")
+                        return
+                    except Exception as e:
+                        if isinstance(e, (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)):
+                            # Drop the broken connection; the next attempt reconnects
+                            server = None
+                        if self._is_transient(e) and attempt < self.max_retries:
+                            attempt += 1
+                            progress.note(f"↻ Retrying {email.recipient} ({e}), attempt {attempt}/{self.max_retries}")
+                            time.sleep(self.retry_backoff * (2 ** (attempt - 1)))
+                            continue
+                        # Not delivered, so the slot goes back to the daily quota
+                        self.quota.release(slot_id)
+                        progress.record('failed', email.recipient, f"❌ Failed to send to {email.recipient}: {e}", str(e))
+                        break
+                if delivered and on_sent:
+                    # The message is out and counted; a failing callback must not turn it into a failed send
+                    try:
+                        on_sent(email)
+                    except Exception as e:
+                        import logging
+                        logging.error(f"[SMTPSender] on_sent callback failed for {email.recipient}: {e}")
+        finally:
+            if server is not None:
+                try:
+                    server.quit()
+                except Exception:
+                    pass
+
+    def send_all(self, emails: Iterable[OutgoingEmail], on_sent: Optional[Callable[[OutgoingEmail], None]] = None,
+                 on_progress: Optional[Callable[[SendProgress], None]] = None, progress_interval: float = 0.5) -> SendProgress:
+        """
+        Sends every email and returns the final progress. on_sent runs on a worker thread after each successful send;
+        on_progress runs on the calling thread every progress_interval seconds and once at the end.
+        """
+        queue = Queue()
+        emails = list(emails)
+        for email in emails:
+            queue.put(email)
+        progress = SendProgress(total=len(emails))
+        progress.note(f"Sending {len(emails)} emails as {self.username} over {min(self.pool_size, len(emails) or 1)} connections...")
+        workers = [
+            threading.Thread(target=self._worker, args=(queue, progress, on_sent), name=f'smtp-sender-{i}', daemon=True)
+            for i in range(min(self.pool_size, len(emails)))
+        ]
+        for worker in workers:
+            worker.start()
+        while any(worker.is_alive() for worker in workers):
+            if on_progress:
+                on_progress(progress)
+            time.sleep(progress_interval)
+        for worker in workers:
+            worker.join()
+        progress.note("All emails processed.")
+        if on_progress:
+            on_progress(progress)
+        return progress
@@ -1,27 +1,102 @@
+import random
+import threading
+
 import requests
-from typing import List, Dict, Optional
+from requests.adapters import HTTPAdapter
+from typing import List, Dict, Optional, Iterator, Tuple
 from time import sleep
-import streamlit as st
 
-BRIGHTDATA_API_KEY = st.secrets["BRIGHTDATA_API_KEY"]
-TRIGGER_URL = "https://api.brightdata.com/datasets/v3/trigger?dataset_id=gd_l1viktl72bvl7bjuj0&include_errors=true"
-SNAPSHOT_URL_TEMPLATE = "https://api.brightdata.com/datasets/v3/snapshot/{snapshot_id}?format=json"
+from app.config import get_setting
+from app.scraping.snapshot_notifier import SnapshotNotifier
+from app.utils.metrics import RunMetrics
+from app.utils.rate_limit import TokenBucket
+
+# Overridable with BRIGHTDATA_BASE_URL, e.g. to point at the local stand-in used by the benchmarks
+DEFAULT_BASE_URL = "https://api.brightdata.com"
+TRIGGER_PATH = "/datasets/v3/trigger?dataset_id=gd_l1viktl72bvl7bjuj0&include_errors=true"
+SNAPSHOT_PATH_TEMPLATE = "/datasets/v3/snapshot/{snapshot_id}?format=json"
+PROGRESS_PATH_TEMPLATE = "/datasets/v3/progress/{snapshot_id}"
+# Progress statuses that end a snapshot; anything else (running, building, collecting...) means keep waiting
+READY_STATUS = 'ready'
+FAILED_STATUS = 'failed'
+# (connect, read) timeouts in seconds; downloads of large snapshots need the longer read timeout
+DEFAULT_TIMEOUT = (10, 120)
+# Poll delays are spread by up to +/- this share, so snapshots triggered together are not all polled at once
+POLL_JITTER = 0.2
+# With webhook notifications, the longest the scrape loop sleeps while triggers are still in flight
+NOTIFY_WAKE_INTERVAL = 0.5
+# With webhook notifications, seconds between progress checks of snapshots not notified yet, in case a callback is lost
+NOTIFY_SAFETY_POLL_INTERVAL = 60
+# Upper bound on simultaneous trigger requests in scrape_batches
+MAX_CONCURRENT_TRIGGERS = 10
+# Number of recent snapshot ready-times used to schedule polls
+READY_TIME_HISTORY = 50
+
+class SnapshotFailed(RuntimeError):
+    """Bright Data reported the snapshot as failed, so waiting for it longer would not help."""
+
+def record_error(record: Optional[dict]) -> str:
+    """The reason a snapshot record holds no profile ('' for a usable profile); with include_errors=true failed URLs come back as error records."""
+    if not record:
+        return 'No profile data returned'
+    if record.get('error') or record.get('error_code'):
+        return f"Bright Data: {record.get('error') or record.get('error_code')}"
+    return ''
 
 class BrightDataLinkedInAgent:
-    def __init__(self, api_key: Optional[str] = None):
-        self.api_key = api_key or BRIGHTDATA_API_KEY
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None, poll_interval: Optional[float] = None,
+                 trigger_bucket: Optional[TokenBucket] = None, session: Optional[requests.Session] = None,
+                 notifier: Optional[SnapshotNotifier] = None):
+        self.api_key = api_key or get_setting('BRIGHTDATA_API_KEY')
         if not self.api_key:
-            raise ValueError("Bright Data API key not found. Set BRIGHTDATA_API_KEY in your Streamlit secrets.")
+            raise ValueError("Bright Data API key not found. Set BRIGHTDATA_API_KEY in your environment, config file or Streamlit secrets.")
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        base_url = (base_url or get_setting('BRIGHTDATA_BASE_URL') or DEFAULT_BASE_URL).rstrip('/')
+        self.trigger_url = base_url + TRIGGER_PATH
+        self.snapshot_url_template = base_url + SNAPSHOT_PATH_TEMPLATE
+        self.progress_url_template = base_url + PROGRESS_PATH_TEMPLATE
+        # Keep-alive connections for the many small trigger/progress calls; can be shared between agents
+        self.session = session or self.create_session()
+        self.timeout = (DEFAULT_TIMEOUT[0], float(get_setting('BRIGHTDATA_TIMEOUT', DEFAULT_TIMEOUT[1])))
+        # Webhook mode (BRIGHTDATA_WEBHOOK_PORT): Bright Data notifies this receiver when a snapshot finishes,
+        # so snapshots are only checked every safety_poll_interval until then
+        self.notifier = notifier or SnapshotNotifier.from_settings()
+        self.safety_poll_interval = float(get_setting('BRIGHTDATA_SAFETY_POLL_INTERVAL', NOTIFY_SAFETY_POLL_INTERVAL))
+        # Base wait between snapshot polls in scrape_batches
+        self.poll_interval = float(poll_interval or get_setting('BRIGHTDATA_POLL_INTERVAL', 5))
+        # Seconds from trigger to ready for recent snapshots, used to time the next polls
+        from collections import deque
+        self._ready_times = deque(maxlen=READY_TIME_HISTORY)
+        # Optional triggers/min budget, shared between agents when several campaigns run at once
+        self.trigger_bucket = trigger_bucket
+        # Trigger/poll timings and counts; the workflow swaps in a fresh instance per run
+        self.metrics = RunMetrics()
+
+    @staticmethod
+    def create_session(pool_size: int = 20) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
 
     def trigger_profiles(self, linkedin_urls: List[str]) -> str:
         if len(linkedin_urls) > 10:
             raise ValueError("You can only send up to 10 LinkedIn URLs at once.")
         data = [{"url": url} for url in linkedin_urls]
-        resp = requests.post(TRIGGER_URL, headers=self.headers, json=data)
+        if self.trigger_bucket is not None:
+            with self.metrics.span('brightdata.rate_limit_wait'):
+                self.trigger_bucket.acquire(1)
+        params = {}
+        if self.notifier is not None:
+            params['notify'] = self.notifier.url
+            # Sent back by Bright Data as the notification's Authorization header
+            params['auth_header'] = self.notifier.secret
+        with self.metrics.span('brightdata.trigger'):
+            resp = self.session.post(self.trigger_url, headers=self.headers, json=data, params=params, timeout=self.timeout)
         resp.raise_for_status()
         result = resp.json()
         # Expecting snapshot_id in response
@@ -35,31 +110,230 @@ class BrightDataLinkedInAgent:
             raise RuntimeError(f"Could not retrieve snapshot_id from Bright Data response: {result}")
         return snapshot_id
 
-    def fetch_snapshot(self, snapshot_id: str, max_wait_sec: int = 300, wait_sec: int = 5) -> List[Dict]:
+    def get_progress(self, snapshot_id: str) -> str:
+        """The snapshot's progress status: 'ready', 'failed', or a still-running status such as 'running'."""
+        url = self.progress_url_template.format(snapshot_id=snapshot_id)
+        self.metrics.increment('brightdata.progress_checks')
+        with self.metrics.span('brightdata.progress'):
+            resp = self.session.get(url, headers=self.headers, timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.json().get('status', '')
+
+    def download_snapshot(self, snapshot_id: str) -> Optional[List[Dict]]:
+        """Downloads a finished snapshot's records (possibly none). Returns None if Bright Data is still building it."""
+        import logging
+        url = self.snapshot_url_template.format(snapshot_id=snapshot_id)
+        self.metrics.increment('brightdata.poll_attempts')
+        with self.metrics.span('brightdata.poll'):
+            resp = self.session.get(url, headers=self.headers, timeout=self.timeout)
+        if resp.status_code == 202:
+            return None
+        resp.raise_for_status()
+        data = resp.json()
+        if isinstance(data, list):
+            return data
+        if isinstance(data, dict) and data.get('status') == FAILED_STATUS:
+            raise SnapshotFailed(f"Snapshot {snapshot_id} failed: {data.get('message') or data}")
+        logging.error(f"[BrightDataLinkedInAgent] Unexpected snapshot response for {snapshot_id}: {str(data)[:200]}")
+        return None
+
+    def _poll_snapshot(self, snapshot_id: str, check_progress: bool = True) -> Optional[List[Dict]]:
+        """
+        Checks a snapshot once. Returns its profiles if ready, otherwise None; raises SnapshotFailed if it failed.
+        The cheap progress endpoint is asked first, so the snapshot is only downloaded once it is ready.
+        """
+        if check_progress:
+            status = self.get_progress(snapshot_id)
+            if status == FAILED_STATUS:
+                raise SnapshotFailed(f"Snapshot {snapshot_id} failed.")
+            if status != READY_STATUS:
+                return None
+        return self.download_snapshot(snapshot_id)
+
+    def fetch_snapshot(self, snapshot_id: str, max_wait_sec: int = 300, wait_sec: Optional[float] = None,
+                       max_poll_interval: float = 60) -> List[Dict]:
+        """Waits for one snapshot (polling, or for its webhook notification) and returns its records."""
         import logging
         import time
-        url = SNAPSHOT_URL_TEMPLATE.format(snapshot_id=snapshot_id)
+        wait_sec = wait_sec or self.poll_interval
         start_time = time.time()
         attempt = 0
-        while True:
-            attempt += 1
-            resp = requests.get(url, headers=self.headers)
-            if resp.status_code == 200:
+        late_polls = 0
+        notified = threading.Event()
+        if self.notifier is not None:
+            self.notifier.register(snapshot_id, notified)
+        try:
+            while True:
+                if self.notifier is not None and self.notifier.status(snapshot_id) is None:
+                    # Wait for the notification, but check progress every safety interval in case it was lost
+                    remaining = max(0.0, max_wait_sec - (time.time() - start_time))
+                    notified.wait(min(self.safety_poll_interval, remaining))
+                attempt += 1
                 try:
-                    data = resp.json()
-                    if isinstance(data, list) and data:
-                        logging.info(f"[BrightDataLinkedInAgent] Snapshot {snapshot_id} ready after {attempt} attempts.")
-                        return data
-                except Exception as e:
-                    logging.error(f"[BrightDataLinkedInAgent] Error parsing snapshot JSON: {e}")
-            elapsed = time.time() - start_time
-            if elapsed > max_wait_sec:
-                logging.error(f"[BrightDataLinkedInAgent] Timeout: Snapshot {snapshot_id} not ready after {elapsed:.1f} seconds.")
-                break
-            logging.info(f"[BrightDataLinkedInAgent] Waiting for snapshot {snapshot_id}, attempt {attempt}, elapsed {elapsed:.1f}s...")
-            time.sleep(wait_sec)
+                    # A notification means the snapshot is done, so only a failure status needs checking
+                    status = self.notifier.status(snapshot_id) if self.notifier is not None else None
+                    if status == FAILED_STATUS:
+                        raise SnapshotFailed(f"Snapshot {snapshot_id} failed.")
+                    data = self._poll_snapshot(snapshot_id, check_progress=status is None)
+                except SnapshotFailed:
+                    self.metrics.increment('brightdata.snapshot_failures')
+                    raise
+                except requests.RequestException as e:
+                    logging.error(f"[BrightDataLinkedInAgent] Error polling snapshot {snapshot_id}: {e}")
+                    data = None
+                elapsed = time.time() - start_time
+                if data is not None:
+                    logging.info(f"[BrightDataLinkedInAgent] Snapshot {snapshot_id} ready after {attempt} attempts.")
+                    self._ready_times.append(elapsed)
+                    return data
+                if elapsed >= max_wait_sec:
+                    logging.error(f"[BrightDataLinkedInAgent] Timeout: Snapshot {snapshot_id} not ready after {elapsed:.1f} seconds.")
+                    break
+                if self.notifier is not None:
+                    # The next wait on the notification paces the checks
+                    continue
+                delay, backing_off = self._next_poll_delay(elapsed, late_polls, wait_sec, max_poll_interval)
+                late_polls += backing_off
+                logging.info(f"[BrightDataLinkedInAgent] Waiting for snapshot {snapshot_id}, attempt {attempt}, elapsed {elapsed:.1f}s...")
+                time.sleep(delay)
+        finally:
+            if self.notifier is not None:
+                self.notifier.forget(snapshot_id)
         raise RuntimeError(f"Snapshot {snapshot_id} not ready after {max_wait_sec} seconds.")
 
+    def _next_poll_delay(self, elapsed: float, late_polls: int, wait_sec: float, max_poll_interval: float) -> Tuple[float, bool]:
+        """
+        Picks how long to wait before polling a snapshot again, and whether that wait is a backoff step.
+        Until a snapshot reaches the typical ready time seen so far we sleep straight up to it;
+        after that (or with no history yet) we back off exponentially from wait_sec. Either way the delay
+        gets +/- POLL_JITTER of random spread.
+        """
+        import statistics
+        jitter = random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+        if self._ready_times:
+            expected = statistics.median(self._ready_times)
+            if elapsed < expected:
+                return max(wait_sec, expected - elapsed) * jitter, False
+        return min(max_poll_interval, wait_sec * (2 ** late_polls)) * jitter, True
+
+    def scrape_batches(self, batches: List[List[str]], max_in_flight: Optional[int] = None, max_wait_sec: int = 300,
+                       wait_sec: Optional[float] = None, max_poll_interval: float = 60) -> Iterator[Tuple[int, List[Dict], Optional[Exception]]]:
+        """
+        Triggers one snapshot per batch of up to 10 URLs and polls all pending snapshots from a single loop.
+        Yields (batch_index, profiles, error) in completion order, so callers can start on a batch as soon as it is ready.
+        max_in_flight caps how many snapshots are triggered but not yet finished (default: all batches at once).
+        wait_sec defaults to the agent's poll_interval. Failed snapshots are reported as soon as Bright Data says so.
+        With a notifier, snapshots are downloaded once notified; until then their progress is only checked every
+        safety_poll_interval seconds (and once more at max_wait_sec), in case a notification is lost.
+        """
+        import logging
+        import time
+        wait_sec = wait_sec or self.poll_interval
+        from collections import deque
+        from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+        to_trigger = deque(enumerate(batches))
+        limit = max_in_flight or len(batches) or 1
+        triggering = {}  # trigger future -> batch index
+        pending = {}  # snapshot_id -> poll state
+        # Set by the notifier whenever one of our snapshots reports in
+        notified = threading.Event()
+        try:
+            with ThreadPoolExecutor(max_workers=min(limit, MAX_CONCURRENT_TRIGGERS), thread_name_prefix='brightdata-trigger') as pool:
+                while to_trigger or triggering or pending:
+                    while to_trigger and len(triggering) + len(pending) < limit:
+                        batch_index, urls = to_trigger.popleft()
+                        triggering[pool.submit(self.trigger_profiles, urls)] = batch_index
+                    for future in [f for f in triggering if f.done()]:
+                        batch_index = triggering.pop(future)
+                        try:
+                            snapshot_id = future.result()
+                        except Exception as e:
+                            logging.error(f"[BrightDataLinkedInAgent] Trigger failed for batch {batch_index+1}: {e}")
+                            self.metrics.increment('brightdata.trigger_errors')
+                            yield batch_index, [], e
+                            continue
+                        now = time.time()
+                        if self.notifier is not None:
+                            first_poll = min(self.safety_poll_interval, max_wait_sec + NOTIFY_WAKE_INTERVAL)
+                            self.notifier.register(snapshot_id, notified)
+                        else:
+                            first_poll = self._next_poll_delay(0, 0, wait_sec, max_poll_interval)[0]
+                        pending[snapshot_id] = {
+                            'batch_index': batch_index,
+                            'triggered_at': now,
+                            'next_poll_at': now + first_poll,
+                            'attempts': 0,
+                            'late_polls': 0,
+                            'status': None,  # status from the notifier
+                        }
+                    now = time.time()
+                    if self.notifier is not None:
+                        notified.clear()
+                        for snapshot_id, state in pending.items():
+                            status = self.notifier.status(snapshot_id)
+                            if status is not None and state['status'] is None:
+                                state['status'] = status
+                                state['next_poll_at'] = now
+                    due = [snapshot_id for snapshot_id, state in pending.items() if state['next_poll_at'] <= now]
+                    for snapshot_id in due:
+                        state = pending[snapshot_id]
+                        state['attempts'] += 1
+                        error = None
+                        try:
+                            if state['status'] == FAILED_STATUS:
+                                raise SnapshotFailed(f"Snapshot {snapshot_id} failed.")
+                            data = self._poll_snapshot(snapshot_id, check_progress=state['status'] is None)
+                        except SnapshotFailed as e:
+                            error, data = e, None
+                        except Exception as e:
+                            logging.error(f"[BrightDataLinkedInAgent] Error polling snapshot {snapshot_id}: {e}")
+                            data = None
+                        elapsed = time.time() - state['triggered_at']
+                        if data is not None:
+                            del pending[snapshot_id]
+                            self._ready_times.append(elapsed)
+                            self.metrics.observe('brightdata.snapshot_wait', elapsed)
+                            logging.info(f"[BrightDataLinkedInAgent] Snapshot {snapshot_id} ready after {state['attempts']} attempts ({elapsed:.1f}s).")
+                            yield state['batch_index'], data, None
+                        elif error is not None:
+                            del pending[snapshot_id]
+                            logging.error(f"[BrightDataLinkedInAgent] Snapshot {snapshot_id} failed after {elapsed:.1f} seconds.")
+                            self.metrics.increment('brightdata.snapshot_failures')
+                            yield state['batch_index'], [], error
+                        elif elapsed > max_wait_sec:
+                            del pending[snapshot_id]
+                            logging.error(f"[BrightDataLinkedInAgent] Timeout: Snapshot {snapshot_id} not ready after {elapsed:.1f} seconds.")
+                            self.metrics.increment('brightdata.snapshot_timeouts')
+                            yield state['batch_index'], [], RuntimeError(f"Snapshot {snapshot_id} not ready after {max_wait_sec} seconds.")
+                        elif self.notifier is not None and state['status'] is None:
+                            # Not notified yet: check again after the safety interval, or at the deadline if that is sooner
+                            state['next_poll_at'] = min(time.time() + self.safety_poll_interval,
+                                                        state['triggered_at'] + max_wait_sec + NOTIFY_WAKE_INTERVAL)
+                        else:
+                            delay, backing_off = self._next_poll_delay(elapsed, state['late_polls'], wait_sec, max_poll_interval)
+                            if backing_off:
+                                state['late_polls'] += 1
+                            state['next_poll_at'] = time.time() + delay
+                        if snapshot_id not in pending and self.notifier is not None:
+                            self.notifier.forget(snapshot_id)
+                    if due:
+                        continue
+                    # Sleep until the next poll is due, waking early if a trigger finishes or a notification arrives
+                    sleep_for = min((state['next_poll_at'] for state in pending.values()), default=now + wait_sec) - now
+                    sleep_for = max(0.0, sleep_for)
+                    if triggering:
+                        wait(list(triggering), return_when=FIRST_COMPLETED,
+                             timeout=min(sleep_for, NOTIFY_WAKE_INTERVAL) if self.notifier is not None else sleep_for)
+                    elif self.notifier is not None:
+                        notified.wait(sleep_for)
+                    else:
+                        time.sleep(sleep_for)
+        finally:
+            # Also reached when the caller closes the generator early (e.g. a cancelled run)
+            if self.notifier is not None:
+                for snapshot_id in pending:
+                    self.notifier.forget(snapshot_id)
+
     def scrape_linkedin_profiles(self, linkedin_urls: List[str]) -> List[Dict]:
         snapshot_id = self.trigger_profiles(linkedin_urls)
         return self.fetch_snapshot(snapshot_id)
@@ -0,0 +1,36 @@
+from typing import Dict, Iterable, List, Tuple
+from urllib.parse import unquote, urlsplit
+
+# Path prefixes that identify a profile; anything after the profile slug (/details/..., /recent-activity/...) is dropped
+PROFILE_PATH_PREFIXES = ('in', 'pub')
+
+
+def canonicalize_linkedin_url(url: str) -> str:
+    """
+    Maps the many spellings of a LinkedIn profile URL to one canonical form,
+    e.g. 'http://uk.linkedin.com/in/Jane-Doe/?trk=x' -> 'https://www.linkedin.com/in/jane-doe'.
+    Handles a missing scheme, http vs https, www./m./locale subdomains, query strings,
+    fragments, trailing slashes, percent-encoding and case. Non-LinkedIn URLs are returned stripped but otherwise unchanged.
+    """
+    raw = url.strip()
+    candidate = raw if '://' in raw else 'https://' + raw
+    parts = urlsplit(candidate)
+    host = (parts.hostname or '').lower()
+    if host != 'linkedin.com' and not host.endswith('.linkedin.com'):
+        return raw
+    segments = [unquote(segment).strip().lower() for segment in parts.path.split('/') if segment.strip()]
+    if segments and segments[0] in PROFILE_PATH_PREFIXES:
+        # /in/<slug> is a full profile id; legacy /pub/<name>/<a>/<b>/<c> needs its remaining segments
+        segments = segments[:2] if segments[0] == 'in' else segments[:5]
+    return 'https://www.linkedin.com/' + '/'.join(segments)
+
+
+def build_url_index(urls: Iterable[Tuple[int, str]]) -> Dict[str, List[int]]:
+    """
+    Groups (position, url) pairs by canonical URL, in order of first appearance,
+    so each unique profile is scraped once and fanned back out to every row that references it.
+    """
+    index = {}
+    for position, url in urls:
+        index.setdefault(canonicalize_linkedin_url(url), []).append(position)
+    return index
@@ -0,0 +1,41 @@
+import hashlib
+from typing import Dict, Iterable, Optional
+
+from app.scraping.linkedin_urls import canonicalize_linkedin_url
+from app.utils.sqlite_cache import SQLiteCache
+
+DEFAULT_CACHE_PATH = '.cache/linkedin_profiles.sqlite3'
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 100000
+
+
+class ProfileCache:
+    """
+    Local on-disk cache of Bright Data LinkedIn profiles, so re-runs over overlapping prospect lists
+    don't pay for the same profile twice. Entries are keyed by a hash of the canonical profile URL.
+    """
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS,
+                 max_entries: Optional[int] = DEFAULT_MAX_ENTRIES):
+        self.store = SQLiteCache(path, table='linkedin_profiles', default_ttl=ttl_seconds, max_entries=max_entries)
+
+    @staticmethod
+    def key_for(url: str) -> str:
+        return hashlib.sha256(canonicalize_linkedin_url(url).encode('utf-8')).hexdigest()
+
+    def get_profiles(self, urls: Iterable[str]) -> Dict[str, Dict]:
+        """Returns {url: profile} for every url that has a live cache entry."""
+        keys = {url: self.key_for(url) for url in urls}
+        found = self.store.get_many(keys.values())
+        return {url: found[key] for url, key in keys.items() if key in found}
+
+    def put_profiles(self, profiles: Dict[str, Dict], ttl_seconds: Optional[float] = None):
+        self.store.set_many({self.key_for(url): profile for url, profile in profiles.items() if profile}, ttl=ttl_seconds)
+
+    def invalidate(self, url: str):
+        self.store.delete(self.key_for(url))
+
+    def clear(self):
+        self.store.clear()
+
+    def close(self):
+        self.store.close()
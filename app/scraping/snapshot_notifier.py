@@ -0,0 +1,128 @@
+import hmac
+import json
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from app.config import get_setting
+
+# Notifications kept for snapshots nobody has claimed yet (e.g. ones that arrive before register())
+MAX_STATUSES = 10000
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+class SnapshotNotifier:
+    """
+    Local HTTP receiver for Bright Data's completion notifications. Snapshots triggered with notify=<url>
+    are POSTed here as {"snapshot_id": ..., "status": "ready" | "failed"} once they finish, so the scraper
+    waits for them instead of polling. public_url is the address Bright Data can reach (e.g. a tunnel or
+    reverse proxy in front of port) and secret must come back as the Authorization header; both are required,
+    since without them callbacks either never arrive or anyone could mark snapshots as finished.
+    """
+    def __init__(self, host: str = '0.0.0.0', port: int = 0, public_url: Optional[str] = None, secret: Optional[str] = None):
+        if not public_url or not secret:
+            raise ValueError("Webhook mode needs both a public notify URL and a secret "
+                             "(BRIGHTDATA_NOTIFY_URL and BRIGHTDATA_WEBHOOK_SECRET).")
+        self.host = host
+        self.port = port
+        self.public_url = public_url
+        self.secret = secret
+        self._lock = threading.Lock()
+        self._statuses = OrderedDict()  # snapshot_id -> last reported status
+        self._waiters: Dict[str, threading.Event] = {}
+        self._server = None
+
+    @classmethod
+    def from_settings(cls) -> Optional['SnapshotNotifier']:
+        """The process-wide notifier configured by BRIGHTDATA_WEBHOOK_PORT (started on first use), or None."""
+        global _shared
+        port = get_setting('BRIGHTDATA_WEBHOOK_PORT')
+        if not port:
+            return None
+        with _shared_lock:
+            if _shared is None:
+                _shared = cls(
+                    host=get_setting('BRIGHTDATA_WEBHOOK_HOST', '0.0.0.0'),
+                    port=int(port),
+                    public_url=get_setting('BRIGHTDATA_NOTIFY_URL'),
+                    secret=get_setting('BRIGHTDATA_WEBHOOK_SECRET'),
+                ).start()
+            return _shared
+
+    @property
+    def url(self) -> str:
+        """The notify URL passed to Bright Data."""
+        return self.public_url
+
+    def start(self) -> 'SnapshotNotifier':
+        import logging
+        if self._server is not None:
+            return self
+        notifier = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length)
+                if not hmac.compare_digest(self.headers.get('Authorization') or '', notifier.secret):
+                    self.send_response(401)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                try:
+                    payload = json.loads(body or b'null')
+                except ValueError:
+                    payload = None
+                for item in payload if isinstance(payload, list) else [payload]:
+                    if isinstance(item, dict) and item.get('snapshot_id'):
+                        notifier.notify(item['snapshot_id'], item.get('status') or 'ready')
+                self.send_response(200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name='brightdata-notifier', daemon=True).start()
+        logging.info(f"[SnapshotNotifier] Listening on {self.host}:{self.port}, notify URL {self.url}.")
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def notify(self, snapshot_id: str, status: str):
+        """Records a snapshot's status and wakes whoever registered for it."""
+        with self._lock:
+            self._statuses[snapshot_id] = status
+            self._statuses.move_to_end(snapshot_id)
+            while len(self._statuses) > MAX_STATUSES:
+                self._statuses.popitem(last=False)
+            waiter = self._waiters.get(snapshot_id)
+        if waiter is not None:
+            waiter.set()
+
+    def register(self, snapshot_id: str, event: threading.Event):
+        """event is set when a notification for snapshot_id arrives (or right away if it already has)."""
+        with self._lock:
+            self._waiters[snapshot_id] = event
+            arrived = snapshot_id in self._statuses
+        if arrived:
+            event.set()
+
+    def status(self, snapshot_id: str) -> Optional[str]:
+        with self._lock:
+            return self._statuses.get(snapshot_id)
+
+    def forget(self, snapshot_id: str):
+        with self._lock:
+            self._statuses.pop(snapshot_id, None)
+            self._waiters.pop(snapshot_id, None)
@@ -0,0 +1,31 @@
+import hashlib
+import os
+
+# Bytes per read when hashing, so a large file is never held in memory at once
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def content_hash(source, with_extension: bool = False) -> str:
+    """
+    sha256 of a file's bytes, from a path or a file-like object (whose position is restored).
+    With with_extension, the lowercased extension of the path (or of source.name) is appended, e.g. '<sha256>.pdf',
+    so identical files share one stored object and different ones never collide.
+    """
+    digest = hashlib.sha256()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+                digest.update(chunk)
+    elif hasattr(source, 'getbuffer'):
+        # In-memory uploads (BytesIO, Streamlit's UploadedFile) are hashed without copying
+        digest.update(source.getbuffer())
+    else:
+        position = source.tell()
+        source.seek(0)
+        for chunk in iter(lambda: source.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+        source.seek(position)
+    if not with_extension:
+        return digest.hexdigest()
+    name = source if isinstance(source, (str, os.PathLike)) else getattr(source, 'name', '') or ''
+    return digest.hexdigest() + os.path.splitext(str(name))[1].lower()
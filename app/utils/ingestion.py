@@ -0,0 +1,157 @@
+import os
+from dataclasses import dataclass, field
+from typing import Any, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+# Header aliases, compared case-insensitively after stripping whitespace. Name aliases are tried in order per row.
+LINKEDIN_ALIASES = ('linkedin', 'linkedin_url', 'linkedin url', 'linkedin profile', 'profile_link', 'linkedinprofile')
+EMAIL_ALIASES = ('email', 'email address', 'e-mail')
+NAME_ALIASES = ('first name', 'name')
+# Excel files above this size are read with openpyxl's streaming read-only mode
+STREAMING_THRESHOLD_BYTES = 5 * 1024 * 1024
+
+
+@dataclass
+class ColumnMap:
+    linkedin: Optional[str] = None
+    email: Optional[str] = None
+    names: List[str] = field(default_factory=list)
+
+    @property
+    def columns(self) -> List[str]:
+        return [col for col in [self.linkedin, self.email, *self.names] if col]
+
+
+@dataclass(slots=True)
+class UserRow:
+    row_index: Any
+    linkedin_url: str
+    email: Optional[str]
+    name: Optional[str]
+
+
+def _normalize(col) -> str:
+    return str(col).strip().lower()
+
+
+def resolve_columns(columns: Iterable, linkedin_aliases: Sequence[str] = LINKEDIN_ALIASES,
+                    email_aliases: Sequence[str] = EMAIL_ALIASES, name_aliases: Sequence[str] = NAME_ALIASES) -> ColumnMap:
+    """Finds the LinkedIn, email and name columns once, by alias priority rather than column order."""
+    by_name = {}
+    for col in columns:
+        by_name.setdefault(_normalize(col), col)
+    linkedin = next((by_name[alias] for alias in linkedin_aliases if alias in by_name), None)
+    email = next((by_name[alias] for alias in email_aliases if alias in by_name), None)
+    names = [by_name[alias] for alias in name_aliases if alias in by_name]
+    return ColumnMap(linkedin=linkedin, email=email, names=names)
+
+
+def extract_user_rows(df: pd.DataFrame, columns: Optional[ColumnMap] = None) -> Tuple[List[UserRow], List[Any]]:
+    """
+    Builds compact rows for the pipeline with column-wise pandas operations.
+    Returns (rows with a usable LinkedIn URL, index labels of the rows that were skipped).
+    """
+    columns = columns or resolve_columns(df.columns)
+    if not columns.linkedin:
+        return [], list(df.index)
+    # Only text cells are URLs; numbers, dates and the like are skipped rather than stringified
+    raw = df[columns.linkedin]
+    is_text = raw.map(lambda value: isinstance(value, str))
+    urls = raw.where(is_text, '').astype('string').str.strip()
+    valid = (is_text & (urls.str.len() > 0)).to_numpy(dtype=bool)
+    if columns.email:
+        emails = df[columns.email].astype('object').where(df[columns.email].notna(), None)
+    else:
+        emails = pd.Series([None] * len(df), index=df.index, dtype='object')
+    if columns.names:
+        # First non-empty value across the name columns, in alias order
+        name_frame = df[columns.names].astype('object')
+        name_frame = name_frame.where(name_frame.notna() & name_frame.ne(''))
+        names = name_frame.bfill(axis=1).iloc[:, 0]
+        names = names.where(names.notna(), None)
+    else:
+        names = pd.Series([None] * len(df), index=df.index, dtype='object')
+    rows = [
+        UserRow(row_index, url, email, name)
+        for row_index, url, email, name in zip(
+            df.index[valid], urls[valid].tolist(), emails[valid].tolist(), names[valid].tolist()
+        )
+    ]
+    skipped = list(df.index[~valid])
+    return rows, skipped
+
+
+def _source_name_and_size(source) -> Tuple[str, Optional[int]]:
+    if isinstance(source, (str, os.PathLike)):
+        return str(source), os.path.getsize(source)
+    return getattr(source, 'name', ''), getattr(source, 'size', None)
+
+
+def _dedupe_header(header) -> List:
+    """Column names as pandas.read_excel gives them: empty cells become 'Unnamed: i', repeats get '.1', '.2'..."""
+    header = [f"Unnamed: {i}" if col is None else col for i, col in enumerate(header)]
+    # A suffix is never one that a later header already uses, so 'Email', 'Email', 'Email.1' -> 'Email', 'Email.2', 'Email.1'
+    taken = set(header)
+    names = []
+    used = set()
+    for col in header:
+        name = col
+        if name in used:
+            suffix = 1
+            while f"{col}.{suffix}" in used or f"{col}.{suffix}" in taken:
+                suffix += 1
+            name = f"{col}.{suffix}"
+        used.add(name)
+        names.append(name)
+    return names
+
+
+def _read_excel_streaming(source, usecols) -> pd.DataFrame:
+    """
+    Reads only the wanted columns row by row with openpyxl's read-only mode, keeping memory flat for huge sheets.
+    Like pandas.read_excel this reads the first sheet; rows with nothing in the wanted columns are dropped
+    (openpyxl also yields trailing rows that only carry formatting).
+    """
+    from openpyxl import load_workbook
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = _dedupe_header(next(rows, None) or ())
+        keep = [i for i, col in enumerate(header) if usecols is None or usecols(col)]
+        data = {header[i]: [] for i in keep}
+        for row in rows:
+            values = [row[i] if i < len(row) else None for i in keep]
+            if all(value is None or value == '' for value in values):
+                continue
+            for i, value in zip(keep, values):
+                data[header[i]].append(value)
+        return pd.DataFrame(data)
+    finally:
+        workbook.close()
+
+
+def read_user_table(source, required_only: bool = True, streaming: Optional[bool] = None,
+                    linkedin_aliases: Sequence[str] = LINKEDIN_ALIASES, email_aliases: Sequence[str] = EMAIL_ALIASES,
+                    name_aliases: Sequence[str] = NAME_ALIASES) -> pd.DataFrame:
+    """
+    Reads a CSV, Excel or Parquet sheet of users from a path or file-like object (e.g. a Streamlit upload).
+    With required_only, only the LinkedIn/email/name columns are materialized. Large Excel files
+    (or streaming=True) are read with openpyxl's read-only mode.
+    """
+    name, size = _source_name_and_size(source)
+    wanted = {_normalize(alias) for alias in (*linkedin_aliases, *email_aliases, *name_aliases)}
+    usecols = (lambda col: _normalize(col) in wanted) if required_only else None
+    if name.lower().endswith('.csv'):
+        return pd.read_csv(source, usecols=usecols)
+    if name.lower().endswith('.parquet'):
+        # Columnar, so the other columns are never read
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(source)
+        names = parquet_file.schema_arrow.names
+        return parquet_file.read(columns=[col for col in names if usecols is None or usecols(col)]).to_pandas()
+    if streaming is None:
+        streaming = bool(size and size > STREAMING_THRESHOLD_BYTES) and not name.lower().endswith('.xls')
+    if streaming:
+        return _read_excel_streaming(source, usecols)
+    return pd.read_excel(source, usecols=usecols)
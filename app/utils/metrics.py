@@ -0,0 +1,89 @@
+import json
+import math
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, math.ceil(q * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+class RunMetrics:
+    """
+    Thread-safe timings (spans) and counters for one workflow run.
+    Spans are named by stage, e.g. 'brightdata.trigger', 'claude.request' or 'db.insert';
+    summary() reports count/total/p50/p95/max per span plus the counters and the row throughput.
+    """
+    def __init__(self):
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._spans: Dict[str, List[float]] = {}
+        self._counters: Dict[str, float] = {}
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            self._spans.setdefault(name, []).append(seconds)
+
+    def increment(self, name: str, amount: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = {name: sorted(values) for name, values in self._spans.items()}
+            counters = dict(self._counters)
+        elapsed = time.time() - self.started_at
+        return {
+            'elapsed_sec': round(elapsed, 3),
+            'rows_per_sec': round(counters.get('workflow.rows_completed', 0) / elapsed, 3) if elapsed > 0 else 0.0,
+            'spans': {
+                name: {
+                    'count': len(values),
+                    'total_sec': round(sum(values), 3),
+                    'p50_sec': round(_percentile(values, 0.5), 3),
+                    'p95_sec': round(_percentile(values, 0.95), 3),
+                    'max_sec': round(values[-1], 3),
+                }
+                for name, values in sorted(spans.items())
+            },
+            'counters': dict(sorted(counters.items())),
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.summary(), indent=2)
+
+    def to_prometheus(self, prefix: str = 'outreach') -> str:
+        """Prometheus text exposition format: one summary for all spans (labelled by stage) and a counter per counter."""
+        summary = self.summary()
+        lines = [
+            f"# TYPE {prefix}_run_elapsed_seconds gauge",
+            f"{prefix}_run_elapsed_seconds {summary['elapsed_sec']}",
+            f"# TYPE {prefix}_rows_per_second gauge",
+            f"{prefix}_rows_per_second {summary['rows_per_sec']}",
+            f"# TYPE {prefix}_stage_seconds summary",
+        ]
+        for name, stats in summary['spans'].items():
+            lines.append(f'{prefix}_stage_seconds{{stage="{name}",quantile="0.5"}} {stats["p50_sec"]}')
+            lines.append(f'{prefix}_stage_seconds{{stage="{name}",quantile="0.95"}} {stats["p95_sec"]}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {stats["total_sec"]}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {stats["count"]}')
+        for name, value in summary['counters'].items():
+            metric = f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', name)}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        return '\n'.join(lines) + '\n'
@@ -1,9 +1,41 @@
-import pdfplumber
+import os
+from typing import List, Optional
 
-def extract_pdf_text(pdf_path: str) -> str:
-    """Extracts all text from a PDF file."""
-    text = ""
+# Pages extracted per process pool task; PDFs with at most this many pages are read in-process
+PAGES_PER_TASK = 8
+
+
+def _extract_page_range(pdf_path: str, start: int, stop: int) -> List[str]:
+    # Runs in a worker process, so it opens the PDF itself
+    import pdfplumber
+    with pdfplumber.open(pdf_path, pages=list(range(start + 1, stop + 1))) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages]
+
+
+def count_pdf_pages(pdf_path: str) -> int:
+    import pdfplumber
     with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            text += page.extract_text() or ""
-    return text.strip()
+        return len(pdf.pages)
+
+
+def extract_pdf_pages(pdf_path: str, max_workers: Optional[int] = None) -> List[str]:
+    """
+    Extracts the text of every page, in page order. Larger PDFs are split into ranges of PAGES_PER_TASK pages
+    that are extracted in parallel by a process pool (pdfplumber is CPU bound, so threads would not help).
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    page_count = count_pdf_pages(pdf_path)
+    ranges = [(start, min(start + PAGES_PER_TASK, page_count)) for start in range(0, page_count, PAGES_PER_TASK)]
+    workers = min(max_workers or os.cpu_count() or 1, len(ranges))
+    if workers <= 1:
+        return _extract_page_range(pdf_path, 0, page_count) if page_count else []
+    # 'spawn' so the workers do not inherit the (multi-threaded) app process
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        chunks = pool.map(_extract_page_range, *zip(*[(pdf_path, start, stop) for start, stop in ranges]))
+        return [text for chunk in chunks for text in chunk]
+
+
+def extract_pdf_text(pdf_path: str, max_workers: Optional[int] = None) -> str:
+    """Extracts all text from a PDF file."""
+    return "\n".join(extract_pdf_pages(pdf_path, max_workers=max_workers)).strip()
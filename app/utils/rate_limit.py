@@ -0,0 +1,53 @@
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Tokens refill continuously at rate_per_sec up to capacity;
+    acquire() blocks until the requested amount is available.
+    """
+    def __init__(self, rate_per_sec: float, capacity: Optional[float] = None):
+        if rate_per_sec <= 0:
+            raise ValueError("rate_per_sec must be positive.")
+        self.rate_per_sec = rate_per_sec
+        self.capacity = capacity if capacity is not None else rate_per_sec
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, amount_per_min: float) -> 'TokenBucket':
+        return cls(amount_per_min / 60.0, capacity=amount_per_min)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_sec)
+        self._updated_at = now
+
+    def try_acquire(self, amount: float = 1) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return True
+            return False
+
+    def acquire(self, amount: float = 1, timeout: Optional[float] = None) -> bool:
+        # A request larger than the bucket could never be served, so clamp it to a full bucket
+        amount = min(amount, self.capacity)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return True
+                wait = (amount - self._tokens) / self.rate_per_sec
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
@@ -0,0 +1,112 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+
+class SQLiteCache:
+    """
+    Small persistent key/value store in a local SQLite file.
+    Values are stored as JSON, each entry can expire after a TTL, and the table is
+    capped at max_entries by evicting the least recently used entries.
+    """
+    def __init__(self, path: str, table: str = 'cache', default_ttl: Optional[float] = None, max_entries: Optional[int] = None):
+        self.path = path
+        self.table = table
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # One shared connection guarded by a lock, so pipeline threads can use the same cache
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {table} ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, '
+            'expires_at REAL, accessed_at REAL NOT NULL)'
+        )
+        self._conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_accessed_at ON {table} (accessed_at)')
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Returns the live entries among keys and marks them as recently used."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        now = time.time()
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i+500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f'SELECT key, value FROM {self.table} WHERE key IN ({placeholders}) '
+                    'AND (expires_at IS NULL OR expires_at > ?)',
+                    (*chunk, now)
+                ).fetchall()
+                for key, value in rows:
+                    found[key] = json.loads(value)
+                if rows:
+                    self._conn.execute(
+                        f'UPDATE {self.table} SET accessed_at = ? WHERE key IN ({",".join("?" * len(rows))})',
+                        (now, *[key for key, _ in rows])
+                    )
+        return found
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.set_many({key: value}, ttl=ttl)
+
+    def set_many(self, items: Dict[str, Any], ttl: Optional[float] = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        rows = [(key, json.dumps(value, ensure_ascii=False), now, expires_at, now) for key, value in items.items()]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                self._conn.executemany(f'INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?, ?)', rows)
+                self._evict()
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f'DELETE FROM {self.table}')
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            cur = self._conn.execute(f'DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),))
+            return cur.rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self):
+        # Caller holds the lock. Expired entries go first, then the least recently used beyond max_entries.
+        self._conn.execute(f'DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),))
+        if not self.max_entries:
+            return
+        count = self._conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                f'DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} ORDER BY accessed_at ASC LIMIT ?)',
+                (overflow,)
+            )
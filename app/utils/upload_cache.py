@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+from typing import Optional
+
+import pandas as pd
+
+from app.utils.hashing import content_hash
+from app.utils.ingestion import read_user_table
+
+DEFAULT_UPLOAD_CACHE_DIR = '.cache/uploads'
+# Parsed sheets kept on disk; the least recently used are removed beyond this
+DEFAULT_MAX_FILES = 20
+
+
+def _parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class UploadCache:
+    """
+    On-disk cache of parsed user sheets, keyed by the file's content hash and the read options,
+    so the same workbook is only parsed once however often it is uploaded or read.
+    Sheets are stored as Parquet when pyarrow is installed (pickle otherwise) and only hold the columns that were read.
+    """
+    def __init__(self, directory: str = DEFAULT_UPLOAD_CACHE_DIR, max_files: int = DEFAULT_MAX_FILES,
+                 use_parquet: Optional[bool] = None):
+        self.directory = directory
+        self.max_files = max_files
+        self.use_parquet = _parquet_available() if use_parquet is None else use_parquet
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key_for(file_hash: str, **read_options) -> str:
+        options = json.dumps(read_options, sort_keys=True, default=str)
+        return hashlib.sha256(f"{file_hash}:{options}".encode('utf-8')).hexdigest()[:32]
+
+    def _paths(self, key: str):
+        base = os.path.join(self.directory, key)
+        return base + '.parquet', base + '.pkl'
+
+    def path_for(self, key: str) -> Optional[str]:
+        """The cached file for key, or None."""
+        return next((path for path in self._paths(key) if os.path.exists(path)), None)
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        import logging
+        path = self.path_for(key)
+        if path is None:
+            return None
+        try:
+            df = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_pickle(path)
+        except Exception as e:
+            logging.warning(f"[UploadCache] Could not read {path}, parsing the upload again: {e}")
+            return None
+        # Touch the file so eviction removes the least recently used sheets first
+        os.utime(path)
+        return df
+
+    def put(self, key: str, df: pd.DataFrame) -> str:
+        import logging
+        parquet_path, pickle_path = self._paths(key)
+        if self.use_parquet:
+            try:
+                self._write(parquet_path, lambda tmp: df.to_parquet(tmp, index=False))
+                self._evict()
+                return parquet_path
+            except Exception as e:
+                # e.g. a column mixing numbers and text, which Arrow cannot store as one type
+                logging.warning(f"[UploadCache] Could not store the sheet as Parquet, using pickle: {e}")
+        self._write(pickle_path, df.to_pickle)
+        self._evict()
+        return pickle_path
+
+    def _write(self, path: str, write):
+        # Written under a temporary name first, so a crash never leaves a truncated cache file behind
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            write(tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _evict(self):
+        if not self.max_files:
+            return
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                 if name.endswith(('.parquet', '.pkl'))]
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - self.max_files]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def read(self, source, file_hash: Optional[str] = None, **read_options) -> pd.DataFrame:
+        """
+        read_user_table(source, **read_options), parsed only on the first call for this file content.
+        Pass file_hash if it is already known (see content_hash()).
+        """
+        key = self.key_for(file_hash or content_hash(source), **read_options)
+        df = self.get(key)
+        if df is None:
+            df = read_user_table(source, **read_options)
+            self.put(key, df)
+        return df
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(('.parquet', '.pkl')):
+                os.remove(os.path.join(self.directory, name))
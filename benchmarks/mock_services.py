@@ -0,0 +1,410 @@
+"""
+Local stand-ins for the Bright Data dataset API and the Claude Messages API, served from one HTTP server
+(normally in a child process, see start_mock_services()) so benchmarks never touch the real, paid services.
+"""
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+from urllib.parse import parse_qs, urlsplit
+
+
+MOCK_DRAFT = "Subject: A course picked for you\n\nHi there,\n\n" + 'Lorem ipsum dolor sit amet. ' * 20
+# Streamed mock responses: share of the latency before the first text, and number of text deltas
+STREAM_FIRST_TOKEN_SHARE = 0.2
+STREAM_CHUNKS = 20
+
+
+@dataclass
+class Latency:
+    """Log-normal latency with the given median; sigma=0 gives a fixed delay."""
+    median_sec: float = 0.1
+    sigma: float = 0.5
+
+    def sample(self) -> float:
+        if self.median_sec <= 0:
+            return 0.0
+        if self.sigma <= 0:
+            return self.median_sec
+        return random.lognormvariate(math.log(self.median_sec), self.sigma)
+
+
+@dataclass
+class MockConfig:
+    # Bright Data: latency of the trigger call and time until a snapshot is ready
+    trigger_latency: Latency = field(default_factory=lambda: Latency(0.05, 0.3))
+    snapshot_ready: Latency = field(default_factory=lambda: Latency(0.5, 0.5))
+    poll_latency: Latency = field(default_factory=lambda: Latency(0.01, 0.3))
+    trigger_error_rate: float = 0.0
+    # Share of snapshots that end in 'failed' (at their ready time) instead of delivering records
+    snapshot_failure_rate: float = 0.0
+    # Share of URLs returned as Bright Data error records instead of profiles
+    profile_error_rate: float = 0.01
+    # Claude Messages API
+    claude_latency: Latency = field(default_factory=lambda: Latency(0.1, 0.5))
+    claude_429_rate: float = 0.0
+    claude_error_rate: float = 0.0
+    output_tokens: int = 180
+    # Message Batches API: time from creating a batch until it has ended
+    batch_latency: Latency = field(default_factory=lambda: Latency(2.0, 0.3))
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'MockConfig':
+        values = dict(data)
+        for key, value in values.items():
+            if isinstance(value, dict):
+                values[key] = Latency(**value)
+        return cls(**values)
+
+
+def synthetic_profile(url: str) -> Dict[str, Any]:
+    """A Bright Data-shaped profile with the usual noise (ids, image URLs, long text) for compaction to chew on."""
+    slug = url.rstrip('/').rsplit('/', 1)[-1]
+    rng = random.Random(slug)
+    return {
+        'id': slug,
+        'url': url,
+        'input': {'url': url},
+        'name': slug.replace('-', ' ').title(),
+        'position': rng.choice(['Data Analyst', 'Product Manager', 'Software Engineer', 'Marketing Lead']),
+        'about': ' '.join(rng.choice(['Passionate', 'about', 'data', 'products', 'learning', 'teams', 'growth'])
+                          for _ in range(rng.randint(40, 250))),
+        'city': 'Bengaluru, Karnataka, India',
+        'country_code': 'IN',
+        'avatar': f"https://media.licdn.com/{slug}/avatar.jpg",
+        'banner_image': f"https://media.licdn.com/{slug}/banner.jpg",
+        'current_company': {'name': 'Acme', 'company_id': 'acme', 'link': 'https://www.linkedin.com/company/acme'},
+        'experience': [
+            {'title': f"Role {i}", 'company': f"Company {i}", 'company_logo_url': f"https://media.licdn.com/logo{i}.png",
+             'description': 'Led projects and shipped features. ' * rng.randint(1, 20), 'start_date': f"20{10+i}"}
+            for i in range(rng.randint(2, 12))
+        ],
+        'education': [{'title': 'University', 'degree': 'B.Tech', 'url': 'https://www.linkedin.com/school/u'}],
+        'posts': [{'title': f"Post {i}", 'attribution': 'Thoughts on analytics ' * 10, 'img': 'x.png'} for i in range(rng.randint(0, 15))],
+        'people_also_viewed': [{'name': f"Person {i}", 'profile_link': f"https://www.linkedin.com/in/p{i}"} for i in range(10)],
+        'timestamp': '2024-01-01T00:00:00Z',
+    }
+
+
+class MockState:
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.lock = threading.Lock()
+        self.snapshots: Dict[str, Dict[str, Any]] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.counts: Dict[str, int] = {}
+
+    def count(self, name: str):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def reset(self):
+        with self.lock:
+            self.snapshots.clear()
+            self.batches.clear()
+            self.counts.clear()
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state: MockState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: Any, headers: Dict[str, str] = None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_json(self) -> Any:
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'null')
+
+    def do_GET(self):
+        if self.path == '/_stats':
+            with self.state.lock:
+                return self._send_json(200, dict(self.state.counts))
+        match = re.match(r'^/datasets/v3/snapshot/([^/?]+)', self.path)
+        if match:
+            return self._snapshot(match.group(1))
+        match = re.match(r'^/datasets/v3/progress/([^/?]+)', self.path)
+        if match:
+            return self._progress(match.group(1))
+        match = re.match(r'^/v1/messages/batches/([^/?]+)(/results)?/?$', self.path)
+        if match:
+            return self._batch_results(match.group(1)) if match.group(2) else self._get_batch(match.group(1))
+        self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        body = self._read_json()
+        if self.path == '/_reset':
+            self.state.reset()
+            return self._send_json(200, {})
+        if self.path.startswith('/datasets/v3/trigger'):
+            return self._trigger(body, parse_qs(urlsplit(self.path).query))
+        if self.path.rstrip('/') == '/v1/messages':
+            return self._message(body)
+        if self.path.rstrip('/') == '/v1/messages/batches':
+            return self._create_batch(body)
+        match = re.match(r'^/v1/messages/batches/([^/?]+)/cancel/?$', self.path)
+        if match:
+            return self._cancel_batch(match.group(1))
+        self._send_json(404, {'error': 'not found'})
+
+    def _trigger(self, body: List[Dict[str, str]], params: Dict[str, List[str]]):
+        config = self.state.config
+        self.state.count('brightdata.trigger')
+        time.sleep(config.trigger_latency.sample())
+        if random.random() < config.trigger_error_rate:
+            self.state.count('brightdata.trigger_errors')
+            return self._send_json(500, {'error': 'trigger failed'})
+        snapshot_id = 's_' + uuid.uuid4().hex[:16]
+        ready_in = config.snapshot_ready.sample()
+        failed = random.random() < config.snapshot_failure_rate
+        with self.state.lock:
+            self.state.snapshots[snapshot_id] = {
+                'urls': [item['url'] for item in body],
+                'ready_at': time.time() + ready_in,
+                'failed': failed,
+            }
+        if params.get('notify'):
+            # Like Bright Data's notify option: POST the final status to the given URL when the snapshot is done
+            timer = threading.Timer(ready_in, self._notify, args=(params['notify'][0], (params.get('auth_header') or [None])[0],
+                                                                 snapshot_id, 'failed' if failed else 'ready'))
+            timer.daemon = True
+            timer.start()
+        self._send_json(200, {'snapshot_id': snapshot_id})
+
+    def _notify(self, url: str, auth_header: str, snapshot_id: str, status: str):
+        import urllib.request
+        headers = {'Content-Type': 'application/json'}
+        if auth_header:
+            headers['Authorization'] = auth_header
+        request = urllib.request.Request(url, data=json.dumps({'snapshot_id': snapshot_id, 'status': status}).encode('utf-8'),
+                                         headers=headers, method='POST')
+        self.state.count('brightdata.notifications')
+        try:
+            urllib.request.urlopen(request, timeout=10).close()
+        except Exception:
+            self.state.count('brightdata.notification_errors')
+
+    def _progress(self, snapshot_id: str):
+        self.state.count('brightdata.progress_checks')
+        time.sleep(self.state.config.poll_latency.sample())
+        with self.state.lock:
+            snapshot = self.state.snapshots.get(snapshot_id)
+        if snapshot is None:
+            return self._send_json(404, {'error': 'unknown snapshot'})
+        if time.time() < snapshot['ready_at']:
+            status = 'running'
+        else:
+            status = 'failed' if snapshot['failed'] else 'ready'
+        self._send_json(200, {'snapshot_id': snapshot_id, 'dataset_id': 'gd_l1viktl72bvl7bjuj0', 'status': status})
+
+    def _snapshot(self, snapshot_id: str):
+        config = self.state.config
+        self.state.count('brightdata.snapshot_polls')
+        time.sleep(config.poll_latency.sample())
+        with self.state.lock:
+            snapshot = self.state.snapshots.get(snapshot_id)
+        if snapshot is None:
+            return self._send_json(404, {'error': 'unknown snapshot'})
+        if time.time() < snapshot['ready_at']:
+            return self._send_json(202, {'status': 'running', 'message': 'Snapshot is not ready yet, try again in 10s'})
+        if snapshot['failed']:
+            return self._send_json(200, {'status': 'failed', 'message': 'Snapshot failed'})
+        self.state.count('brightdata.snapshots_ready')
+        records = []
+        for url in snapshot['urls']:
+            if random.random() < config.profile_error_rate:
+                records.append({'input': {'url': url}, 'error': 'Profile not found', 'error_code': 'dead_page'})
+            else:
+                records.append(synthetic_profile(url))
+        self._send_json(200, records)
+
+    def _message(self, body: Dict[str, Any]):
+        config = self.state.config
+        self.state.count('claude.messages')
+        if random.random() < config.claude_429_rate:
+            self.state.count('claude.429')
+            return self._send_json(429, {'type': 'error', 'error': {'type': 'rate_limit_error'}}, {'retry-after': '0'})
+        latency = config.claude_latency.sample()
+        if body.get('stream'):
+            # Streamed responses deliver the first text after a fraction of the full latency
+            time.sleep(latency * STREAM_FIRST_TOKEN_SHARE)
+        else:
+            time.sleep(latency)
+        if random.random() < config.claude_error_rate:
+            self.state.count('claude.errors')
+            return self._send_json(529, {'type': 'error', 'error': {'type': 'overloaded_error'}})
+        message = self._build_message(body)
+        if body.get('stream'):
+            return self._stream_message(message['id'], message['model'], message['usage'], latency * (1 - STREAM_FIRST_TOKEN_SHARE))
+        self._send_json(200, message)
+
+    def _build_message(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        prompt_chars = sum(len(block.get('text', '')) for block in body.get('system', [])) + \
+            sum(len(message['content']) for message in body.get('messages', []) if isinstance(message.get('content'), str))
+        return {
+            'id': 'msg_' + uuid.uuid4().hex[:20],
+            'type': 'message',
+            'role': 'assistant',
+            'model': body.get('model'),
+            'content': [{'type': 'text', 'text': MOCK_DRAFT}],
+            'stop_reason': 'end_turn',
+            'usage': {'input_tokens': prompt_chars // 4, 'output_tokens': self.state.config.output_tokens,
+                      'cache_creation_input_tokens': 0, 'cache_read_input_tokens': 0},
+        }
+
+    def _stream_message(self, message_id: str, model: str, usage: Dict[str, int], remaining_sec: float):
+        """Server-sent events in the Messages API streaming format, sent with chunked transfer encoding."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def send_event(event_type: str, data: Dict[str, Any]):
+            payload = f"event: {event_type}\ndata: {json.dumps({'type': event_type, **data})}\n\n".encode('utf-8')
+            self.wfile.write(f"{len(payload):x}\r\n".encode('ascii') + payload + b'\r\n')
+            self.wfile.flush()
+
+        send_event('message_start', {'message': {'id': message_id, 'type': 'message', 'role': 'assistant', 'model': model,
+                                                 'content': [], 'stop_reason': None,
+                                                 'usage': {**usage, 'output_tokens': 1}}})
+        send_event('content_block_start', {'index': 0, 'content_block': {'type': 'text', 'text': ''}})
+        chunk_size = max(1, len(MOCK_DRAFT) // STREAM_CHUNKS)
+        for i in range(0, len(MOCK_DRAFT), chunk_size):
+            send_event('content_block_delta', {'index': 0, 'delta': {'type': 'text_delta', 'text': MOCK_DRAFT[i:i+chunk_size]}})
+            time.sleep(remaining_sec / STREAM_CHUNKS)
+        send_event('content_block_stop', {'index': 0})
+        send_event('message_delta', {'delta': {'stop_reason': 'end_turn', 'stop_sequence': None},
+                                     'usage': {'output_tokens': usage['output_tokens']}})
+        send_event('message_stop', {})
+        self.wfile.write(b'0\r\n\r\n')
+
+    # Message Batches API: every request in a batch is answered once the batch's latency has passed
+
+    def _batch_object(self, batch_id: str, batch: Dict[str, Any]) -> Dict[str, Any]:
+        ended = batch['canceled'] or time.time() >= batch['ends_at']
+        total = len(batch['requests'])
+        return {
+            'id': batch_id,
+            'type': 'message_batch',
+            'processing_status': 'ended' if ended else ('canceling' if batch['canceled'] else 'in_progress'),
+            'request_counts': {'processing': 0 if ended else total, 'succeeded': 0, 'errored': 0, 'canceled': 0, 'expired': 0},
+            'results_url': f"http://{self.headers.get('Host')}/v1/messages/batches/{batch_id}/results" if ended else None,
+        }
+
+    def _create_batch(self, body: Dict[str, Any]):
+        self.state.count('claude.batches')
+        batch_id = 'msgbatch_' + uuid.uuid4().hex[:20]
+        batch = {'requests': body.get('requests', []), 'ends_at': time.time() + self.state.config.batch_latency.sample(),
+                 'canceled': False}
+        with self.state.lock:
+            self.state.batches[batch_id] = batch
+            self.state.counts['claude.batch_requests'] = self.state.counts.get('claude.batch_requests', 0) + len(batch['requests'])
+        self._send_json(200, self._batch_object(batch_id, batch))
+
+    def _get_batch(self, batch_id: str):
+        self.state.count('claude.batch_polls')
+        with self.state.lock:
+            batch = self.state.batches.get(batch_id)
+        if batch is None:
+            return self._send_json(404, {'type': 'error', 'error': {'type': 'not_found_error'}})
+        self._send_json(200, self._batch_object(batch_id, batch))
+
+    def _cancel_batch(self, batch_id: str):
+        self.state.count('claude.batch_cancels')
+        with self.state.lock:
+            batch = self.state.batches.get(batch_id)
+            if batch is not None and time.time() < batch['ends_at']:
+                batch['canceled'] = True
+        if batch is None:
+            return self._send_json(404, {'type': 'error', 'error': {'type': 'not_found_error'}})
+        self._send_json(200, self._batch_object(batch_id, batch))
+
+    def _batch_results(self, batch_id: str):
+        """The results file: one JSON line per request, keyed by custom_id, sent with chunked transfer encoding."""
+        with self.state.lock:
+            batch = self.state.batches.get(batch_id)
+        if batch is None or not (batch['canceled'] or time.time() >= batch['ends_at']):
+            return self._send_json(404, {'type': 'error', 'error': {'type': 'not_found_error'}})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/binary')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for request in batch['requests']:
+            if batch['canceled']:
+                result = {'type': 'canceled'}
+            elif random.random() < self.state.config.claude_error_rate:
+                result = {'type': 'errored', 'error': {'type': 'error', 'error': {'type': 'overloaded_error'}}}
+            else:
+                result = {'type': 'succeeded', 'message': self._build_message(request.get('params') or {})}
+            line = (json.dumps({'custom_id': request.get('custom_id'), 'result': result}) + '\n').encode('utf-8')
+            self.wfile.write(f"{len(line):x}\r\n".encode('ascii') + line + b'\r\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+
+def serve(config: Dict[str, Any], port_queue, host: str = '127.0.0.1'):
+    """Child-process entry point: serves the mocks on a free port and reports the port through port_queue."""
+    handler = type('BoundMockHandler', (MockHandler,), {'state': MockState(MockConfig.from_dict(config))})
+    server = ThreadingHTTPServer((host, 0), handler)
+    server.daemon_threads = True
+    server.request_queue_size = 256
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_mock_services(config: MockConfig):
+    """
+    Starts the mock server in a separate process, so its CPU and memory do not count against the workflow.
+    Returns (process, base_url); terminate the process when done.
+    """
+    import multiprocessing
+    context = multiprocessing.get_context('spawn')
+    port_queue = context.Queue()
+    process = context.Process(target=serve, args=(asdict(config), port_queue), daemon=True)
+    process.start()
+    port = port_queue.get(timeout=30)
+    return process, f"http://127.0.0.1:{port}"
+
+
+class InMemoryConnector:
+    """
+    Database connector stand-in with an optional per-call latency. Only counts records unless keep_records is set,
+    since a real database would not hold them in this process (and keeping them would skew memory measurements).
+    """
+    def __init__(self, latency: Latency = None, keep_records: bool = False):
+        self.latency = latency or Latency(0.0, 0.0)
+        self.keep_records = keep_records
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.counts: Dict[str, int] = {}
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def insert(self, table: str, record: Dict[str, Any]):
+        self.insert_many(table, [record])
+
+    def insert_many(self, table: str, records: List[Dict[str, Any]]):
+        time.sleep(self.latency.sample())
+        with self._lock:
+            self.calls += 1
+            self.counts[table] = self.counts.get(table, 0) + len(records)
+            if self.keep_records:
+                self.tables.setdefault(table, []).extend(records)
+
+    def fetch(self, table: str, query: Dict[str, Any] = None):
+        with self._lock:
+            return list(self.tables.get(table, []))
@@ -0,0 +1,197 @@
+"""
+End-to-end OutreachWorkflow benchmark against local stand-ins for Bright Data, Claude and the database:
+
+    python -m benchmarks.run_benchmark --rows 100 1000 10000 --output benchmark.json
+
+Reports wall time, rows/sec, peak memory, API call counts and per-stage p95s for each campaign size.
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from typing import Any, Dict, List
+
+from benchmarks.mock_services import InMemoryConnector, Latency, MockConfig, start_mock_services
+
+
+def synthetic_users(rows: int, duplicate_rate: float = 0.05, seed: int = 7):
+    """A users sheet with the usual header variants and a share of repeated profiles."""
+    import random
+    import pandas as pd
+    rng = random.Random(seed)
+    urls = []
+    for i in range(rows):
+        if urls and rng.random() < duplicate_rate:
+            urls.append(rng.choice(urls))
+        else:
+            urls.append(f"https://www.linkedin.com/in/bench-user-{i}")
+    return pd.DataFrame({
+        'First Name': [f"User {i}" for i in range(rows)],
+        'Email Address': [f"user{i}@example.com" for i in range(rows)],
+        'LinkedIn URL': urls,
+    })
+
+
+def _call_mock(base_url: str, path: str, method: str = 'GET') -> Dict[str, Any]:
+    request = urllib.request.Request(base_url + path, data=b'{}' if method == 'POST' else None, method=method)
+    with urllib.request.urlopen(request, timeout=10) as resp:
+        return json.loads(resp.read() or b'{}')
+
+
+def run_campaign(rows: int, base_url: str, args, notifier=None) -> Dict[str, Any]:
+    from app.agents.run_journal import RunJournal
+    from app.agents.workflow import OutreachWorkflow
+    from app.email_gen.draft_cache import DraftCache
+    from app.scraping.brightdata_linkedin_agent import BrightDataLinkedInAgent
+    from app.scraping.profile_cache import ProfileCache
+    _call_mock(base_url, '/_reset', 'POST')
+    users = synthetic_users(rows, args.duplicate_rate)
+    workdir = tempfile.mkdtemp(prefix='outreach-bench-')
+    db = InMemoryConnector(Latency(args.db_latency, 0.3))
+    try:
+        # Fresh caches and journal per campaign, so every profile and draft is a cache miss
+        workflow = OutreachWorkflow(
+            db=db,
+            scrape_concurrency=args.scrape_concurrency,
+            generation_concurrency=args.generation_concurrency,
+            generation_mode=args.generation_mode,
+            batch_poll_interval=args.batch_poll_interval,
+            streaming=args.streaming,
+            stream_generation=args.stream_generation,
+            profile_cache=ProfileCache(os.path.join(workdir, 'profiles.sqlite3')),
+            journal=RunJournal(os.path.join(workdir, 'journal.sqlite3')),
+            draft_cache=DraftCache(os.path.join(workdir, 'drafts.sqlite3')),
+            linkedin_scraper=BrightDataLinkedInAgent(notifier=notifier),
+        )
+        if args.tracemalloc:
+            tracemalloc.start()
+        started = time.perf_counter()
+        results = workflow.run('Benchmark course: a 12-week applied data science program.', 'Early-career analysts.', users)
+        wall = time.perf_counter() - started
+        peak_traced = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+        if args.tracemalloc:
+            tracemalloc.stop()
+        drafted = failed = 0
+        for result in results:
+            drafted += bool(result.get('email_draft'))
+            failed += bool(result.get('profile_error') or result.get('email_error'))
+        workflow.journal.close()
+        workflow.profile_cache.store.close()
+        workflow.email_agent.draft_cache.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    report = workflow.last_run_metrics.summary()
+    return {
+        'rows': rows,
+        'wall_sec': round(wall, 3),
+        'rows_per_sec': round(rows / wall, 2) if wall > 0 else None,
+        'drafted': drafted,
+        'failed': failed,
+        'peak_traced_mb': round(peak_traced / 2**20, 1) if peak_traced is not None else None,
+        # ru_maxrss is the peak for the whole process so far (KiB on Linux), so it only grows across campaigns
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'api_calls': _call_mock(base_url, '/_stats'),
+        'db_calls': db.calls,
+        'stage_p95_sec': {name: stats['p95_sec'] for name, stats in report['spans'].items()},
+        'counters': report['counters'],
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run_benchmark', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 10000], help='Campaign sizes to run.')
+    parser.add_argument('--duplicate-rate', type=float, default=0.05, help='Share of rows repeating an earlier profile.')
+    parser.add_argument('--scrape-concurrency', type=int, default=20)
+    parser.add_argument('--generation-concurrency', type=int, default=8)
+    parser.add_argument('--streaming', action='store_true', help="Run the workflow in streaming (memory-bounded) mode.")
+    parser.add_argument('--stream-generation', action='store_true',
+                        help='Stream Claude responses (reports time to first text and to the subject line).')
+    parser.add_argument('--generation-mode', choices=['interactive', 'batch'], default='interactive',
+                        help='Generate drafts one request per profile, or all at once through the Message Batches API.')
+    parser.add_argument('--batch-latency', type=float, default=2.0, help='Median time until a message batch has ended (s).')
+    parser.add_argument('--batch-poll-interval', type=float, default=0.5, help='Message batch poll interval in seconds.')
+    parser.add_argument('--poll-interval', type=float, default=0.25, help='Bright Data poll interval in seconds.')
+    parser.add_argument('--trigger-latency', type=float, default=0.05, help='Median Bright Data trigger latency (s).')
+    parser.add_argument('--snapshot-ready', type=float, default=0.5, help='Median time until a snapshot is ready (s).')
+    parser.add_argument('--claude-latency', type=float, default=0.1, help='Median Claude response latency (s).')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help='Log-normal spread of every latency (0 = fixed).')
+    parser.add_argument('--db-latency', type=float, default=0.005, help='Median latency of one DB insert_many call (s).')
+    parser.add_argument('--trigger-error-rate', type=float, default=0.0)
+    parser.add_argument('--snapshot-failure-rate', type=float, default=0.0, help="Share of snapshots that end as 'failed'.")
+    parser.add_argument('--webhook', action='store_true',
+                        help='Have the mock notify a local webhook receiver when snapshots finish instead of polling them.')
+    parser.add_argument('--profile-error-rate', type=float, default=0.01)
+    parser.add_argument('--claude-429-rate', type=float, default=0.0)
+    parser.add_argument('--claude-error-rate', type=float, default=0.0)
+    parser.add_argument('--no-tracemalloc', dest='tracemalloc', action='store_false',
+                        help='Skip tracemalloc (faster, but only the process-wide max RSS is reported).')
+    parser.add_argument('--output', help='Also write the results to this JSON file.')
+    parser.add_argument('--log-level', default='ERROR', help='Workflow log level (retries are logged at WARNING).')
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s %(levelname)s %(message)s')
+    sigma = args.latency_sigma
+    config = MockConfig(
+        trigger_latency=Latency(args.trigger_latency, sigma),
+        snapshot_ready=Latency(args.snapshot_ready, sigma),
+        claude_latency=Latency(args.claude_latency, sigma),
+        batch_latency=Latency(args.batch_latency, sigma),
+        trigger_error_rate=args.trigger_error_rate,
+        snapshot_failure_rate=args.snapshot_failure_rate,
+        profile_error_rate=args.profile_error_rate,
+        claude_429_rate=args.claude_429_rate,
+        claude_error_rate=args.claude_error_rate,
+    )
+    process, base_url = start_mock_services(config)
+    # Point the agents at the mocks; rate limits are lifted so the workflow itself is what gets measured
+    os.environ.update({
+        'BRIGHTDATA_API_KEY': 'benchmark',
+        'BRIGHTDATA_BASE_URL': base_url,
+        'BRIGHTDATA_POLL_INTERVAL': str(args.poll_interval),
+        'ANTHROPIC_API_KEY': 'benchmark',
+        'CLAUDE_API_URL': base_url + '/v1/messages',
+        'CLAUDE_MAX_IN_FLIGHT': str(args.generation_concurrency),
+        'CLAUDE_REQUESTS_PER_MIN': '1000000',
+        'CLAUDE_TOKENS_PER_MIN': '1000000000',
+    })
+    notifier = None
+    if args.webhook:
+        # On a free port; the mock runs on the same host, so it can call the receiver directly
+        import secrets
+        import socket
+        from app.scraping.snapshot_notifier import SnapshotNotifier
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        notifier = SnapshotNotifier(host='127.0.0.1', port=port, public_url=f"http://127.0.0.1:{port}/brightdata/notify",
+                                    secret=secrets.token_urlsafe(16)).start()
+    results: List[Dict[str, Any]] = []
+    try:
+        for rows in args.rows:
+            result = run_campaign(rows, base_url, args, notifier)
+            results.append(result)
+            print(f"{rows:>7} rows  {result['wall_sec']:>8.2f}s  {result['rows_per_sec']:>8.2f} rows/s  "
+                  f"peak {result['peak_traced_mb']} MB traced / {result['max_rss_mb']} MB rss  "
+                  f"calls {json.dumps(result['api_calls'], sort_keys=True)}  db {result['db_calls']}", flush=True)
+    finally:
+        process.terminate()
+        if notifier is not None:
+            notifier.stop()
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,6 +3,7 @@ from dotenv import load_dotenv
 load_dotenv() 
 import streamlit as st 
 import pandas as pd 
+from app.email_gen.email_draft import split_subject_body 
  
 st.set_page_config(page_title="Personalized Email Outreach Agent", layout="wide") 
 st.title("Personalized Email Outreach Agent") 
@@ -22,6 +23,10 @@ if 'results' not in st.session_state:
     st.session_state['results'] = None 
 if 'show_gmail_popup' not in st.session_state: 
     st.session_state['show_gmail_popup'] = False 
+if 'run_id' not in st.session_state: 
+    st.session_state['run_id'] = None 
+if 'run_metrics' not in st.session_state: 
+    st.session_state['run_metrics'] = None 
 
 # Gmail instructions popup function
 def show_gmail_instructions():
@@ -39,19 +44,30 @@ def show_gmail_instructions():
 Alternatively, you can create an app password by logging in to your Google account and going to [https://myaccount.google.com/apppasswords](https://myaccount.google.com/apppasswords) 
     """)
 
-# Function to split email subject and body
-def split_subject_body(draft):
-    if draft and ("\n" in draft or "\r" in draft):
-        first_line, *rest = draft.splitlines() 
-        # Remove 'subject:' or similar prefix from the subject line if present 
-        subject = first_line.strip() 
-        if subject.lower().startswith('subject:'): 
-            subject = subject[len('subject:'):].strip() 
-        return subject, "\n".join(rest).strip() 
-    subject = draft.strip() 
-    if subject.lower().startswith('subject:'): 
-        subject = subject[len('subject:'):].strip() 
-    return subject, "" 
+# Subject and body of a result: split by the workflow, or parsed here for runs journaled before that
+def result_subject_body(r): 
+    if 'email_subject' in r: 
+        return r['email_subject'], r.get('email_body', '') 
+    return split_subject_body(r.get('email_draft')) 
+
+# Preview table for (position, result) pairs, indexed by row position
+def build_preview_df(items):
+    records = [] 
+    positions = [] 
+    for position, r in items: 
+        subject, body = result_subject_body(r) 
+        positions.append(position) 
+        records.append({'Name': r.get('name'), 'Email': r.get('email'), 'Email Subject': subject, 'Email Body': body}) 
+    return pd.DataFrame(records, index=positions, columns=['Name', 'Email', 'Email Subject', 'Email Body']) 
+
+# The whole run as CSV, read from the run journal a page at a time (cached per run and row count)
+@st.cache_data(show_spinner=False, max_entries=2) 
+def build_results_csv(run_id, row_count): 
+    journal = get_scheduler().journal 
+    buffer = io.StringIO() 
+    for offset in range(0, row_count, 1000): 
+        build_preview_df(journal.get_results(run_id, offset, 1000)).to_csv(buffer, index=False, header=offset == 0) 
+    return buffer.getvalue().encode('utf-8') 
 
 # Gmail credentials section - moved to the beginning
 st.header("Gmail Credentials")
@@ -96,6 +112,47 @@ st.markdown("---")
 # Collect course details from the user 
 st.header("Step 1: Enter Course Details") 
 st.session_state['course_details'] = st.text_area("Course Details", value=st.session_state['course_details']) 
+
+from app.agents.scheduler import CampaignScheduler 
+from app.agents.run_journal import JournalResults 
+import atexit 
+import io 
+import time 
+
+# One scheduler per server process: every session's campaigns share its workers, API rate budgets, connection
+# pools and caches, so reruns never rebuild them; the database client is only created when the first job runs
+@st.cache_resource 
+def get_scheduler(): 
+    scheduler = CampaignScheduler(db_type='supabase').start() 
+    atexit.register(scheduler.close) 
+    return scheduler 
+
+scheduler = get_scheduler() 
+
+# Optional brochure PDFs: extracted in parallel and summarized once (both cached by file hash), then added to the course details
+@st.cache_resource 
+def get_course_material_agent(): 
+    from app.agents.course_material_agent import CourseMaterialAgent 
+    # Summaries share the scheduler's Claude connection pool and rate limits with the running campaigns 
+    return CourseMaterialAgent(client=scheduler.claude_client()) 
+
+brochure_files = st.file_uploader("Course Brochures (PDF, optional)", type=["pdf"], accept_multiple_files=True) 
+brochure_ids = tuple(getattr(f, 'file_id', None) or f.name for f in brochure_files or []) 
+if not brochure_ids: 
+    st.session_state['course_materials'] = '' 
+elif st.session_state.get('brochure_ids') != brochure_ids: 
+    try: 
+        with st.spinner("Reading and summarizing the brochures..."): 
+            summary, brochures = get_course_material_agent().ingest(brochure_files) 
+        st.session_state['course_materials'] = summary 
+        st.session_state['brochure_ids'] = brochure_ids 
+    except Exception as e: 
+        st.session_state['course_materials'] = '' 
+        st.session_state['brochure_ids'] = None 
+        st.error(f"Failed to read the brochures: {e}") 
+if st.session_state.get('course_materials'): 
+    with st.expander("Brochure summary (added to the course details)"): 
+        st.session_state['course_materials'] = st.text_area("Brochure Summary", value=st.session_state['course_materials'], height=200) 
  
 # Collect the target user persona 
 st.header("Step 2: Enter User Persona") 
@@ -103,28 +160,48 @@ st.session_state['persona'] = st.text_area("User Persona", value=st.session_stat
  
 # Upload the Excel file containing target users 
 st.header("Step 3: Upload Target Users Excel (with LinkedIn URLs)") 
-user_file = st.file_uploader("Upload Excel File", type=["xlsx", "xls"]) 
+user_file = st.file_uploader("Upload Excel File", type=["xlsx", "xls", "csv", "parquet"]) 
  
+# Parsed sheets are cached on disk by content hash (as Parquet when pyarrow is installed)
+@st.cache_resource 
+def get_upload_cache(): 
+    from app.utils.upload_cache import UploadCache 
+    return UploadCache() 
+
 if user_file: 
+    from app.utils.ingestion import resolve_columns 
+    from app.utils.hashing import content_hash 
     try: 
-        df = pd.read_excel(user_file) 
-        st.session_state['user_df'] = df 
+        # Reruns keep the sheet parsed for this upload; a new upload of the same content is read from the cache.
+        # Only the LinkedIn/email/name columns are read; large workbooks are streamed with openpyxl
+        upload_id = getattr(user_file, 'file_id', None) or content_hash(user_file) 
+        if st.session_state.get('user_upload_id') != upload_id or st.session_state['user_df'] is None: 
+            st.session_state['user_df'] = get_upload_cache().read(user_file) 
+            st.session_state['user_upload_id'] = upload_id 
+        df = st.session_state['user_df'] 
         st.success(f"Uploaded {user_file.name} successfully!") 
         st.subheader("Preview of Uploaded Users:") 
         st.dataframe(df.head(10), use_container_width=True) 
-        if 'linkedin' in [c.lower() for c in df.columns]: 
+        if resolve_columns(df.columns).linkedin: 
             st.info("Found LinkedIn column.") 
         else: 
             st.warning("No LinkedIn column found. Please ensure your Excel has a column for LinkedIn URLs.") 
     except Exception as e: 
+        st.session_state['user_df'] = None 
+        st.session_state['user_upload_id'] = None 
         st.error(f"Failed to read Excel file: {e}") 
 else: 
     st.session_state['user_df'] = None 
  
 st.markdown("---") 
  
-from app.agents.workflow import OutreachWorkflow 
-import io 
+if 'job_id' not in st.session_state: 
+    st.session_state['job_id'] = None 
+
+def open_job_results(job): 
+    st.session_state['results'] = JournalResults(scheduler.journal, job['run_id']) 
+    st.session_state['run_id'] = job['run_id'] 
+    st.session_state['run_metrics'] = scheduler.run_metrics(job['job_id']) 
 
 progress_placeholder = st.empty() 
 error_placeholder = st.empty() 
@@ -152,53 +229,116 @@ if not workflow_ready:
     if missing_fields:
         st.warning(f"Please fill in the following fields before starting the workflow: {', '.join(missing_fields)}")
 
+# Drafts for unchanged course/persona/profile are reused from the local draft cache at no token cost
+force_regenerate = st.checkbox("Regenerate drafts even if an identical one was generated before", value=False) 
+
 if workflow_ready and st.button("Start Workflow"):
-    import time 
-    import math 
-    # Estimate wait time: 25s per batch of 10 LinkedIn URLs 
-    user_df = st.session_state['user_df']
-    num_urls = user_df.shape[0] 
-    batch_size = 10 
-    est_batch_time = 25  # seconds per batch 
-    total_batches = math.ceil(num_urls / batch_size) 
-    est_total_time = total_batches * est_batch_time 
-    with st.spinner(f"Fetching LinkedIn profiles and generating emails... Estimated time: {est_total_time} seconds for {num_urls} profiles."): 
-        start_time = time.time() 
-        workflow = OutreachWorkflow(db_type='supabase') 
-        logs = []  # Always initialize logs before use 
-        try: 
-            progress_placeholder.progress(0, text=f"Processing 0/{user_df.shape[0]}...") 
-            results = workflow.run( 
-                st.session_state['course_details'], 
-                st.session_state['persona'], 
-                user_df 
+    # Campaigns are queued and run by the shared scheduler, taking turns fairly with other teammates' campaigns
+    st.session_state['job_id'] = scheduler.submit( 
+        st.session_state['sender_email'], st.session_state['course_details'], st.session_state['persona'], 
+        st.session_state['user_df'], options={'force_regenerate': force_regenerate, 'stream_generation': True}, 
+        course_materials=st.session_state.get('course_materials') 
+    ) 
+    st.session_state['results'] = None 
+
+# Resume a run that was interrupted (closed tab, crash, scraping timeout, cancel) without redoing finished rows
+# (a job records its run id as soon as the run starts, so runs in progress are never offered here) 
+active_runs = {job['run_id'] for job in scheduler.list_jobs(statuses=['queued', 'running'], limit=-1) if job['run_id']} 
+unfinished_runs = [r for r in scheduler.journal.list_runs(statuses=['running', 'failed', 'cancelled']) if r['run_id'] not in active_runs] 
+if unfinished_runs: 
+    with st.expander("Resume an interrupted run"): 
+        run_labels = { 
+            f"{r['run_id']} ({r['status']}, {sum(r['stages'].values())} rows reached, started {time.strftime('%Y-%m-%d %H:%M', time.localtime(r['created_at']))})": r['run_id'] 
+            for r in unfinished_runs 
+        } 
+        selected_run = st.selectbox("Run", list(run_labels.keys())) 
+        if st.button("Resume Workflow"): 
+            try: 
+                st.session_state['job_id'] = scheduler.resume(st.session_state['sender_email'], run_labels[selected_run], 
+                                                              options={'force_regenerate': force_regenerate, 'stream_generation': True}) 
+                st.session_state['results'] = None 
+            except ValueError as e: 
+                # Another session queued or started this run in the meantime 
+                st.error(str(e)) 
+
+# Every campaign in the queue, with cancel for your own queued or running jobs and results for finished ones
+recent_jobs = scheduler.list_jobs(limit=20) 
+if recent_jobs: 
+    with st.expander("Campaign queue", expanded=any(job['status'] in ('queued', 'running') for job in recent_jobs)): 
+        for job in recent_jobs: 
+            cols = st.columns([3, 2, 3, 1]) 
+            cols[0].write(f"`{job['job_id']}` by {job['owner']}, {time.strftime('%H:%M', time.localtime(job['created_at']))}") 
+            cols[1].write(job['status'] + (f": {job['error']}" if job['error'] else '')) 
+            cols[2].progress(job['rows_done'] / max(job['rows_total'], 1), text=f"{job['rows_done']}/{job['rows_total']} rows") 
+            if job['status'] in ('queued', 'running') and job['owner'] == st.session_state['sender_email']: 
+                if cols[3].button("Cancel", key=f"cancel-{job['job_id']}"): 
+                    scheduler.cancel(job['job_id']) 
+                    st.rerun() 
+            elif job['status'] in ('completed', 'cancelled', 'failed') and job['run_id']: 
+                if cols[3].button("Open", key=f"open-{job['job_id']}"): 
+                    open_job_results(job) 
+
+# Follow this session's job until it finishes; its results are then read from the run journal
+if st.session_state['job_id']: 
+    job = scheduler.status(st.session_state['job_id']) 
+    # Drafts show up as rows finish; only the latest are read back from the journal on each refresh
+    live_table = st.empty() 
+    while job and job['status'] in ('queued', 'running'): 
+        if job['status'] == 'queued': 
+            progress_placeholder.progress(0.0, text=f"Waiting for a free worker (position {job.get('queue_position')} in the queue)...") 
+        else: 
+            elapsed = max(time.time() - job['started_at'], 1e-6) 
+            rate = job['rows_done'] / elapsed 
+            eta = f", about {int((job['rows_total'] - job['rows_done']) / rate)}s left" if rate > 0 else "" 
+            progress_placeholder.progress( 
+                job['rows_done'] / max(job['rows_total'], 1), 
+                text=f"Drafted {job['rows_done']}/{job['rows_total']} rows ({rate * 60:.1f} rows/min{eta})" 
             ) 
-            st.session_state['results'] = results 
-        except Exception as e: 
-            error_placeholder.error(f"Error processing rows: {e}") 
-        finally: 
-            elapsed = int(time.time() - start_time) 
-            st.success(f"Done! Actual time: {elapsed} seconds.") 
-        progress_placeholder.empty() 
-        error_placeholder.empty() 
+            if job['run_id']: 
+                # Finished rows from the journal plus drafts still streaming in (subject first, then the body so far)
+                live_rows = dict(scheduler.journal.get_latest_results(job['run_id'])) 
+                for position, draft in scheduler.partial_drafts(job['job_id']).items(): 
+                    live_rows.setdefault(position, {'name': '(drafting...)', 'email_subject': draft.subject, 'email_body': draft.body}) 
+                live_table.dataframe(build_preview_df(sorted(live_rows.items())), use_container_width=True) 
+        time.sleep(1) 
+        job = scheduler.status(st.session_state['job_id']) 
+    progress_placeholder.empty() 
+    live_table.empty() 
+    st.session_state['job_id'] = None 
+    if job and job['status'] == 'completed': 
+        open_job_results(job) 
+        st.success(f"Done! Actual time: {int(job['finished_at'] - job['started_at'])} seconds.") 
+    elif job and job['status'] == 'failed': 
+        error_placeholder.error(f"Error processing rows: {job['error']}") 
+    elif job and job['run_id']: 
+        st.info(f"Campaign {job['job_id']} was cancelled after {job['rows_done']} rows; it can be resumed above.") 
+    elif job: 
+        # Cancelled while still queued: no run was started, so there is nothing to resume
+        st.info(f"Campaign {job['job_id']} was cancelled before it started.") 
 
 # Display results if available
 if st.session_state['results'] is not None: 
-    st.success(f"Generated {len(st.session_state['results'])} personalized emails!") 
+    results = st.session_state['results'] 
+    result_count = len(results) 
+    st.success(f"Generated {result_count} personalized emails!") 
     
-    # Create dataframe for results
-    preview_df = pd.DataFrame([ 
-        { 
-            'Name': r.get('name'), 
-            'Email': r.get('email'), 
-            'Email Subject': split_subject_body(r.get('email_draft'))[0], 
-            'Email Body': split_subject_body(r.get('email_draft'))[1], 
-        } for r in st.session_state['results'] 
-    ]) 
+    # Only the current page of results is loaded from the run journal
+    page_size = 100 
+    page_count = max(1, -(-result_count // page_size)) 
+    page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1, step=1) if page_count > 1 else 1 
+    preview_df = build_preview_df(results.page((page - 1) * page_size, page_size)) 
     st.dataframe(preview_df, use_container_width=True) 
+
+    # Where the run spent its time: Bright Data snapshots, Claude or the database
+    if st.session_state['run_metrics'] is not None: 
+        with st.expander("Run metrics"): 
+            run_metrics = st.session_state['run_metrics'] 
+            st.json(run_metrics.summary()) 
+            st.download_button("Download Metrics (JSON)", data=run_metrics.to_json(), file_name="run_metrics.json", mime="application/json") 
+            st.download_button("Download Metrics (Prometheus)", data=run_metrics.to_prometheus(), file_name="run_metrics.prom", mime="text/plain") 
     
     # Download button
-    csv = preview_df.to_csv(index=False).encode('utf-8') 
+    csv = build_results_csv(st.session_state['run_id'], result_count) 
     st.download_button("Download Results as CSV", data=csv, file_name="personalized_emails.csv", 
                       mime="text/csv")
  
@@ -210,47 +350,41 @@ if st.session_state['results'] is not None:
     log_area = st.empty() 
     
     if st.button("Send Emails"):
-        import smtplib 
-        from email.mime.text import MIMEText 
         import traceback 
-        successes = [] 
-        failures = [] 
-        logs = []  # Always initialize logs before use 
+        from app.email_send.smtp_sender import SMTPSender, OutgoingEmail 
+        # Rows already sent for this run (e.g. before an interruption) are not sent twice
+        journal = scheduler.journal if st.session_state['run_id'] else None 
+        already_sent = set() 
+        if journal: 
+            already_sent = {pos for pos, r in journal.get_rows(st.session_state['run_id'], include_results=False).items() if r['stage'] == 'sent'} 
+        outgoing = [] 
+        for position, r in results.items(): 
+            if position in already_sent or not r.get('email') or pd.isna(r.get('email')): 
+                continue 
+            subject, body = result_subject_body(r) 
+            outgoing.append(OutgoingEmail(position, r['email'], subject, body)) 
+        send_progress = st.progress(0.0) 
+
+        def show_progress(progress): 
+            # Counters plus a bounded log tail, so each refresh costs the same however long the campaign is
+            send_progress.progress(progress.done / max(progress.total, 1), text=f"Sent {progress.sent}, failed {progress.failed}, skipped {progress.skipped} of {progress.total}") 
+            log_area.info(progress.tail()) 
+
+        # The shared throttle paces every session's sends together
+        sender = SMTPSender(st.session_state['sender_email'], st.session_state['app_password'], throttle=scheduler.smtp_throttle) 
         try: 
-            logs.append("Connecting to Gmail SMTP server...") 
-            log_area.info("\n".join(logs)) 
-            with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server: 
-                logs.append(f"Logging in as {st.session_state['sender_email']}...") 
-                log_area.info("\n".join(logs)) 
-                server.login(st.session_state['sender_email'], st.session_state['app_password']) 
-                logs.append("Login successful. Sending emails...") 
-                log_area.info("\n".join(logs)) 
-                for idx, row in preview_df.iterrows(): 
-                    recipient = row['Email'] 
-                    subject = row['Email Subject'] 
-                    body = row['Email Body'] 
-                    try: 
-                        logs.append(f"Sending to {recipient} (subject: {subject})...") 
-                        log_area.info("\n".join(logs)) 
-                        msg = MIMEText(body, "plain") 
-                        msg["Subject"] = subject or "Personalized Outreach" 
-                        msg["From"] = st.session_state['sender_email'] 
-                        msg["To"] = recipient 
-                        server.sendmail(st.session_state['sender_email'], recipient, msg.as_string()) 
-                        successes.append(recipient) 
-                        logs.append(f"✅ Sent to {recipient}") 
-                    except Exception as e: 
-                        failures.append((recipient, str(e))) 
-                        logs.append(f"❌ Failed to send to {recipient}: {e}") 
-                    log_area.info("\n".join(logs)) 
-                logs.append("All emails processed.") 
-                log_area.info("\n".join(logs)) 
+            progress = sender.send_all( 
+                outgoing, 
+                on_sent=(lambda email: journal.mark_sent(st.session_state['run_id'], [email.index])) if journal else None, 
+                on_progress=show_progress 
+            ) 
+            if already_sent: 
+                st.info(f"Skipped {len(already_sent)} emails already sent in this run.") 
+            send_status.success(f"Sent {progress.sent} emails successfully.") 
+            if progress.failures: 
+                send_status.error(f"Failed to send to: {', '.join([f[0] for f in progress.failures])}") 
         except Exception as e: 
-            logs.append(f"Critical error: {e}\n{traceback.format_exc()}") 
-            log_area.error("\n".join(logs)) 
-        send_status.success(f"Sent {len(successes)} emails successfully.") 
-        if failures: 
-            send_status.error(f"Failed to send to: {', '.join([f[0] for f in failures])}")
+            log_area.error(f"Critical error: {e}\n{traceback.format_exc()}") 
 
 # Reset button
 if st.session_state['results'] is not None: